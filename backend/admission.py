@@ -0,0 +1,176 @@
+"""Admission control: per route class concurrency limits and load shedding.
+
+Requests of a route class (ROUTE_CLASSES) run at most ADMISSION_CONCURRENCY
+at a time; the rest wait in arrival order, up to the class's
+ADMISSION_QUEUE_DEADLINE_MS. A request whose expected wait, from the queue
+ahead of it and the class's recent service times, is already past the
+deadline is rejected on arrival instead of holding a connection until it
+times out. Rejections are 503 with a Retry-After of the expected wait.
+
+Queue waits are recorded per class (admission_queue_seconds) to size the
+limits. Routes outside the classes, and classes with a limit of 0, are not
+limited. Limits are per process.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import ADMISSION_CONCURRENCY, ADMISSION_QUEUE_DEADLINE_MS
+from metrics import metrics
+
+SURVEY_WRITE_PATHS = (
+    "/surveys",
+    "/daily-surveys",
+    "/cleveland-surveys",
+    "/my-sleep-surveys",
+)
+DASHBOARD_READ_PATHS = ("/user", "/daily-surveys", "/sync")
+
+ROUTE_CLASSES = ("auth", "survey_writes", "dashboard", "analytics")
+
+# Weight of the latest request in a class's average service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+def route_class(method: str, path: str) -> str | None:
+    """The admission class of a request, None when it is not limited."""
+    if path.startswith("/auth/"):
+        return "auth"
+    if method == "POST" and path in SURVEY_WRITE_PATHS:
+        return "survey_writes"
+    if method == "GET" and path in DASHBOARD_READ_PATHS:
+        return "dashboard"
+    if path.startswith("/admin/analytics/"):
+        return "analytics"
+    return None
+
+
+class Rejected(Exception):
+    """No slot within the deadline; ``retry_after`` seconds is the expected wait."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """FIFO semaphore of one route class, shedding requests it can't serve in time."""
+
+    def __init__(self, name: str, limit: int, deadline_ms: float):
+        self.name = name
+        self.limit = limit
+        self.deadline = deadline_ms / 1000
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # Average seconds a request holds its slot, for the expected wait
+        self._service_time = 0.0
+
+    def expected_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot."""
+        if self.in_flight < self.limit:
+            return 0.0
+        return (len(self._waiters) + 1) / self.limit * self._service_time
+
+    async def acquire(self) -> float:
+        """Wait for a slot, returning the seconds waited; raises Rejected."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            return 0.0
+
+        expected = self.expected_wait()
+        if expected > self.deadline:
+            raise Rejected("expected_wait", expected)
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        try:
+            await asyncio.wait_for(waiter, self.deadline)
+        except (TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the deadline ran out or the client left
+                self._release_slot()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise Rejected("deadline", self.expected_wait() or self.deadline) from None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._publish()
+        return time.perf_counter() - started
+
+    def release(self, held: float) -> None:
+        """Give the slot back after holding it for ``held`` seconds."""
+        self._service_time += SERVICE_TIME_SMOOTHING * (held - self._service_time)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        # The slot passes straight to the oldest live waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set("admission_in_flight", self.in_flight, route_class=self.name)
+        metrics.set("admission_queued", len(self._waiters), route_class=self.name)
+
+
+class AdmissionMiddleware:
+    """Apply the AdmissionGate of each request's route class."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        concurrency: dict[str, float] = ADMISSION_CONCURRENCY,
+        deadlines_ms: dict[str, float] = ADMISSION_QUEUE_DEADLINE_MS,
+    ):
+        self.app = app
+        self.gates = {
+            name: AdmissionGate(name, int(concurrency[name]), deadlines_ms[name])
+            for name in ROUTE_CLASSES
+            if concurrency.get(name, 0) > 0
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        gate = self.gates.get(route_class(scope["method"], scope["path"]))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            waited = await gate.acquire()
+        except Rejected as rejected:
+            metrics.incr(
+                "admission_rejected", route_class=gate.name, reason=rejected.reason
+            )
+            retry_after = max(1, math.ceil(rejected.retry_after))
+            response = JSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        metrics.observe("admission_queue_seconds", waited, route_class=gate.name)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - started)
@@ -1,8 +1,8 @@
+import re
 from logging.config import fileConfig
 from os import environ
 
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
+from sqlalchemy import engine_from_config, pool
 
 from alembic import context
 
@@ -28,6 +28,14 @@ target_metadata = Base.metadata
 
 ENV_VAR_DB_URL = "DATABASE_URL"
 
+# Partitions of daily_sleep_surveys are managed by partitions.py, not models
+PARTITION_TABLE = re.compile(r"^daily_sleep_surveys_(y\d{4}m\d{2}|default)$")
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ == "table" and PARTITION_TABLE.match(name))
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -44,6 +52,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +81,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch = True)
+        context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name, render_as_batch = True)
 
         with context.begin_transaction():
             context.run_migrations()
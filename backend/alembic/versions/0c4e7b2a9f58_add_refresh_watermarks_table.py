@@ -0,0 +1,33 @@
+"""add refresh watermarks table
+
+Revision ID: 0c4e7b2a9f58
+Revises: 5f1c8a3e9d47
+Create Date: 2026-10-20 14:05:52.627310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c4e7b2a9f58'
+down_revision: Union[str, Sequence[str], None] = '5f1c8a3e9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('refresh_watermarks',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('refresh_watermarks')
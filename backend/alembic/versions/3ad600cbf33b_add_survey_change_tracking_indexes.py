@@ -0,0 +1,45 @@
+"""add survey change tracking indexes
+
+Revision ID: 3ad600cbf33b
+Revises: 03872dc995c6
+Create Date: 2026-10-19 12:05:41.218304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ad600cbf33b'
+down_revision: Union[str, Sequence[str], None] = '03872dc995c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SURVEY_TABLES = [
+    'sleep_surveys',
+    'daily_sleep_surveys',
+    'cleveland_surveys',
+    'my_sleep_surveys',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (user_id, last change) lets delta sync and ETag lookups read the
+    # per-user max / "changed since" straight from the index
+    for table in SURVEY_TABLES:
+        op.create_index(
+            f'ix_{table}_user_changed',
+            table,
+            ['user_id', sa.text('coalesce(updated_at, created_at)')],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(SURVEY_TABLES):
+        op.drop_index(f'ix_{table}_user_changed', table_name=table)
@@ -0,0 +1,49 @@
+"""add school daily rollups table
+
+Revision ID: 5f3a8b1c9e27
+Revises: c7d2e9a41f06
+Create Date: 2026-10-19 17:03:12.408395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f3a8b1c9e27'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e9a41f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('school_daily_rollups',
+    sa.Column('school', sa.String(), nullable=False),
+    sa.Column('survey_date', sa.Date(), nullable=False),
+    sa.Column('students', sa.Integer(), nullable=False),
+    sa.Column('mean_sleep_duration', sa.Float(), nullable=True),
+    sa.Column('mean_bedtime', sa.Float(), nullable=True),
+    sa.Column('mean_wake_time', sa.Float(), nullable=True),
+    sa.Column('mean_sleep_quality', sa.Float(), nullable=True),
+    sa.Column('source_changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('school', 'survey_date')
+    )
+    op.create_index(op.f('ix_school_daily_rollups_source_changed_at'), 'school_daily_rollups', ['source_changed_at'], unique=False)
+    # Days changed since a watermark, for incremental school rollups
+    op.create_index(
+        'ix_daily_sleep_surveys_changed',
+        'daily_sleep_surveys',
+        [sa.text('coalesce(updated_at, created_at)')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_sleep_surveys_changed', table_name='daily_sleep_surveys')
+    op.drop_index(op.f('ix_school_daily_rollups_source_changed_at'), table_name='school_daily_rollups')
+    op.drop_table('school_daily_rollups')
@@ -0,0 +1,41 @@
+"""add student daily means table
+
+Revision ID: 7a2d9c4e1b36
+Revises: 0c4e7b2a9f58
+Create Date: 2026-10-21 09:41:18.306215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2d9c4e1b36'
+down_revision: Union[str, Sequence[str], None] = '0c4e7b2a9f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('student_daily_means',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entries', sa.Integer(), nullable=False),
+    sa.Column('mean_sleep_duration', sa.Float(), nullable=True),
+    sa.Column('mean_wake_time', sa.Float(), nullable=True),
+    sa.Column('mean_bedtime', sa.Float(), nullable=True),
+    sa.Column('mean_time_to_sleep', sa.Float(), nullable=True),
+    sa.Column('mean_night_awakenings', sa.Float(), nullable=True),
+    sa.Column('mean_sleep_quality', sa.Float(), nullable=True),
+    sa.Column('source_changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_daily_means')
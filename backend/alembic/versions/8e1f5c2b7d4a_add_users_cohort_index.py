@@ -0,0 +1,33 @@
+"""add users cohort index
+
+Revision ID: 8e1f5c2b7d4a
+Revises: 3ad600cbf33b
+Create Date: 2026-10-19 15:42:10.734512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f5c2b7d4a'
+down_revision: Union[str, Sequence[str], None] = '3ad600cbf33b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_users_cohort',
+        'users',
+        ['school', 'school_year', 'gender'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_cohort', table_name='users')
@@ -0,0 +1,118 @@
+"""partition daily_sleep_surveys by month
+
+Revision ID: 9b4e6d2f1a83
+Revises: 5f3a8b1c9e27
+Create Date: 2026-10-19 18:42:55.120734
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e6d2f1a83'
+down_revision: Union[str, Sequence[str], None] = '5f3a8b1c9e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLE = 'daily_sleep_surveys'
+# Partitions created ahead of the current month; partitions.py keeps
+# DAILY_SURVEYS_PARTITION_MONTHS_AHEAD from then on
+MONTHS_AHEAD = 3
+
+COLUMNS = [
+    'id',
+    'user_id',
+    'hora_levantaste_hoje',
+    'hora_deitaste_ontem',
+    'tempo_ate_adormecer',
+    'vezes_acordaste_noite',
+    'horas_que_dormiste',
+    'qualidade_sono_noite',
+    'observacao_noite_passada',
+    'survey_date',
+    'created_at',
+    'updated_at',
+]
+
+
+def _create_table(name, primary_key, **kwargs):
+    op.create_table(name,
+    sa.Column('id', sa.Integer(), server_default=sa.text(f"nextval('{TABLE}_id_seq'::regclass)"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('hora_levantaste_hoje', sa.Time(), nullable=False),
+    sa.Column('hora_deitaste_ontem', sa.Time(), nullable=False),
+    sa.Column('tempo_ate_adormecer', sa.Integer(), nullable=False),
+    sa.Column('vezes_acordaste_noite', sa.Integer(), nullable=False),
+    sa.Column('horas_que_dormiste', sa.Integer(), nullable=False),
+    sa.Column('qualidade_sono_noite', sa.Integer(), nullable=False),
+    sa.Column('observacao_noite_passada', sa.String(), nullable=True),
+    sa.Column('survey_date', sa.Date(), server_default=sa.text('(CURRENT_DATE)'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint(*primary_key),
+    sa.UniqueConstraint('user_id', 'survey_date', name='uq_user_date'),
+    **kwargs
+    )
+    op.create_index(op.f('ix_daily_sleep_surveys_id'), name, ['id'], unique=False)
+    op.create_index('ix_daily_sleep_surveys_user_changed', name, ['user_id', sa.text('coalesce(updated_at, created_at)')], unique=False)
+    op.create_index('ix_daily_sleep_surveys_changed', name, [sa.text('coalesce(updated_at, created_at)')], unique=False)
+
+
+def _set_aside(name):
+    """Rename the current table and free its constraint and index names."""
+    op.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE')
+    op.rename_table(TABLE, name)
+    op.execute(f'ALTER TABLE {name} RENAME CONSTRAINT {TABLE}_pkey TO {name}_pkey')
+    op.execute(f'ALTER TABLE {name} RENAME CONSTRAINT uq_user_date TO uq_user_date_{name}')
+    op.drop_index('ix_daily_sleep_surveys_changed', table_name=name)
+    op.drop_index('ix_daily_sleep_surveys_user_changed', table_name=name)
+    op.drop_index(op.f('ix_daily_sleep_surveys_id'), table_name=name)
+
+
+def _copy_from(name):
+    columns = ', '.join(COLUMNS)
+    op.execute(f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {name}')
+    op.drop_table(name)
+    op.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _set_aside(f'{TABLE}_unpartitioned')
+    # The partition key has to be part of the primary key
+    _create_table(TABLE, ['id', 'survey_date'], postgresql_partition_by='RANGE (survey_date)')
+
+    # One partition per month from the oldest survey to a few months ahead;
+    # anything outside (e.g. far-future dates) goes to the default partition
+    op.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    current = date.today().replace(day=1)
+    oldest = op.get_bind().scalar(sa.text(f'SELECT min(survey_date) FROM {TABLE}_unpartitioned'))
+    month = min(oldest.replace(day=1), current) if oldest else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(
+            f'CREATE TABLE {TABLE}_y{month.year}m{month.month:02d} PARTITION OF {TABLE} '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    _copy_from(f'{TABLE}_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Months already archived by partitions.py are not restored
+    _set_aside(f'{TABLE}_partitioned')
+    _create_table(TABLE, ['id'])
+    _copy_from(f'{TABLE}_partitioned')
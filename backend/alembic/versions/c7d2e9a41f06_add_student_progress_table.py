@@ -0,0 +1,62 @@
+"""add student progress table
+
+Revision ID: c7d2e9a41f06
+Revises: 8e1f5c2b7d4a
+Create Date: 2026-10-19 16:20:37.581946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e9a41f06'
+down_revision: Union[str, Sequence[str], None] = '8e1f5c2b7d4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PRE_POST_TABLES = [
+    'sleep_surveys',
+    'cleveland_surveys',
+    'my_sleep_surveys',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('student_progress',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_surveys', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('quiz_pre', sa.Integer(), nullable=True),
+    sa.Column('quiz_post', sa.Integer(), nullable=True),
+    sa.Column('cleveland_surveys', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('cleveland_pre', sa.Integer(), nullable=True),
+    sa.Column('cleveland_post', sa.Integer(), nullable=True),
+    sa.Column('my_sleep_surveys', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('my_sleep_pre', sa.Float(), nullable=True),
+    sa.Column('my_sleep_post', sa.Float(), nullable=True),
+    sa.Column('source_changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_student_progress_source_changed_at'), 'student_progress', ['source_changed_at'], unique=False)
+    # Users changed since a watermark, for the incremental progress report
+    for table in PRE_POST_TABLES:
+        op.create_index(
+            f'ix_{table}_changed',
+            table,
+            [sa.text('coalesce(updated_at, created_at)')],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(PRE_POST_TABLES):
+        op.drop_index(f'ix_{table}_changed', table_name=table)
+    op.drop_index(op.f('ix_student_progress_source_changed_at'), table_name='student_progress')
+    op.drop_table('student_progress')
@@ -0,0 +1,29 @@
+"""recompute school daily rollups
+
+Revision ID: e5b8f2c7a910
+Revises: 7a2d9c4e1b36
+Create Date: 2026-10-21 11:02:44.518903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8f2c7a910'
+down_revision: Union[str, Sequence[str], None] = '7a2d9c4e1b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Bedtimes and wake times are now circular means; an empty table makes
+    # the next refresh a full one
+    op.execute('DELETE FROM school_daily_rollups')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM school_daily_rollups')
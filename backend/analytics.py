@@ -0,0 +1,315 @@
+"""Cohort analytics for program coordinators, computed with grouped SQL.
+
+Also usable from the command line:
+
+    python analytics.py quiz-items [--school S] [--group-by school] ...
+"""
+
+import argparse
+
+from sqlalchemy import Float, and_, cast, func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import (
+    DailySleepSurvey,
+    SleepSurvey,
+    StudentDailyMeans,
+    StudentProgress,
+    User,
+)
+from sleep_survey_answer_key import SLEEP_SURVEY_ANSWER_KEY, correct_answer_expressions
+
+COHORT_COLUMNS = {
+    "school": User.school,
+    "school_year": User.school_year,
+    "gender": User.gender,
+}
+
+DISTRIBUTION_PERCENTILES = {"p10": 0.1, "median": 0.5, "p90": 0.9}
+
+
+def time_to_minutes_expression(column):
+    """Minutes from midnight of a TIME column, as in calculate_daily_survey_means."""
+    # date_part is float8, extract() would aggregate as numeric
+    return func.date_part("hour", column) * 60 + func.date_part("minute", column)
+
+
+# Same metrics, keys and time conversion as DailySurveysInfo's means
+DAILY_METRIC_EXPRESSIONS = {
+    "meanSleepDuration": DailySleepSurvey.horas_que_dormiste,
+    "meanWakeTime": time_to_minutes_expression(DailySleepSurvey.hora_levantaste_hoje),
+    "meanBedtime": time_to_minutes_expression(DailySleepSurvey.hora_deitaste_ontem),
+    "meanTimeToSleep": DailySleepSurvey.tempo_ate_adormecer,
+    "meanNightAwakenings": DailySleepSurvey.vezes_acordaste_noite,
+    "meanSleepQuality": DailySleepSurvey.qualidade_sono_noite,
+}
+
+# student_daily_means column holding each student's mean of those metrics
+STUDENT_MEAN_COLUMNS = {
+    "meanSleepDuration": StudentDailyMeans.mean_sleep_duration,
+    "meanWakeTime": StudentDailyMeans.mean_wake_time,
+    "meanBedtime": StudentDailyMeans.mean_bedtime,
+    "meanTimeToSleep": StudentDailyMeans.mean_time_to_sleep,
+    "meanNightAwakenings": StudentDailyMeans.mean_night_awakenings,
+    "meanSleepQuality": StudentDailyMeans.mean_sleep_quality,
+}
+
+
+def cohort_filter(filters: dict[str, object]):
+    """WHERE clause on the users cohort columns (ix_users_cohort)."""
+    return and_(
+        *(
+            COHORT_COLUMNS[name] == value
+            for name, value in filters.items()
+            if value is not None
+        )
+    )
+
+
+def cohort_groups(
+    results: dict[tuple, object], filters: dict[str, object], group_by: list[str]
+) -> list[tuple[dict[str, object], object]]:
+    """Pair each group's cohort fields (filters + group key) with its result."""
+    return [
+        ({**filters, **dict(zip(group_by, key, strict=True))}, value)
+        for key, value in sorted(
+            results.items(), key=lambda item: [str(v) for v in item[0]]
+        )
+    ]
+
+
+def latest_per_user(model, value_expression, label: str):
+    """One value per user from their latest survey (DISTINCT ON)."""
+    return (
+        select(model.user_id, value_expression.label(label))
+        .distinct(model.user_id)
+        .order_by(model.user_id, model.survey_date.desc())
+        .subquery()
+    )
+
+
+def _distribution_columns(value, prefix: str) -> list:
+    value = cast(value, Float)
+    columns = [
+        func.count(value).label(f"{prefix}__n"),
+        func.avg(value).label(f"{prefix}__mean"),
+    ]
+    for name, fraction in DISTRIBUTION_PERCENTILES.items():
+        columns.append(
+            func.percentile_cont(fraction)
+            .within_group(value)
+            .label(f"{prefix}__{name}")
+        )
+    return columns
+
+
+def _grouped_distributions(
+    db: Session,
+    per_user,
+    metrics: list[str],
+    filters: dict[str, object],
+    group_by: list[str],
+) -> dict[tuple, dict[str, dict]]:
+    """Aggregate per-user values into distributions per cohort group."""
+    group_columns = [COHORT_COLUMNS[name].label(name) for name in group_by]
+    columns = [
+        column
+        for metric in metrics
+        for column in _distribution_columns(per_user.c[metric], metric)
+    ]
+    query = (
+        select(*group_columns, *columns)
+        .select_from(User)
+        .join(per_user, per_user.c.user_id == User.id)
+        .where(cohort_filter(filters))
+        .group_by(*group_columns)
+    )
+
+    groups = {}
+    for row in db.execute(query).mappings():
+        key = tuple(row[name] for name in group_by)
+        groups[key] = {
+            metric: {
+                "n": row[f"{metric}__n"],
+                "mean": _round(row[f"{metric}__mean"]),
+                **{
+                    name: _round(row[f"{metric}__{name}"])
+                    for name in DISTRIBUTION_PERCENTILES
+                },
+            }
+            for metric in metrics
+        }
+    return groups
+
+
+def _round(value: float | None) -> float | None:
+    return round(float(value), 2) if value is not None else None
+
+
+def cohort_distributions(
+    db: Session, filters: dict[str, object], group_by: list[str]
+) -> dict[tuple, dict[str, dict]]:
+    """Metric distributions across students for each cohort group.
+
+    Each student contributes one value per metric: the score of their latest
+    knowledge quiz and Cleveland survey, and the mean of each daily metric
+    over all their entries. Both are read from per-student tables kept up to
+    date in the background (student_progress, student_daily_means), so the
+    cost is one row per student whatever the length of their history.
+    """
+    # The latest score is the post score, or the pre score of a single survey
+    scores = select(
+        StudentProgress.user_id,
+        func.coalesce(StudentProgress.quiz_post, StudentProgress.quiz_pre).label(
+            "quizScore"
+        ),
+        func.coalesce(
+            StudentProgress.cleveland_post, StudentProgress.cleveland_pre
+        ).label("clevelandScore"),
+    ).subquery()
+    daily = select(
+        StudentDailyMeans.user_id,
+        *(column.label(metric) for metric, column in STUDENT_MEAN_COLUMNS.items()),
+    ).subquery()
+
+    results: dict[tuple, dict[str, dict]] = {}
+    for per_user, metrics in (
+        (scores, ["quizScore", "clevelandScore"]),
+        (daily, list(STUDENT_MEAN_COLUMNS)),
+    ):
+        for key, distributions in _grouped_distributions(
+            db, per_user, metrics, filters, group_by
+        ).items():
+            results.setdefault(key, {}).update(distributions)
+    return results
+
+
+def _percentage(value: float | None) -> float | None:
+    return _round(value * 100) if value is not None else None
+
+
+def quiz_item_analysis(
+    db: Session, filters: dict[str, object], group_by: list[str]
+) -> dict[tuple, dict]:
+    """Per-question percentage correct of the knowledge quiz per cohort group.
+
+    ``pct_correct`` covers every submitted quiz. ``pre_pct_correct`` and
+    ``post_pct_correct`` compare each student's first and last quiz, for the
+    students who answered it more than once. One scan of sleep_surveys: a
+    window numbers each student's quizzes and FILTERed averages split them.
+    """
+    ordered_by_user = {"partition_by": SleepSurvey.user_id}
+    answers = (
+        select(
+            SleepSurvey.user_id,
+            *(
+                expression.label(field_name)
+                for field_name, expression in correct_answer_expressions(
+                    SleepSurvey
+                ).items()
+            ),
+            func.row_number()
+            .over(**ordered_by_user, order_by=SleepSurvey.survey_date)
+            .label("attempt"),
+            func.count().over(**ordered_by_user).label("attempts"),
+        )
+    ).subquery()
+
+    paired = answers.c.attempts > 1
+    first = and_(paired, answers.c.attempt == 1)
+    last = and_(paired, answers.c.attempt == answers.c.attempts)
+
+    group_columns = [COHORT_COLUMNS[name].label(name) for name in group_by]
+    columns = [
+        func.count().label("responses"),
+        func.count().filter(first).label("paired_students"),
+    ]
+    for field_name in SLEEP_SURVEY_ANSWER_KEY:
+        correct = cast(answers.c[field_name], Float)
+        columns += [
+            func.avg(correct).label(f"{field_name}__all"),
+            func.avg(correct).filter(first).label(f"{field_name}__pre"),
+            func.avg(correct).filter(last).label(f"{field_name}__post"),
+        ]
+    query = (
+        select(*group_columns, *columns)
+        .select_from(User)
+        .join(answers, answers.c.user_id == User.id)
+        .where(cohort_filter(filters))
+        .group_by(*group_columns)
+    )
+
+    groups = {}
+    for row in db.execute(query).mappings():
+        items = []
+        for question, field_name in enumerate(SLEEP_SURVEY_ANSWER_KEY, start=1):
+            pre = _percentage(row[f"{field_name}__pre"])
+            post = _percentage(row[f"{field_name}__post"])
+            items.append(
+                {
+                    "question": question,
+                    "field": field_name,
+                    "pct_correct": _percentage(row[f"{field_name}__all"]),
+                    "pre_pct_correct": pre,
+                    "post_pct_correct": post,
+                    "change": _round(post - pre) if pre is not None else None,
+                }
+            )
+        groups[tuple(row[name] for name in group_by)] = {
+            "responses": row["responses"],
+            "paired_students": row["paired_students"],
+            "items": items,
+        }
+    return groups
+
+
+def _format_percentage(value: float | None) -> str:
+    return f"{value:6.1f}" if value is not None else "     -"
+
+
+def print_quiz_items(args: argparse.Namespace) -> None:
+    filters = {
+        "school": args.school,
+        "school_year": args.school_year,
+        "gender": args.gender,
+    }
+    group_by = list(dict.fromkeys(args.group_by))
+    with SessionLocal() as db:
+        results = quiz_item_analysis(db, filters, group_by)
+
+    for fields, group in cohort_groups(results, filters, group_by):
+        cohort = ", ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+        print(
+            f"\n[{cohort or 'all students'}] {group['responses']} responses, "
+            f"{group['paired_students']} students with pre/post"
+        )
+        print("   Q  %corr    pre   post  change  field")
+        # Most common misconceptions first
+        for item in sorted(group["items"], key=lambda item: item["pct_correct"]):
+            print(
+                f"  {item['question']:2d} "
+                f"{_format_percentage(item['pct_correct'])} "
+                f"{_format_percentage(item['pre_pct_correct'])} "
+                f"{_format_percentage(item['post_pct_correct'])} "
+                f" {_format_percentage(item['change'])}  {item['field']}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quiz_items = commands.add_parser(
+        "quiz-items", help="per-question percentage correct of the knowledge quiz"
+    )
+    quiz_items.add_argument("--school")
+    quiz_items.add_argument("--school-year", type=int)
+    quiz_items.add_argument("--gender", choices=["M", "F", "O"])
+    quiz_items.add_argument(
+        "--group-by", action="append", default=[], choices=list(COHORT_COLUMNS)
+    )
+    quiz_items.set_defaults(handler=print_quiz_items)
+
+    arguments = parser.parse_args()
+    arguments.handler(arguments)
@@ -0,0 +1,147 @@
+"""Time the NumPy scoring kernel against the per-object functions.
+
+Equivalence of the two is tested in tests/test_scoring_kernel.py.
+
+Usage (from backend/):
+
+    uv run python -m benchmarks.batch_scoring
+"""
+
+import random
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+import numpy as np
+
+import scoring_kernel as kernel
+from main import calculate_daily_survey_means, calculate_my_sleep_survey_means
+from models import ClevelandSurvey, DailySleepSurvey, MySleepSurvey, SleepSurvey
+from sleep_survey_answer_key import calculate_score_from_survey
+
+USER_COUNTS = [100, 1000, 5000]
+DAILY_PER_USER = 40
+EVALUATIONS_PER_USER = 2
+
+WINDOWS = (7, 15, 30)
+
+
+def build_surveys(users: int, rng: random.Random) -> dict[str, list]:
+    """Transient survey objects, grouped by user, most recent first."""
+    surveys = {"quiz": [], "cleveland": [], "my_sleep": [], "daily": []}
+    start = date(2025, 9, 1)
+    for user_id in range(1, users + 1):
+        for offset in reversed(range(EVALUATIONS_PER_USER)):
+            survey_date = start + timedelta(days=90 * offset)
+            surveys["quiz"].append(
+                SleepSurvey(
+                    user_id=user_id,
+                    survey_date=survey_date,
+                    **{f: rng.random() < 0.6 for f in kernel.QUIZ_FIELDS},
+                )
+            )
+            surveys["cleveland"].append(
+                ClevelandSurvey(
+                    user_id=user_id,
+                    survey_date=survey_date,
+                    **{f: rng.randint(1, 5) for f in kernel.CLEVELAND_FIELDS},
+                )
+            )
+            surveys["my_sleep"].append(
+                MySleepSurvey(
+                    user_id=user_id,
+                    survey_date=survey_date,
+                    **{f: rng.randint(1, 10) for f in kernel.MY_SLEEP_FIELDS},
+                )
+            )
+        for day in reversed(range(rng.randint(1, DAILY_PER_USER))):
+            surveys["daily"].append(
+                DailySleepSurvey(
+                    user_id=user_id,
+                    survey_date=start + timedelta(days=day),
+                    hora_levantaste_hoje=clock(rng.randint(6, 9), rng.randint(0, 59)),
+                    hora_deitaste_ontem=clock(rng.choice([21, 22, 23, 0, 1]), 30),
+                    tempo_ate_adormecer=rng.randint(0, 90),
+                    vezes_acordaste_noite=rng.randint(0, 4),
+                    horas_que_dormiste=rng.randint(300, 600),
+                    qualidade_sono_noite=rng.randint(0, 5),
+                )
+            )
+    return surveys
+
+
+def cursor_rows(surveys: list, fields: tuple[str, ...]) -> list[tuple]:
+    """(user_id, *fields) tuples as the DB would return them, times as minutes."""
+
+    def value(survey, field):
+        raw = getattr(survey, field)
+        if field in kernel.DAILY_TIME_FIELDS and raw is not None:
+            return raw.hour * 60 + raw.minute
+        return raw
+
+    return [(s.user_id, *(value(s, f) for f in fields)) for s in surveys]
+
+
+def by_user(surveys: list) -> list[list]:
+    groups: dict[int, list] = {}
+    for survey in surveys:
+        groups.setdefault(survey.user_id, []).append(survey)
+    return list(groups.values())
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1e3
+
+
+def python_path(surveys: dict[str, list]):
+    return (
+        [calculate_score_from_survey(s) for s in surveys["quiz"]],
+        [s.cleveland_score() for s in surveys["cleveland"]],
+        [calculate_daily_survey_means(group) for group in by_user(surveys["daily"])],
+        [calculate_my_sleep_survey_means(g) for g in by_user(surveys["my_sleep"])],
+    )
+
+
+def kernel_path(rows: dict[str, list[tuple]]):
+    def split(name):
+        data = kernel.columns(rows[name])
+        return data[:, 0].astype(np.int64), data[:, 1:]
+
+    _, answers = split("quiz")
+    _, items = split("cleveland")
+    daily_users, daily = split("daily")
+    my_sleep_users, my_sleep = split("my_sleep")
+    return (
+        kernel.quiz_scores(answers),
+        kernel.cleveland_scores(items),
+        kernel.windowed_means(daily_users, daily, WINDOWS)[1],
+        kernel.windowed_means(my_sleep_users, my_sleep, (None,))[1][None],
+    )
+
+
+def main() -> None:
+    rng = random.Random(38)
+    print(
+        f"{'users':>6} {'surveys':>8} {'python ms':>10} {'kernel ms':>10} {'speedup':>8}"
+    )
+    for users in USER_COUNTS:
+        surveys = build_surveys(users, rng)
+        rows = {
+            "quiz": cursor_rows(surveys["quiz"], kernel.QUIZ_FIELDS),
+            "cleveland": cursor_rows(surveys["cleveland"], kernel.CLEVELAND_FIELDS),
+            "daily": cursor_rows(surveys["daily"], kernel.DAILY_FIELDS),
+            "my_sleep": cursor_rows(surveys["my_sleep"], kernel.MY_SLEEP_FIELDS),
+        }
+        _, python_ms = timed(python_path, surveys)
+        _, kernel_ms = timed(kernel_path, rows)
+        total = sum(len(group) for group in surveys.values())
+        print(
+            f"{users:>6} {total:>8} {python_ms:>10.1f} {kernel_ms:>10.1f} "
+            f"{python_ms / kernel_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
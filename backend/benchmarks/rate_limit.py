@@ -0,0 +1,75 @@
+"""Benchmark the overhead of rate limiting a login with the memory store.
+
+Compares a rate limit check (IP and email buckets, as on POST /auth/login)
+with parsing the request body, which the endpoint does anyway before any
+database work, and the throughput of the sharded store with that of a
+single lock under concurrent threads.
+
+Usage (from backend/):
+
+    uv run python -m benchmarks.rate_limit
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import MemoryRateLimitStore, RateLimiter
+from schemas import UserLogin
+
+REPEAT = 100_000
+KEYS = 10_000
+THREADS = [1, 4, 16]
+# Never exhausted, so every check takes the allowed path
+LIMITS = {("login", "ip"): (10**9, 1.0), ("login", "email"): (10**9, 1.0)}
+
+
+def per_call_us(fn, repeat: int = REPEAT) -> float:
+    started = time.perf_counter()
+    for index in range(repeat):
+        fn(index)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def check_login(limiter: RateLimiter):
+    def check(index: int) -> None:
+        key = index % KEYS
+        limiter.check("login", ip=f"10.0.{key // 256}.{key % 256}", email=f"{key}@x.pt")
+
+    return check
+
+
+def throughput(limiter: RateLimiter, threads: int) -> float:
+    """Checks per second with ``threads`` threads checking concurrently."""
+    check = check_login(limiter)
+    per_thread = REPEAT // threads
+
+    def work(offset: int) -> None:
+        for index in range(offset, offset + per_thread):
+            check(index)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, range(0, REPEAT, per_thread)))
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main() -> None:
+    body = b'{"email": "ana.silva@example.com", "password": "correct horse"}'
+    parse = per_call_us(lambda index: UserLogin.model_validate_json(body))
+    sharded = RateLimiter(MemoryRateLimitStore(), LIMITS)
+    check = per_call_us(check_login(sharded))
+    print(f"login body parsing:     {parse:>7.2f} us")
+    print(f"login rate limit check: {check:>7.2f} us ({check / parse:.0%} of parsing)")
+
+    print(f"\n{'threads':>7} {'1 lock/s':>11} {'64 shards/s':>12}")
+    for threads in THREADS:
+        single = RateLimiter(MemoryRateLimitStore(shards=1), LIMITS)
+        sharded = RateLimiter(MemoryRateLimitStore(), LIMITS)
+        print(
+            f"{threads:>7} {throughput(single, threads):>11,.0f} "
+            f"{throughput(sharded, threads):>12,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark GET /user serialization: FastAPI response_model path vs ModelResponse.
+
+Usage (from backend/):
+
+    uv run python -m benchmarks.user_serialization
+"""
+
+import asyncio
+import time
+from datetime import date, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from responses import ModelResponse
+from schemas import DailySurveysInfo, MeanMetrics, SurveyData, UserResponse
+
+PAYLOAD_DAYS = [7, 30, 180, 365, 1000, 5000]
+REPEAT = 200
+
+
+def build_user_response(days: int) -> UserResponse:
+    metrics = MeanMetrics(last_7_days=420.5, last_15_days=431.25, last_30_days=None)
+    start = date(2025, 9, 1)
+    return UserResponse(
+        email="student@example.com",
+        first_name="Ana",
+        last_name="Silva",
+        birth_date=date(2009, 3, 14),
+        gender="F",
+        school="Escola Secundária",
+        school_year=11,
+        evaluation_surveys=[
+            SurveyData(
+                date=start,
+                score=14,
+                my_sleep_means={"durmoMalOuBem": 6.5, "gostoDeDormir": 8.0},
+                cleveland_mean=31.0,
+            )
+        ],
+        daily_surveys=DailySurveysInfo(
+            target=7,
+            dates=[start + timedelta(days=day) for day in range(days)],
+            mean_sleep_duration=metrics,
+            mean_wake_time=metrics,
+            mean_bedtime=metrics,
+            mean_time_to_sleep=metrics,
+            mean_night_awakenings=metrics,
+            mean_sleep_quality=metrics,
+        ),
+    )
+
+
+async def fastapi_path(field, model: UserResponse) -> bytes:
+    """What FastAPI does for `return model` with response_model=UserResponse."""
+    content = await serialize_response(
+        field=field, response_content=model, is_coroutine=False
+    )
+    return JSONResponse(content).body
+
+
+def model_response_path(model: UserResponse) -> bytes:
+    return ModelResponse(model).body
+
+
+async def timeit(fn, *args) -> float:
+    """Mean microseconds per call, awaiting fn if it is a coroutine function."""
+    is_async = asyncio.iscoroutinefunction(fn)
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        if is_async:
+            await fn(*args)
+        else:
+            fn(*args)
+    return (time.perf_counter() - started) / REPEAT * 1e6
+
+
+async def run() -> None:
+    field = create_model_field(
+        name="Response_get_user", type_=UserResponse, mode="serialization"
+    )
+    print(f"{'days':>6} {'bytes':>8} {'fastapi us':>11} {'model us':>9} {'speedup':>8}")
+    for days in PAYLOAD_DAYS:
+        model = build_user_response(days)
+        fast_body = model_response_path(model)
+        assert fast_body == await fastapi_path(field, model), "output differs"
+        baseline = await timeit(fastapi_path, field, model)
+        fast = await timeit(model_response_path, model)
+        print(
+            f"{days:>6} {len(fast_body):>8} {baseline:>11.1f} {fast:>9.1f} "
+            f"{baseline / fast:>7.1f}x"
+        )
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
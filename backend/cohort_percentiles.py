@@ -0,0 +1,153 @@
+"""Where a student's scores fall among their school/year peers.
+
+Each worker keeps, per (school, school_year) cohort, sorted arrays of one
+value per student: latest quiz score, Cleveland mean and mean sleep
+duration. Lookups bisect those arrays; the arrays are rebuilt periodically
+by the scheduler with one grouped query per metric.
+
+Memory is bounded: a cohort larger than COHORT_PERCENTILES_MAX_SAMPLES keeps
+that many evenly spaced quantiles instead of every value, which moves a
+percentile by at most 100 / COHORT_PERCENTILES_MAX_SAMPLES points.
+"""
+
+import hashlib
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Session
+
+from analytics import latest_per_user
+from config import COHORT_PERCENTILES_MAX_SAMPLES, COHORT_PERCENTILES_MIN_COHORT
+from database import SessionLocal
+from logging_config import get_logger
+from metrics import metrics
+from models import ClevelandSurvey, DailySleepSurvey, SleepSurvey, User
+from sleep_survey_answer_key import score_expression
+
+logger = get_logger("percentiles")
+
+QUIZ_SCORE = "quiz_score"
+CLEVELAND_MEAN = "cleveland_mean"
+MEAN_SLEEP_DURATION = "mean_sleep_duration"
+
+CohortKey = tuple[str, int]
+
+
+def _per_student_values():
+    """One subquery per metric with (user_id, value), as shown on the dashboard."""
+
+    def mean_per_user(model, expression, label):
+        return (
+            select(model.user_id, func.avg(cast(expression, Float)).label(label))
+            .group_by(model.user_id)
+            .subquery()
+        )
+
+    return {
+        QUIZ_SCORE: latest_per_user(
+            SleepSurvey, score_expression(SleepSurvey), QUIZ_SCORE
+        ),
+        CLEVELAND_MEAN: mean_per_user(
+            ClevelandSurvey,
+            ClevelandSurvey.cleveland_score_expression(),
+            CLEVELAND_MEAN,
+        ),
+        MEAN_SLEEP_DURATION: mean_per_user(
+            DailySleepSurvey,
+            DailySleepSurvey.horas_que_dormiste,
+            MEAN_SLEEP_DURATION,
+        ),
+    }
+
+
+def _bounded(values: list[float], max_samples: int) -> array:
+    """Sorted values, thinned to ``max_samples`` evenly spaced quantiles."""
+    if len(values) <= max_samples:
+        return array("d", values)
+    step = (len(values) - 1) / (max_samples - 1)
+    return array("d", (values[round(i * step)] for i in range(max_samples)))
+
+
+class CohortPercentiles:
+    """Per-cohort sorted score arrays, swapped in whole on every rebuild."""
+
+    def __init__(
+        self,
+        max_samples: int = COHORT_PERCENTILES_MAX_SAMPLES,
+        min_cohort: int = COHORT_PERCENTILES_MIN_COHORT,
+    ):
+        self.max_samples = max_samples
+        self.min_cohort = min_cohort
+        self._distributions: dict[CohortKey, dict[str, array]] = {}
+        # Content hash: identical on every worker holding the same data, so
+        # it can go into ETags
+        self.version = ""
+
+    def rebuild(self, db: Session) -> None:
+        started = time.perf_counter()
+        distributions: dict[CohortKey, dict[str, array]] = {}
+        for metric, per_student in _per_student_values().items():
+            value = per_student.c[metric]
+            query = (
+                select(
+                    User.school,
+                    User.school_year,
+                    func.array_agg(aggregate_order_by(cast(value, Float), value)),
+                )
+                .join(per_student, per_student.c.user_id == User.id)
+                .where(value.is_not(None))
+                .group_by(User.school, User.school_year)
+            )
+            for school, school_year, values in db.execute(query):
+                cohort = distributions.setdefault((school, school_year), {})
+                cohort[metric] = _bounded(values, self.max_samples)
+
+        digest = hashlib.sha1()
+        nbytes = 0
+        for key in sorted(distributions):
+            digest.update(repr(key).encode())
+            for metric in sorted(distributions[key]):
+                values = distributions[key][metric]
+                digest.update(metric.encode())
+                digest.update(values.tobytes())
+                nbytes += values.itemsize * len(values)
+
+        self._distributions = distributions
+        self.version = digest.hexdigest()[:16]
+
+        elapsed = time.perf_counter() - started
+        metrics.observe("cohort_percentiles_build_seconds", elapsed)
+        metrics.set("cohort_percentiles_bytes", nbytes)
+        metrics.set("cohort_percentiles_cohorts", len(distributions))
+        logger.info(
+            f"Cohort percentiles rebuilt: {len(distributions)} cohorts, "
+            f"{nbytes} bytes in {elapsed:.3f}s"
+        )
+
+    def percentile(
+        self, school: str, school_year: int, metric: str, value: float | None
+    ) -> float | None:
+        """Mid-rank percentile (0-100) of ``value`` within the student's cohort.
+
+        None when there is no value or the cohort is too small to compare.
+        """
+        if value is None:
+            return None
+        values = self._distributions.get((school, school_year), {}).get(metric)
+        if values is None or len(values) < self.min_cohort:
+            return None
+        below = bisect_left(values, value)
+        equal = bisect_right(values, value, lo=below) - below
+        return round(100 * (below + equal / 2) / len(values), 1)
+
+
+cohort_percentiles = CohortPercentiles()
+
+
+def rebuild_cohort_percentiles_job() -> None:
+    """Scheduler entry point: rebuild in its own session."""
+    with SessionLocal() as db:
+        cohort_percentiles.rebuild(db)
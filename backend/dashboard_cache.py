@@ -0,0 +1,126 @@
+"""In-process cache of serialized GET /user payloads and their compressed forms."""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import Request, Response
+
+from compression import compress, negotiate_encoding
+from config import COMPRESSION_MIN_SIZE, DASHBOARD_CACHE_SIZE
+from http_cache import encoded_etag, set_validators
+from logging_config import get_logger
+from metrics import metrics
+
+logger = get_logger("dashboard_cache")
+
+
+class CachedPayload:
+    """A serialized JSON body plus lazily built, memoized compressed variants."""
+
+    __slots__ = ("body", "etag", "last_modified", "_encoded", "_lock")
+
+    def __init__(self, body: bytes, etag: str, last_modified: datetime | None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self._encoded: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """Return the body compressed with ``encoding``, compressing at most once."""
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                data = compress(self.body, encoding)
+                self._encoded[encoding] = data
+                metrics.incr("dashboard_cache_compressions", encoding=encoding)
+            return data
+
+    def response(self, request: Request) -> Response:
+        """Build a response, using a cached compressed variant when accepted."""
+        headers = {"Vary": "Accept-Encoding"}
+        body, etag = self.body, self.etag
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None and len(body) >= COMPRESSION_MIN_SIZE:
+            body = self.encoded(encoding)
+            etag = encoded_etag(etag, encoding)
+            headers["Content-Encoding"] = encoding
+
+        response = Response(body, media_type="application/json", headers=headers)
+        set_validators(response, etag, self.last_modified)
+        return response
+
+
+class DashboardCache:
+    """Bounded LRU of payloads, one entry per (user, variant) key.
+
+    Entries are only served while their ETag still matches the current data
+    version, so a write never needs to invalidate anything explicitly.
+    """
+
+    def __init__(self, max_entries: int = DASHBOARD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, CachedPayload] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, etag: str) -> CachedPayload | None:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None or payload.etag != etag:
+                metrics.incr("dashboard_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.incr("dashboard_cache_hits")
+        return payload
+
+    def latest(self, key: Hashable) -> CachedPayload | None:
+        """The last payload stored for ``key``, whether current or not."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: Hashable, payload: CachedPayload) -> None:
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            metrics.set("dashboard_cache_entries", len(self._entries))
+
+
+dashboard_cache = DashboardCache()
+
+
+class BackgroundRefresher:
+    """Runs refreshes on one background thread, at most one queued per key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queued: set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, refresh: Callable[[], object]) -> bool:
+        """Queue ``refresh`` unless one for ``key`` is already queued."""
+        with self._lock:
+            if key in self._queued:
+                return False
+            self._queued.add(key)
+        self._executor.submit(self._run, key, refresh)
+        return True
+
+    def _run(self, key: Hashable, refresh: Callable[[], object]) -> None:
+        with self._lock:
+            self._queued.discard(key)
+        try:
+            refresh()
+            metrics.incr("background_refreshes", refresher=self.name)
+        except Exception:
+            metrics.incr("background_refresh_failures", refresher=self.name)
+            logger.exception(f"Background refresh of {key} failed")
+
+
+# Stale dashboards served in degraded mode are recomputed here
+dashboard_refresher = BackgroundRefresher("dashboard-refresh")
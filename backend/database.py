@@ -1,18 +1,264 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import itertools
+import threading
+import time
 
-from config import DATABASE_URL
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from config import (
+    DATABASE_REPLICA_URLS,
+    DATABASE_URL,
+    DEGRADED_POOL_WAIT_MS,
+    DEGRADED_QUERY_LATENCY_MS,
+    READ_YOUR_WRITES_SECONDS,
+    REPLICA_LAG_CHECK_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+)
+from logging_config import get_logger
+from metrics import metrics
+from query_deadlines import bind_session
+
+logger = get_logger("database")
+
+# Samples older than this no longer say anything about the current load
+PRESSURE_SAMPLE_TTL = 30
+PRESSURE_SMOOTHING = 0.2
+
+
+class DatabasePressure:
+    """Smoothed statement latency and pool wait, and whether reads degrade.
+
+    Both are exponentially weighted moving averages over all engines. The
+    database counts as under pressure once either average crosses its
+    threshold (0 disables it), and until both are back under half of it.
+    """
+
+    def __init__(
+        self,
+        query_latency_ms: float = DEGRADED_QUERY_LATENCY_MS,
+        pool_wait_ms: float = DEGRADED_POOL_WAIT_MS,
+    ):
+        self.thresholds = {"query_latency": query_latency_ms, "pool_wait": pool_wait_ms}
+        self._averages: dict[str, tuple[float, float]] = {}  # -> (updated, ms)
+        self._degraded = False
+        self._lock = threading.Lock()
+
+    def observe(self, signal: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            updated, average = self._averages.get(signal, (now, None))
+            if average is None or now - updated > PRESSURE_SAMPLE_TTL:
+                average = seconds * 1000
+            else:
+                average += PRESSURE_SMOOTHING * (seconds * 1000 - average)
+            self._averages[signal] = (now, average)
+        metrics.set(f"db_{signal}_ms", round(average, 1))
+
+    def average(self, signal: str) -> float:
+        """Current average of ``signal`` in ms, 0 when no recent samples."""
+        updated, average = self._averages.get(signal, (0, 0))
+        return average if time.monotonic() - updated <= PRESSURE_SAMPLE_TTL else 0
+
+    @property
+    def degraded(self) -> bool:
+        limits = {
+            signal: threshold
+            for signal, threshold in self.thresholds.items()
+            if threshold > 0
+        }
+        with self._lock:
+            # Hysteresis: recover only once well below the thresholds
+            factor = 0.5 if self._degraded else 1
+            degraded = any(
+                self.average(signal) > limit * factor
+                for signal, limit in limits.items()
+            )
+            changed = degraded != self._degraded
+            self._degraded = degraded
+        if changed:
+            metrics.set("db_degraded", int(degraded))
+            metrics.incr("db_degraded_transitions")
+            averages = {signal: round(self.average(signal)) for signal in limits}
+            state = "under pressure" if degraded else "recovered"
+            logger.warning(f"Database {state}: {averages} ms")
+        return degraded
+
+
+pressure = DatabasePressure()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool reporting how long each checkout waited to DatabasePressure."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pressure.observe("pool_wait", time.perf_counter() - started)
+
+
+def _time_statements(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("statement_started", None)
+        if started is not None:
+            pressure.observe("query_latency", time.perf_counter() - started)
 
 
 engine = create_engine(
     DATABASE_URL,
+    poolclass=TimedQueuePool,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Replica sessions refuse writes even when the URL points at a primary
+replica_engines = [
+    create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_pre_ping=True,
+        execution_options={"postgresql_readonly": True},
+    )
+    for url in DATABASE_REPLICA_URLS
+]
+for _engine in (engine, *replica_engines):
+    _time_statements(_engine)
+
+# 0 on a primary or a replica that has replayed everything it received,
+# otherwise the age of the last replayed transaction
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaRouter:
+    """Chooses the engine for read-only sessions.
+
+    Replicas are used round-robin while their lag is within ``max_lag``.
+    Lag is sampled off the request path by :meth:`measure_lags`, run every
+    ``lag_check_interval`` by the scheduler; a replica that is unreachable,
+    not sampled yet, or whose last sample is older than three intervals
+    counts as lagging. A user who committed a write in the last
+    ``sticky_seconds`` reads from the primary, so they see their own
+    write. Recent writers are tracked per process.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: list[Engine],
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        lag_check_interval: float = REPLICA_LAG_CHECK_SECONDS,
+        sticky_seconds: float = READ_YOUR_WRITES_SECONDS,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.sticky_seconds = sticky_seconds
+        self._lag: dict[int, tuple[float, float]] = {}  # index -> (checked, lag)
+        self._recent_writes: dict[int, float] = {}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def note_write(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[user_id] = now
+            # Drop expired entries now and then, so the map stays small
+            if len(self._recent_writes) > 1024:
+                self._recent_writes = {
+                    user: at
+                    for user, at in self._recent_writes.items()
+                    if now - at < self.sticky_seconds
+                }
+
+    def wrote_recently(self, user_id: int | None) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            written_at = self._recent_writes.get(user_id)
+        return (
+            written_at is not None
+            and time.monotonic() - written_at < self.sticky_seconds
+        )
+
+    def measure_lag(self, replica: Engine) -> float:
+        with replica.connect() as connection:
+            return float(connection.execute(REPLICA_LAG_QUERY).scalar())
+
+    def measure_lags(self) -> None:
+        """Sample the lag of every replica, for :meth:`lag` to read."""
+        for index, replica in enumerate(self.replicas):
+            try:
+                lag = self.measure_lag(replica)
+            except Exception as exc:
+                logger.warning(f"Replica {index} unavailable: {exc}")
+                lag = float("inf")
+            self._lag[index] = (time.monotonic(), lag)
+            metrics.set("db_replica_lag_seconds", lag, replica=index)
+
+    def lag(self, index: int) -> float:
+        """Last sampled lag of replica ``index``, infinite when unknown or stale."""
+        checked, lag = self._lag.get(index, (None, None))
+        if checked is None or time.monotonic() - checked > 3 * self.lag_check_interval:
+            return float("inf")
+        return lag
+
+    def engine_for(self, user_id: int | None = None) -> Engine:
+        if self.replicas and not self.wrote_recently(user_id):
+            start = next(self._turn)
+            for offset in range(len(self.replicas)):
+                index = (start + offset) % len(self.replicas)
+                if self.lag(index) <= self.max_lag:
+                    metrics.incr("db_read_sessions", target="replica")
+                    return self.replicas[index]
+        metrics.incr("db_read_sessions", target="primary")
+        return self.primary
+
 
-def get_db():
+router = ReplicaRouter(engine, replica_engines)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_writer(session: Session) -> None:
+    # get_current_user tags request sessions with the user id
+    user_id = session.info.get("user_id")
+    if user_id is not None:
+        router.note_write(user_id)
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    bind_session(db, request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def read_session(
+    user_id: int | None = None,
+    request: Request | None = None,
+    route_class: str | None = None,
+):
+    """Session for read-only work, on a replica when one is fit to serve it.
+
+    It gets the deadlines of ``request``, or of ``route_class`` outside one.
+    """
+    db = SessionLocal(bind=router.engine_for(user_id))
+    bind_session(db, request, route_class)
     try:
         yield db
     finally:
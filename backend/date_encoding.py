@@ -0,0 +1,112 @@
+"""Compact encodings for sets of calendar dates.
+
+Dates are handled as proleptic ordinals (``date.toordinal()``) so a set of
+days becomes a single Python int used as a bitset: bit ``i`` is day
+``start + i``. Two wire formats are produced from it, both base64:
+
+- ``bitmap``: the bitset as little-endian bytes (bit i -> byte i // 8,
+  bit i % 8).
+- ``rle``: LEB128 varints of alternating run lengths, starting with a run
+  of present days. Wins for long streaks and long gaps.
+"""
+
+import base64
+from collections.abc import Iterable
+from datetime import date
+
+BITMAP = "bitmap"
+RLE = "rle"
+
+
+def _bitset(ordinals: Iterable[int]) -> tuple[int, int]:
+    """Return (start ordinal, bitset) for the given day ordinals."""
+    ordinals = list(ordinals)
+    if not ordinals:
+        return 0, 0
+    start = min(ordinals)
+    bits = 0
+    for ordinal in ordinals:
+        bits |= 1 << (ordinal - start)
+    return start, bits
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _runs(bits: int) -> bytes:
+    """Encode a bitset (lowest bit set) as alternating run lengths."""
+    out = bytearray()
+    present = True
+    while bits:
+        if present:
+            # Length of the run of trailing ones
+            run = ((bits ^ (bits + 1)).bit_length()) - 1
+        else:
+            # Length of the run of trailing zeros
+            run = (bits & -bits).bit_length() - 1
+        out += _varint(run)
+        bits >>= run
+        present = not present
+    return bytes(out)
+
+
+def encode_dates(ordinals: Iterable[int]) -> tuple[date | None, int, str, str]:
+    """Encode day ordinals as (start, days, encoding, base64 data).
+
+    Picks whichever of ``bitmap`` / ``rle`` is shorter.
+    """
+    start, bits = _bitset(ordinals)
+    if not bits:
+        return None, 0, BITMAP, ""
+
+    days = bits.bit_length()
+    bitmap = bits.to_bytes((days + 7) // 8, "little")
+    runs = _runs(bits)
+    encoding, raw = (RLE, runs) if len(runs) < len(bitmap) else (BITMAP, bitmap)
+    return (
+        date.fromordinal(start),
+        days,
+        encoding,
+        base64.b64encode(raw).decode(),
+    )
+
+
+def decode_dates(start: date | None, encoding: str, data: str) -> list[date]:
+    """Inverse of encode_dates, mainly for clients and debugging."""
+    if start is None or not data:
+        return []
+    raw = base64.b64decode(data)
+    if encoding == BITMAP:
+        bits = int.from_bytes(raw, "little")
+    elif encoding == RLE:
+        bits, position, present, value, shift = 0, 0, True, 0, 0
+        for byte in raw:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte & 0x80:
+                continue
+            if present:
+                bits |= ((1 << value) - 1) << position
+            position += value
+            present, value, shift = not present, 0, 0
+    else:
+        raise ValueError(f"Unknown date encoding: {encoding}")
+
+    first = start.toordinal()
+    days = []
+    offset = 0
+    while bits:
+        if bits & 1:
+            days.append(date.fromordinal(first + offset))
+        bits >>= 1
+        offset += 1
+    return days
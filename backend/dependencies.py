@@ -0,0 +1,140 @@
+import hmac
+from typing import Annotated
+
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from auth import verify_token
+from config import ADMIN_EMAILS, METRICS_TOKEN
+from database import get_db, read_session
+from logging_config import get_logger
+from models import User
+from rate_limit import client_ip, rate_limiter
+from survey_spool import DATABASE_UNAVAILABLE, survey_spool
+
+logger = get_logger()
+
+
+def token_user_id(authorization: str | None) -> int | None:
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    payload = verify_token(authorization.split(" ")[1])
+    user_id = payload.get("sub") if payload else None
+    return int(user_id) if user_id and str(user_id).isdigit() else None
+
+
+def _authenticate(authorization: str, db: Session) -> User:
+    if not authorization.startswith("Bearer "):
+        logger.warning("Invalid authorization header format")
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+
+    token = authorization.split(" ")[1]
+    payload = verify_token(token)
+    if not payload:
+        logger.warning("Invalid or expired token")
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    user_id = payload.get("sub")
+    if not user_id:
+        logger.warning("Invalid token payload - missing user ID")
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+    user = db.query(User).filter(User.id == int(user_id)).first()
+    if not user:
+        logger.warning(f"User not found for ID: {user_id}")
+        raise HTTPException(status_code=401, detail="User not found")
+
+    # Lets database.router keep this user's next reads on the primary
+    db.info["user_id"] = user.id
+    return user
+
+
+def _require_admin(user: User) -> User:
+    if user.email.lower() not in ADMIN_EMAILS:
+        logger.warning(f"Admin access denied for user: {user.email}")
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return user
+
+
+def get_read_db(
+    request: Request, authorization: Annotated[str | None, Header()] = None
+):
+    """Session for read-only handlers: a replica unless the user just wrote."""
+    yield from read_session(token_user_id(authorization), request)
+
+
+def get_current_user(
+    authorization: Annotated[str, Header()], db: Annotated[Session, Depends(get_db)]
+) -> User:
+    return _authenticate(authorization, db)
+
+
+def _rate_limit_write(request: Request, authorization: str | None) -> None:
+    # By the token's user before authenticating it, sparing the lookup
+    rate_limiter.enforce(
+        "writes", ip=client_ip(request), user=token_user_id(authorization)
+    )
+
+
+def get_current_writer(
+    request: Request,
+    authorization: Annotated[str, Header()],
+    db: Annotated[Session, Depends(get_db)],
+) -> User:
+    """get_current_user for write handlers, rate limited."""
+    _rate_limit_write(request, authorization)
+    return _authenticate(authorization, db)
+
+
+def get_survey_submitter(
+    request: Request,
+    authorization: Annotated[str, Header()],
+    db: Annotated[Session, Depends(get_db)],
+) -> User:
+    """get_current_user for survey submissions, which can be spooled.
+
+    While submissions are spooled or the database is unavailable, the signed
+    token identifies the user on its own: a transient User carrying only the
+    id is returned instead of loading it.
+    """
+    _rate_limit_write(request, authorization)
+    user_id = token_user_id(authorization)
+    if user_id is not None and survey_spool.pending():
+        return User(id=user_id, email=f"<user {user_id}>")
+    try:
+        return _authenticate(authorization, db)
+    except DATABASE_UNAVAILABLE:
+        if user_id is None or not survey_spool.enabled:
+            raise
+        logger.warning(f"Database unavailable, accepting token of user {user_id}")
+        return User(id=user_id, email=f"<user {user_id}>")
+
+
+def get_current_reader(
+    authorization: Annotated[str, Header()],
+    db: Annotated[Session, Depends(get_read_db)],
+) -> User:
+    """get_current_user for read-only handlers, sharing their get_read_db session."""
+    return _authenticate(authorization, db)
+
+
+def get_admin_user(current_user: Annotated[User, Depends(get_current_user)]) -> User:
+    return _require_admin(current_user)
+
+
+def get_admin_reader(
+    current_user: Annotated[User, Depends(get_current_reader)],
+) -> User:
+    return _require_admin(current_user)
+
+
+def require_metrics_access(
+    authorization: Annotated[str, Header()],
+    db: Annotated[Session, Depends(get_read_db)],
+) -> None:
+    """The METRICS_TOKEN, or an admin user's token."""
+    expected = f"Bearer {METRICS_TOKEN}".encode()
+    if METRICS_TOKEN and hmac.compare_digest(authorization.encode(), expected):
+        return
+    _require_admin(_authenticate(authorization, db))
@@ -0,0 +1,80 @@
+"""HTTP conditional-request helpers (ETag / Last-Modified validators).
+
+ETags are quoted hex digests. A body sent compressed gets the ETag of its
+identity body with the encoding appended (encoded_etag, e.g. ``"<hex>-br"``),
+so caches never take one encoding's bytes for another's; If-None-Match
+matches a resource on any of its variants.
+"""
+
+import hashlib
+from datetime import UTC, datetime
+from email.utils import format_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: object) -> str:
+    """Build a strong ETag from the given version parts."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of the ``encoding`` compressed variant of a body."""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _identity_etag(candidate: str) -> str:
+    # Weak comparison, as If-None-Match uses, ignoring any encoding suffix
+    opaque = candidate.removeprefix("W/").strip('"')
+    return f'"{opaque.partition("-")[0]}"'
+
+
+def format_http_date(value: datetime) -> str:
+    """Format a datetime as an HTTP date, assuming UTC for naive values."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return format_datetime(value.astimezone(UTC), usegmt=True)
+
+
+def matching_etag(request: Request, etag: str) -> str | None:
+    """The If-None-Match entry matching ``etag`` or one of its variants."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or _identity_etag(candidate) == etag:
+            return candidate
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the ETag."""
+    return matching_etag(request, etag) is not None
+
+
+def set_validators(
+    response: Response, etag: str, last_modified: datetime | None = None
+) -> None:
+    """Attach ETag and Last-Modified headers to a response."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_http_date(last_modified)
+
+
+def not_modified(
+    etag: str, last_modified: datetime | None = None, request: Request | None = None
+) -> Response:
+    """Build an empty 304 response carrying the current validators.
+
+    Given the ``request``, the ETag is that of the variant it matched.
+    """
+    if request is not None:
+        matched = matching_etag(request, etag)
+        if matched is not None and matched != "*":
+            etag = matched.removeprefix("W/")
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
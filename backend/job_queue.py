@@ -0,0 +1,452 @@
+"""Background jobs that bring derived data up to date after survey writes.
+
+Survey POSTs return as soon as their row is committed and enqueue the
+refreshes the write makes stale (POST_WRITE_JOBS): the student's pre/post
+progress row, or their daily means and the per-school daily rollups. A job
+is a name from JOBS and a key, the user id or "" for refreshes that are not
+per user. Enqueueing a job that is already waiting does nothing, and one
+enqueued while it runs is run once more afterwards, so a burst of
+submissions costs one refresh.
+
+JOB_QUEUE_BACKEND selects where jobs run:
+
+- ``memory``: a pool of JOB_QUEUE_WORKERS threads in every API process.
+- ``database``: API processes add rows to background_jobs, batched every
+  JOB_QUEUE_FLUSH_SECONDS; worker processes
+  started with ``python job_queue.py`` claim them with
+  SELECT ... FOR UPDATE SKIP LOCKED, holding a lease of
+  JOB_QUEUE_LEASE_SECONDS so jobs of a crashed worker are claimed again.
+
+A failed job is retried up to JOB_QUEUE_MAX_ATTEMPTS times with exponential
+backoff. With JOB_QUEUE_MAX_PENDING jobs waiting, new ones are dropped
+rather than slowing submissions down. Dropped, abandoned and (memory
+backend) shutdown-discarded jobs are not lost work: the scheduled
+incremental refreshes of student_progress, student_daily_means and the
+rollups recompute everything changed since their own watermarks, which
+jobs don't move.
+"""
+
+import argparse
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import String, column, delete, func, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config import (
+    JOB_QUEUE_BACKEND,
+    JOB_QUEUE_FLUSH_SECONDS,
+    JOB_QUEUE_LEASE_SECONDS,
+    JOB_QUEUE_MAX_ATTEMPTS,
+    JOB_QUEUE_MAX_PENDING,
+    JOB_QUEUE_POLL_SECONDS,
+    JOB_QUEUE_RETRY_SECONDS,
+    JOB_QUEUE_WORKERS,
+)
+from database import SessionLocal
+from logging_config import get_logger
+from metrics import metrics
+from models import BackgroundJob
+from progress_report import refresh_student_progress
+from rollups import refresh_school_daily_rollups
+from student_means import refresh_student_means
+
+logger = get_logger("job_queue")
+
+
+def _refresh_progress(db: Session, key: str) -> None:
+    refresh_student_progress(db, user_ids=[int(key)])
+
+
+def _refresh_student_means(db: Session, key: str) -> None:
+    refresh_student_means(db, user_ids=[int(key)])
+
+
+def _refresh_rollups(db: Session, key: str) -> None:
+    if refresh_school_daily_rollups(db) is None:
+        # The refresh running now may have started before this write
+        raise RuntimeError("Another rollup refresh is running")
+
+
+# Job name -> function(db, key)
+JOBS = {
+    "student_progress": _refresh_progress,
+    "student_daily_means": _refresh_student_means,
+    "school_daily_rollups": _refresh_rollups,
+}
+PER_USER_JOBS = {"student_progress", "student_daily_means"}
+
+# Survey table -> jobs its writes make stale
+POST_WRITE_JOBS = {
+    "sleep_surveys": ("student_progress",),
+    "cleveland_surveys": ("student_progress",),
+    "my_sleep_surveys": ("student_progress",),
+    "daily_sleep_surveys": ("student_daily_means", "school_daily_rollups"),
+}
+
+
+def run_job(name: str, key: str) -> None:
+    """Run one job in its own session, raising on failure."""
+    started = time.perf_counter()
+    try:
+        with SessionLocal() as db:
+            JOBS[name](db, key)
+    except Exception:
+        metrics.incr("job_queue_failures", job=name)
+        raise
+    finally:
+        metrics.observe(
+            "job_queue_run_seconds", time.perf_counter() - started, job=name
+        )
+    metrics.incr("job_queue_completed", job=name)
+
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retrying after failed attempt ``attempt``."""
+    return JOB_QUEUE_RETRY_SECONDS * 2 ** (attempt - 1)
+
+
+class MemoryJobQueue:
+    """Deduplicating job queue served by a thread pool in this process."""
+
+    def __init__(
+        self,
+        workers: int = JOB_QUEUE_WORKERS,
+        max_pending: int = JOB_QUEUE_MAX_PENDING,
+        max_attempts: int = JOB_QUEUE_MAX_ATTEMPTS,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # (name, key) -> (monotonic time it is due, attempt), in arrival order
+        self._pending: dict[tuple[str, str], tuple[float, int]] = {}
+        self._running: set[tuple[str, str]] = set()
+        self._rerun: set[tuple[str, str]] = set()
+        self._condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def enqueue(self, name: str, key: str = "") -> bool:
+        """Queue a job; False when it was dropped because the queue is full."""
+        if not self.enabled:
+            return False
+        job = (name, key)
+        with self._condition:
+            if job in self._running:
+                self._rerun.add(job)
+            elif job in self._pending:
+                metrics.incr("job_queue_deduplicated", job=name)
+            elif len(self._pending) >= self.max_pending:
+                metrics.incr("job_queue_rejected", job=name)
+                return False
+            else:
+                if not self._threads:
+                    self._start()
+                self._pending[job] = (time.monotonic(), 1)
+                metrics.set("job_queue_pending", len(self._pending))
+                self._condition.notify()
+        return True
+
+    def _start(self) -> None:
+        self._stopping = False
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Finish the running jobs and stop; waiting ones are dropped."""
+        with self._condition:
+            threads = self._threads
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in threads:
+            thread.join()
+        self._threads = []
+        self._pending.clear()
+
+    def _take(self) -> tuple[tuple[str, str], int] | None:
+        """Wait for the next due job, or None when stopping.
+
+        A running job is never also pending: enqueueing it marks a rerun.
+        """
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                if self._pending:
+                    job = min(self._pending, key=lambda job: self._pending[job][0])
+                    due, attempt = self._pending[job]
+                    if due <= now:
+                        del self._pending[job]
+                        self._running.add(job)
+                        metrics.set("job_queue_pending", len(self._pending))
+                        return job, attempt
+                    self._condition.wait(timeout=due - now)
+                else:
+                    self._condition.wait()
+            return None
+
+    def _run(self) -> None:
+        while (taken := self._take()) is not None:
+            (name, key), attempt = taken
+            try:
+                run_job(name, key)
+                retry = None
+            except Exception:
+                logger.exception(f"Job {name}({key}) failed, attempt {attempt}")
+                retry = attempt + 1 if attempt < self.max_attempts else None
+                if retry is None:
+                    metrics.incr("job_queue_abandoned", job=name)
+
+            job = (name, key)
+            with self._condition:
+                self._running.discard(job)
+                if retry is not None:
+                    self._pending[job] = (
+                        time.monotonic() + retry_delay(attempt),
+                        retry,
+                    )
+                elif job in self._rerun:
+                    self._pending[job] = (time.monotonic(), 1)
+                self._rerun.discard(job)
+                metrics.set("job_queue_pending", len(self._pending))
+                self._condition.notify_all()
+
+
+class DatabaseJobQueue:
+    """Job queue kept in background_jobs, served by worker processes.
+
+    Enqueued jobs are collected in memory and written every
+    JOB_QUEUE_FLUSH_SECONDS in one statement, so a burst of submissions
+    costs one write per distinct job rather than a round trip on every
+    request path. A job already waiting in the table is left alone; one a
+    worker has claimed gets its version bumped, to run again afterwards.
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        max_pending: int = JOB_QUEUE_MAX_PENDING,
+        max_attempts: int = JOB_QUEUE_MAX_ATTEMPTS,
+        lease_seconds: int = JOB_QUEUE_LEASE_SECONDS,
+        flush_seconds: float = JOB_QUEUE_FLUSH_SECONDS,
+    ):
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.flush_seconds = flush_seconds
+        self._buffer: dict[tuple[str, str], None] = {}
+        self._condition = threading.Condition()
+        self._flusher: threading.Thread | None = None
+        self._stopping = False
+
+    def enqueue(self, name: str, key: str = "") -> bool:
+        """Queue a job; False when it was dropped because the buffer is full."""
+        with self._condition:
+            if (name, key) in self._buffer:
+                metrics.incr("job_queue_deduplicated", job=name)
+                return True
+            if len(self._buffer) >= self.max_pending:
+                metrics.incr("job_queue_rejected", job=name)
+                return False
+            if self._flusher is None:
+                self._stopping = False
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="job-queue-flusher", daemon=True
+                )
+                self._flusher.start()
+            self._buffer[name, key] = None
+        return True
+
+    def stop(self) -> None:
+        """Write the buffered jobs and stop the flusher."""
+        with self._condition:
+            flusher = self._flusher
+            self._stopping = True
+            self._condition.notify()
+        if flusher is not None:
+            flusher.join()
+        self._flusher = None
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopping:
+                    self._condition.wait(self.flush_seconds)
+                batch, self._buffer = list(self._buffer), {}
+                stopping = self._stopping
+            if batch:
+                try:
+                    self.flush(batch)
+                except Exception as exc:
+                    # The scheduled refreshes cover what these would have done
+                    logger.warning(f"Could not queue {len(batch)} jobs: {exc}")
+            if stopping:
+                return
+
+    def flush(self, batch: list[tuple[str, str]]) -> None:
+        """Write ``batch`` of (name, key) to background_jobs."""
+        with SessionLocal() as db:
+            waiting = db.scalar(select(func.count()).select_from(BackgroundJob))
+            if waiting >= self.max_pending:
+                for name, _ in batch:
+                    metrics.incr("job_queue_rejected", job=name)
+                return
+            rows = values(
+                column("name", String), column("key", String), name="queued"
+            ).data(batch)
+            statement = insert(BackgroundJob).from_select(
+                ["name", "key"], select(rows.c.name, rows.c.key)
+            )
+            statement = statement.on_conflict_do_update(
+                constraint="uq_background_job",
+                set_={"version": BackgroundJob.version + 1},
+                # Waiting jobs will see this write when they run
+                where=BackgroundJob.claimed_until.is_not(None),
+            )
+            db.execute(statement)
+            db.commit()
+
+    def claim(self, db: Session) -> tuple | None:
+        """Lease the next due job: (id, name, key, version, attempts)."""
+        due = (
+            select(BackgroundJob.id)
+            .where(
+                BackgroundJob.run_after <= func.now(),
+                or_(
+                    BackgroundJob.claimed_until.is_(None),
+                    BackgroundJob.claimed_until < func.now(),
+                ),
+            )
+            .order_by(BackgroundJob.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        claimed = db.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == due)
+            .values(
+                claimed_until=func.now() + self.lease,
+                attempts=BackgroundJob.attempts + 1,
+            )
+            .returning(
+                BackgroundJob.id,
+                BackgroundJob.name,
+                BackgroundJob.key,
+                BackgroundJob.version,
+                BackgroundJob.attempts,
+            )
+        ).first()
+        db.commit()
+        return claimed
+
+    def _finish(self, db: Session, claimed, error: Exception | None) -> None:
+        job_id, name, key, version, attempts = claimed
+        # Enqueued again since it was claimed: run it again from scratch
+        rerun = update(BackgroundJob).where(
+            BackgroundJob.id == job_id, BackgroundJob.version != version
+        )
+        if error is None or attempts >= self.max_attempts:
+            db.execute(
+                rerun.values(claimed_until=None, attempts=0, run_after=func.now())
+            )
+            db.execute(
+                delete(BackgroundJob).where(
+                    BackgroundJob.id == job_id, BackgroundJob.version == version
+                )
+            )
+            if error is not None:
+                metrics.incr("job_queue_abandoned", job=name)
+        else:
+            db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id)
+                .values(
+                    claimed_until=None,
+                    run_after=func.now() + timedelta(seconds=retry_delay(attempts)),
+                    last_error=str(error),
+                )
+            )
+        db.commit()
+
+    def work(self, stopping: threading.Event) -> None:
+        """Claim and run jobs until ``stopping`` is set."""
+        while not stopping.is_set():
+            try:
+                with SessionLocal() as db:
+                    claimed = self.claim(db)
+            except Exception as exc:
+                logger.warning(f"Could not claim a job: {exc}")
+                claimed = None
+            if claimed is None:
+                stopping.wait(JOB_QUEUE_POLL_SECONDS)
+                continue
+
+            _, name, key, _, attempts = claimed
+            error = None
+            try:
+                run_job(name, key)
+            except Exception as exc:
+                logger.exception(f"Job {name}({key}) failed, attempt {attempts}")
+                error = exc
+            with SessionLocal() as db:
+                self._finish(db, claimed, error)
+
+
+JOB_QUEUES = {"memory": MemoryJobQueue, "database": DatabaseJobQueue}
+
+jobs = JOB_QUEUES[JOB_QUEUE_BACKEND]()
+
+
+def enqueue_post_write_jobs(table: str, user_ids: set[int]) -> None:
+    """Queue the refreshes made stale by writes of ``user_ids`` to ``table``.
+
+    Never raises: the write is committed, and anything left out is picked
+    up by the scheduled refreshes.
+    """
+    if not jobs.enabled:
+        return
+    try:
+        for name in POST_WRITE_JOBS.get(table, ()):
+            if name in PER_USER_JOBS:
+                for user_id in user_ids:
+                    jobs.enqueue(name, str(user_id))
+            else:
+                jobs.enqueue(name)
+    except Exception as exc:
+        logger.warning(f"Could not queue post-write jobs for {table}: {exc}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers", type=int, default=JOB_QUEUE_WORKERS, help="worker threads"
+    )
+    args = parser.parse_args()
+
+    queue = DatabaseJobQueue()
+    stopping = threading.Event()
+    threads = [
+        threading.Thread(target=queue.work, args=(stopping,), name=f"job-worker-{i}")
+        for i in range(max(args.workers, 1))
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"Running {len(threads)} job workers, Ctrl-C to stop")
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stopping.set()
+        for thread in threads:
+            thread.join()
@@ -1,120 +1,239 @@
-import mimetypes
-import os
-from datetime import date
-from pathlib import Path
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime, timedelta
 from statistics import mean
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.dialects.postgresql import insert
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
 
+from admission import AdmissionMiddleware
+from analytics import cohort_distributions, cohort_groups, quiz_item_analysis
 from auth import (
     ACCESS_TOKEN_EXPIRE_DURATION,
     create_access_token,
     generate_salt,
     hash_password,
     verify_password,
-    verify_token,
 )
-from config import REQUIRED_DAILY_SURVEYS
-from database import get_db
+from cohort_percentiles import (
+    CLEVELAND_MEAN,
+    MEAN_SLEEP_DURATION,
+    QUIZ_SCORE,
+    cohort_percentiles,
+    rebuild_cohort_percentiles_job,
+)
+from compression import CompressionMiddleware
+from config import (
+    COHORT_PERCENTILES_REFRESH_SECONDS,
+    DAILY_STATS_WINDOWS,
+    DAILY_SURVEYS_MAX_PAGE_SIZE,
+    DAILY_SURVEYS_PAGE_SIZE,
+    DAILY_WINDOW_MODE,
+    PARTITION_MAINTENANCE_ENABLED,
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+    PROGRESS_REFRESH_INTERVAL_SECONDS,
+    REPLICA_LAG_CHECK_SECONDS,
+    REQUIRED_DAILY_SURVEYS,
+    ROLLUP_REFRESH_INTERVAL_SECONDS,
+    STUDENT_MEANS_REFRESH_INTERVAL_SECONDS,
+    SURVEY_SPOOL_REPLAY_INTERVAL_SECONDS,
+)
+from dashboard_cache import CachedPayload, dashboard_cache, dashboard_refresher
+from database import get_db, pressure, read_session, router
+from date_encoding import encode_dates
+from dependencies import (
+    get_admin_reader,
+    get_admin_user,
+    get_current_reader,
+    get_current_user,
+    get_current_writer,
+    get_read_db,
+    get_survey_submitter,
+    require_metrics_access,
+    token_user_id,
+)
+from http_cache import etag_matches, make_etag, not_modified, set_validators
+from job_queue import enqueue_post_write_jobs, jobs
 from logging_config import setup_logging
-from models import ClevelandSurvey, DailySleepSurvey, MySleepSurvey, SleepSurvey, User
+from metrics import conditional_savings, metrics
+from models import (
+    ClevelandSurvey,
+    DailySleepSurvey,
+    MySleepSurvey,
+    SchoolDailyRollup,
+    SleepSurvey,
+    User,
+)
+from partitions import partition_maintenance_job
+from progress_report import (
+    progress_effect_summary,
+    refresh_progress_job,
+    refresh_student_progress,
+)
+from query_deadlines import QueryCancellationMiddleware, timeout_response
+from rate_limit import client_ip, rate_limiter
+from responses import ModelResponse
+from rollups import refresh_rollups_job
+from scheduler import scheduler
 from schemas import (
     ClevelandSurveyCreate,
+    CohortAnalyticsResponse,
+    CohortDimensionEnum,
+    CohortGroup,
+    CohortPercentileRanks,
     DailySleepSurveyCreate,
+    DailySleepSurveyPage,
     DailySleepSurveyResponse,
+    DailySleepSurveyRow,
     DailySurveysInfo,
+    DailyWindowModeEnum,
+    DateBitmap,
+    DatesEncodingEnum,
+    GenderEnum,
     MeanMetrics,
     MySleepSurveyCreate,
+    ProgressGroup,
+    ProgressRefreshResponse,
+    ProgressReportResponse,
+    QuizItemAnalysisResponse,
+    QuizItemGroup,
+    SchoolDailyRollupRow,
     SleepSurveyCreate,
     SurveyData,
+    SyncResponse,
     Token,
     UserCreate,
     UserLogin,
     UserProfileResponse,
     UserResponse,
     UserUpdate,
+    WindowStats,
 )
+from single_flight import SingleFlight
 from sleep_survey_answer_key import calculate_score_from_survey
+from static_files import static_frontend
+from streaming_stats import daily_survey_stats
+from student_means import refresh_student_means_job
+from survey_spool import (
+    DATABASE_UNAVAILABLE,
+    replay_survey_spool_job,
+    survey_spool,
+)
+from sync import (
+    decode_cursor,
+    encode_cursor,
+    latest_survey_change,
+    next_cursor_version,
+    survey_changes_since,
+)
+from write_coalescing import daily_survey_writes, upsert_statement
 
 # Setup logging
 logger = setup_logging()
 
 
-def calculate_daily_survey_means(
-    daily_surveys: list[DailySleepSurvey],
-) -> dict[str, MeanMetrics]:
-    """Calculate mean metrics for different time periods from daily survey data."""
-    if not daily_surveys:
-        empty_metrics = MeanMetrics(
-            last_7_days=None, last_15_days=None, last_30_days=None
-        )
-        return {
-            "mean_sleep_duration": empty_metrics,
-            "mean_wake_time": empty_metrics,
-            "mean_bedtime": empty_metrics,
-            "mean_time_to_sleep": empty_metrics,
-            "mean_night_awakenings": empty_metrics,
-            "mean_sleep_quality": empty_metrics,
-        }
+# DailySleepSurvey field -> (MeanMetrics result key, extended metrics key)
+DAILY_METRIC_KEYS = {
+    "horas_que_dormiste": ("mean_sleep_duration", "sleepDuration"),
+    "hora_levantaste_hoje": ("mean_wake_time", "wakeTime"),
+    "hora_deitaste_ontem": ("mean_bedtime", "bedtime"),
+    "tempo_ate_adormecer": ("mean_time_to_sleep", "timeToSleep"),
+    "vezes_acordaste_noite": ("mean_night_awakenings", "nightAwakenings"),
+    "qualidade_sono_noite": ("mean_sleep_quality", "sleepQuality"),
+}
+MEAN_METRICS_PERIODS = (7, 15, 30)
 
+# Concurrent identical GET /user and cohort analytics computations run once
+dashboard_flights = SingleFlight("dashboard")
+analytics_flights = SingleFlight("cohort_analytics")
+
+
+DAILY_WINDOWS = (*MEAN_METRICS_PERIODS, *DAILY_STATS_WINDOWS)
+daily_window_mode = DailyWindowModeEnum(DAILY_WINDOW_MODE)
+
+
+def daily_survey_window_stats(daily_surveys: list[DailySleepSurvey]):
+    """Statistics for the MeanMetrics periods and DAILY_STATS_WINDOWS, one pass."""
     # Sort by date descending (most recent first)
     sorted_surveys = sorted(daily_surveys, key=lambda x: x.survey_date, reverse=True)
+    return daily_survey_stats(sorted_surveys, DAILY_WINDOWS)
 
-    def time_to_minutes(time_val):
-        """Convert time to minutes from midnight."""
-        if time_val is None:
-            return None
-        return time_val.hour * 60 + time_val.minute
-
-    def calculate_mean_for_period(surveys_subset, field_name, time_converter=None):
-        """Calculate mean for a specific field and time period."""
-        if not surveys_subset:
-            return None
-
-        values = []
-        for survey in surveys_subset:
-            value = getattr(survey, field_name)
-            if value is not None:
-                if time_converter:
-                    value = time_converter(value)
-                    if value is not None:
-                        values.append(value)
-                else:
-                    values.append(value)
-
-        return round(sum(values) / len(values), 2) if values else None
-
-    # Calculate means for different periods
-    periods = [7, 15, 30]
-    results = {}
-
-    fields_config = [
-        ("horas_que_dormiste", "mean_sleep_duration", None),
-        ("hora_levantaste_hoje", "mean_wake_time", time_to_minutes),
-        ("hora_deitaste_ontem", "mean_bedtime", time_to_minutes),
-        ("tempo_ate_adormecer", "mean_time_to_sleep", None),
-        ("vezes_acordaste_noite", "mean_night_awakenings", None),
-        ("qualidade_sono_noite", "mean_sleep_quality", None),
-    ]
-
-    for field_name, result_key, converter in fields_config:
-        period_means = {}
-        for period in periods:
-            subset = sorted_surveys[:period]
-            period_means[f"last_{period}_days"] = calculate_mean_for_period(
-                subset, field_name, converter
-            )
 
-        results[result_key] = MeanMetrics(**period_means)
+def calendar_window_stats(db: Session, user_id: int, today: date):
+    """Like daily_survey_window_stats, over the last N days up to ``today``.
 
-    return results
+    Reads only the days of the widest window, with a survey_date range scan
+    of uq_user_date (user_id, survey_date), however long the history is.
+    """
+    recent = (
+        db.query(
+            DailySleepSurvey.survey_date,
+            *(getattr(DailySleepSurvey, field) for field in DAILY_METRIC_KEYS),
+        )
+        .filter(
+            DailySleepSurvey.user_id == user_id,
+            DailySleepSurvey.survey_date > today - timedelta(days=max(DAILY_WINDOWS)),
+            DailySleepSurvey.survey_date <= today,
+        )
+        .order_by(DailySleepSurvey.survey_date.desc())
+        .all()
+    )
+    return daily_survey_stats(
+        recent, DAILY_WINDOWS, age=lambda row: (today - row.survey_date).days
+    )
+
+
+def calculate_daily_survey_means(
+    daily_surveys: list[DailySleepSurvey], stats=None
+) -> dict[str, MeanMetrics]:
+    """Calculate mean metrics for different time periods from daily survey data.
+
+    ``stats`` from daily_survey_window_stats can be passed to skip the scan.
+    """
+    if stats is None:
+        stats = daily_survey_window_stats(daily_surveys)
+
+    def rounded_mean(accumulator):
+        value = accumulator.mean
+        return round(value, 2) if value is not None else None
+
+    return {
+        result_key: MeanMetrics(
+            **{
+                f"last_{period}_days": rounded_mean(stats[field][period])
+                for period in MEAN_METRICS_PERIODS
+            }
+        )
+        for field, (result_key, _) in DAILY_METRIC_KEYS.items()
+    }
+
+
+def extended_daily_metrics(stats) -> dict[str, dict[str, WindowStats]]:
+    """Dashboard extendedMetrics block from daily_survey_window_stats."""
+    return {
+        metric: {
+            f"last{window}Days": WindowStats(**stats[field][window].summary())
+            for window in DAILY_STATS_WINDOWS
+        }
+        for field, (_, metric) in DAILY_METRIC_KEYS.items()
+    }
 
 
 def calculate_my_sleep_survey_means(
@@ -155,7 +274,81 @@ def calculate_cleveland_mean(cleveland_surveys: list[ClevelandSurvey]) -> float
     return mean(survey.cleveland_score() for survey in cleveland_surveys)
 
 
-app = FastAPI(title="Prosono Backend", version="0.1.0")
+def user_validators(db: Session, user: User, *variant: object) -> tuple[str, datetime]:
+    """ETag and Last-Modified for a user's dashboard, from the latest change.
+
+    Uses the change-tracking indexes only; no survey rows are loaded.
+    """
+    latest, _ = latest_survey_change(db, user.id)
+    profile_version = user.updated_at or user.created_at
+    last_modified = max(
+        version for version in (latest, profile_version) if version is not None
+    )
+    etag = make_etag(
+        "user",
+        user.id,
+        profile_version,
+        latest,
+        REQUIRED_DAILY_SURVEYS,
+        *variant,
+    )
+    return etag, last_modified
+
+
+def daily_survey_validators(
+    db: Session, user: User, *variant: object
+) -> tuple[str, datetime | None]:
+    """ETag and Last-Modified for daily survey reads, from the latest change."""
+    latest, _ = latest_survey_change(db, user.id, models=(DailySleepSurvey,))
+    return make_etag("daily-surveys", user.id, latest, *variant), latest
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    static_frontend.load()
+    survey_spool.open()
+    scheduler.add(
+        "school_daily_rollups", ROLLUP_REFRESH_INTERVAL_SECONDS, refresh_rollups_job
+    )
+    scheduler.add(
+        "student_progress", PROGRESS_REFRESH_INTERVAL_SECONDS, refresh_progress_job
+    )
+    scheduler.add(
+        "student_daily_means",
+        STUDENT_MEANS_REFRESH_INTERVAL_SECONDS,
+        refresh_student_means_job,
+    )
+    scheduler.add(
+        "cohort_percentiles",
+        COHORT_PERCENTILES_REFRESH_SECONDS,
+        rebuild_cohort_percentiles_job,
+    )
+    if PARTITION_MAINTENANCE_ENABLED:
+        scheduler.add(
+            "daily_survey_partitions",
+            PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+            partition_maintenance_job,
+        )
+    if router.replicas:
+        scheduler.add("replica_lag", REPLICA_LAG_CHECK_SECONDS, router.measure_lags)
+    scheduler.add(
+        "survey_spool_replay",
+        SURVEY_SPOOL_REPLAY_INTERVAL_SECONDS,
+        replay_survey_spool_job,
+    )
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    await asyncio.to_thread(daily_survey_writes.stop)
+    await asyncio.to_thread(jobs.stop)
+
+
+app = FastAPI(title="Prosono Backend", version="0.1.0", lifespan=lifespan)
+
+app.add_middleware(QueryCancellationMiddleware)
+
+# Inside CORS, so shed requests still carry its headers
+app.add_middleware(AdmissionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -167,12 +360,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-# Use absolute path for Docker, relative for local development
-# static_dir = (
-#     "/app/frontend/dist" if os.path.exists("/app/frontend/dist") else "../frontend/dist"
-# )
-# app.mount("/static", StaticFiles(directory=static_dir), name="static")
+app.add_middleware(CompressionMiddleware)
+
+CONDITIONAL_ROUTES = ["/user", "/daily-surveys"]
+
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None:
+        labels = {"route": route.path, "status": response.status_code}
+        metrics.observe("http_request_seconds", time.perf_counter() - started, **labels)
+        # 304s carry no Content-Length, their body is empty
+        content_length = response.headers.get("content-length")
+        if content_length is not None or response.status_code == 304:
+            metrics.observe("http_response_bytes", int(content_length or 0), **labels)
+    return response
 
 
 @app.exception_handler(RequestValidationError)
@@ -185,35 +390,21 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-def get_current_user(
-    authorization: Annotated[str, Header()], db: Annotated[Session, Depends(get_db)]
-) -> User:
-    if not authorization.startswith("Bearer "):
-        logger.warning("Invalid authorization header format")
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-
-    token = authorization.split(" ")[1]
-    payload = verify_token(token)
-    if not payload:
-        logger.warning("Invalid or expired token")
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    user_id = payload.get("sub")
-    if not user_id:
-        logger.warning("Invalid token payload - missing user ID")
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user:
-        logger.warning(f"User not found for ID: {user_id}")
-        raise HTTPException(status_code=401, detail="User not found")
-
-    return user
+@app.exception_handler(OperationalError)
+@app.exception_handler(PoolTimeoutError)
+async def database_timeout_handler(request: Request, exc: Exception):
+    response = timeout_response(request, exc)
+    if response is None:
+        raise exc
+    return response
 
 
 @app.post("/auth/register")
-def register_user(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
+def register_user(
+    user: UserCreate, request: Request, db: Annotated[Session, Depends(get_db)]
+):
     logger.info(f"Registration attempt for email: {user.email}")
+    rate_limiter.enforce("register", ip=client_ip(request), email=user.email.lower())
 
     # Check if user with email already exists
     existing_user = db.query(User).filter(User.email == user.email).first()
@@ -247,8 +438,15 @@ def register_user(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
 
 
 @app.post("/auth/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Annotated[Session, Depends(get_db)]):
+def login(
+    user_credentials: UserLogin,
+    request: Request,
+    db: Annotated[Session, Depends(get_db)],
+):
     logger.info(f"Login attempt for email: {user_credentials.email}")
+    rate_limiter.enforce(
+        "login", ip=client_ip(request), email=user_credentials.email.lower()
+    )
 
     # Find user by email
     user = db.query(User).filter(User.email == user_credentials.email).first()
@@ -271,11 +469,122 @@ def login(user_credentials: UserLogin, db: Annotated[Session, Depends(get_db)]):
 
 @app.get("/user", response_model=UserResponse)
 def get_user(
-    current_user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
+    authorization: Annotated[str, Header()],
+    db: Annotated[Session, Depends(get_read_db)],
+    dates_encoding: DatesEncodingEnum = DatesEncodingEnum.LIST,
 ):
+    # Under database pressure, answer from the last dashboard computed
+    # without touching the database, not even to load the user
+    if pressure.degraded:
+        stale = stale_dashboard(request, token_user_id(authorization), dates_encoding)
+        if stale is not None:
+            return stale
+
+    current_user = get_current_reader(authorization, db)
     logger.info(f"User info requested: {current_user.email}")
 
+    # Cheap validators first, so unchanged dashboards skip the aggregation
+    today = date.today()
+    etag, last_modified = dashboard_validators(db, current_user, dates_encoding, today)
+    if etag_matches(request, etag):
+        logger.info(f"User info not modified: {current_user.email}")
+        return not_modified(etag, last_modified, request)
+
+    payload = current_dashboard(
+        db, current_user, dates_encoding, today, etag, last_modified
+    )
+    return payload.response(request)
+
+
+def dashboard_validators(
+    db: Session, user: User, dates_encoding: DatesEncodingEnum, today: date
+) -> tuple[str, datetime]:
+    """user_validators for the GET /user variant requested."""
+    # Calendar windows move at midnight even without new data
+    calendar = daily_window_mode == DailyWindowModeEnum.CALENDAR
+    return user_validators(
+        db,
+        user,
+        dates_encoding.value,
+        cohort_percentiles.version,
+        today if calendar else daily_window_mode.value,
+    )
+
+
+def current_dashboard(
+    db: Session,
+    user: User,
+    dates_encoding: DatesEncodingEnum,
+    today: date,
+    etag: str,
+    last_modified: datetime | None,
+) -> CachedPayload:
+    """The dashboard payload matching ``etag``, from the cache or built."""
+    cache_key = (user.id, dates_encoding.value)
+    cached = dashboard_cache.get(cache_key, etag)
+    if cached is not None:
+        return cached
+
+    # Concurrent loads of the same dashboard version share one aggregation
+    payload = dashboard_flights.do(
+        (cache_key, etag),
+        lambda: build_user_payload(
+            db, user, dates_encoding, today, etag, last_modified
+        ),
+    )
+    dashboard_cache.put(cache_key, payload)
+    return payload
+
+
+def stale_dashboard(
+    request: Request, user_id: int | None, dates_encoding: DatesEncodingEnum
+) -> Response | None:
+    """The last dashboard built for the user, marked stale, queueing a refresh.
+
+    A client already holding it gets a 304. None when there is none to
+    serve; the request then goes to the database.
+    """
+    cache_key = (user_id, dates_encoding.value)
+    payload = dashboard_cache.latest(cache_key) if user_id is not None else None
+    if payload is None:
+        metrics.incr("dashboard_stale_misses")
+        return None
+
+    dashboard_refresher.submit(
+        cache_key, lambda: refresh_dashboard(user_id, dates_encoding)
+    )
+    metrics.incr("dashboard_stale_served")
+    logger.info(f"Stale user info served to user: {user_id}")
+    if etag_matches(request, payload.etag):
+        response = not_modified(payload.etag, payload.last_modified, request)
+    else:
+        response = payload.response(request)
+    response.headers["X-Data-Stale"] = "true"
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    return response
+
+
+def refresh_dashboard(user_id: int, dates_encoding: DatesEncodingEnum) -> None:
+    """Bring the cached dashboard of a user up to date."""
+    with contextmanager(read_session)(user_id, route_class="dashboard") as db:
+        user = db.get(User, user_id)
+        if user is None:
+            return
+        today = date.today()
+        etag, last_modified = dashboard_validators(db, user, dates_encoding, today)
+        current_dashboard(db, user, dates_encoding, today, etag, last_modified)
+
+
+def build_user_payload(
+    db: Session,
+    current_user: User,
+    dates_encoding: DatesEncodingEnum,
+    today: date,
+    etag: str,
+    last_modified: datetime | None,
+) -> CachedPayload:
+    """Aggregate the GET /user dashboard and serialize it once."""
     # Get all sleep surveys for this user, ordered by creation date
     all_sleep_surveys = (
         db.query(SleepSurvey)
@@ -303,6 +612,26 @@ def get_user(
     my_sleep_means = calculate_my_sleep_survey_means(my_sleep_surveys)
     cleveland_mean = calculate_cleveland_mean(cleveland_surveys)
 
+    # Get all daily survey data for this user with all fields needed for calculations
+    daily_surveys = (
+        db.query(DailySleepSurvey)
+        .filter(DailySleepSurvey.user_id == current_user.id)
+        .order_by(DailySleepSurvey.survey_date.asc())
+        .all()
+    )
+
+    # Peer comparison within the student's school and year
+    def cohort_percentile(metric: str, value: float | None) -> float | None:
+        return cohort_percentiles.percentile(
+            current_user.school, current_user.school_year, metric, value
+        )
+
+    sleep_durations = [survey.horas_que_dormiste for survey in daily_surveys]
+    mean_sleep_percentile = cohort_percentile(
+        MEAN_SLEEP_DURATION, mean(sleep_durations) if sleep_durations else None
+    )
+    cleveland_percentile = cohort_percentile(CLEVELAND_MEAN, cleveland_mean)
+
     # Build list of evaluation surveys
     evaluation_surveys = []
     for survey in all_sleep_surveys:
@@ -313,24 +642,36 @@ def get_user(
                 score=score,
                 my_sleep_means=my_sleep_means,
                 cleveland_mean=cleveland_mean,
+                cohort_percentiles=CohortPercentileRanks(
+                    score=cohort_percentile(QUIZ_SCORE, score),
+                    cleveland_mean=cleveland_percentile,
+                    mean_sleep_duration=mean_sleep_percentile,
+                ),
             )
         )
 
-    # Get all daily survey data for this user with all fields needed for calculations
-    daily_surveys = (
-        db.query(DailySleepSurvey)
-        .filter(DailySleepSurvey.user_id == current_user.id)
-        .order_by(DailySleepSurvey.survey_date.asc())
-        .all()
-    )
-
-    daily_survey_dates = [survey.survey_date for survey in daily_surveys]
+    if dates_encoding == DatesEncodingEnum.BITMAP:
+        # Bitset over day ordinals, no per-date list to validate/serialize
+        start, days, encoding, data = encode_dates(
+            survey.survey_date.toordinal() for survey in daily_surveys
+        )
+        daily_survey_dates = None
+        dates_bitmap = DateBitmap.model_construct(
+            start=start, days=days, encoding=encoding, data=data
+        )
+    else:
+        daily_survey_dates = [survey.survey_date for survey in daily_surveys]
+        dates_bitmap = None
 
-    # Calculate mean metrics for different time periods
-    mean_metrics = calculate_daily_survey_means(daily_surveys)
+    # Mean and extended metrics for the different windows, in one pass
+    if daily_window_mode == DailyWindowModeEnum.CALENDAR:
+        daily_stats = calendar_window_stats(db, current_user.id, today)
+    else:
+        daily_stats = daily_survey_window_stats(daily_surveys)
+    mean_metrics = calculate_daily_survey_means(daily_surveys, daily_stats)
 
     # Create response with evaluation surveys and daily survey data
-    return UserResponse(
+    user_response = UserResponse(
         email=current_user.email,
         first_name=current_user.first_name,
         last_name=current_user.last_name,
@@ -342,20 +683,29 @@ def get_user(
         daily_surveys=DailySurveysInfo(
             target=REQUIRED_DAILY_SURVEYS,
             dates=daily_survey_dates,
+            dates_bitmap=dates_bitmap,
             mean_sleep_duration=mean_metrics["mean_sleep_duration"],
             mean_wake_time=mean_metrics["mean_wake_time"],
             mean_bedtime=mean_metrics["mean_bedtime"],
             mean_time_to_sleep=mean_metrics["mean_time_to_sleep"],
             mean_night_awakenings=mean_metrics["mean_night_awakenings"],
             mean_sleep_quality=mean_metrics["mean_sleep_quality"],
+            extended_metrics=extended_daily_metrics(daily_stats),
         ),
     )
 
+    # Validated once above; encode directly instead of FastAPI's
+    # response_model re-validation + jsonable_encoder pass, and keep the
+    # bytes (and their compressed variants) for the next hit
+    return CachedPayload(
+        user_response.model_dump_json(by_alias=True).encode(), etag, last_modified
+    )
+
 
 @app.put("/user", response_model=UserProfileResponse)
 def update_user(
     user_update: UserUpdate,
-    current_user: Annotated[User, Depends(get_current_user)],
+    current_user: Annotated[User, Depends(get_current_writer)],
     db: Annotated[Session, Depends(get_db)],
 ):
     logger.info(f"User update requested: {current_user.email}")
@@ -383,78 +733,107 @@ def update_user(
     )
 
 
+def upsert_survey(db: Session, model, survey_data: dict) -> int:
+    """Insert or update the user's survey for its date, returning its id."""
+    if model is DailySleepSurvey and daily_survey_writes.enabled:
+        # Return the connection to the pool while waiting for the batch
+        db.rollback()
+        return daily_survey_writes.submit(survey_data)
+
+    survey_id = db.execute(upsert_statement(model, [survey_data])).scalar()
+    db.commit()
+    return survey_id
+
+
+def save_survey(
+    db: Session, model, survey: BaseModel, user: User, response: Response
+) -> dict:
+    """Upsert a submission, or spool it while the database can't take it.
+
+    A spooled submission is answered with 202 and no id yet.
+    """
+    survey_data = survey.model_dump()
+    survey_data["user_id"] = user.id
+    if not survey_spool.pending():
+        try:
+            survey_id = upsert_survey(db, model, survey_data)
+        except DATABASE_UNAVAILABLE as exc:
+            if not survey_spool.enabled:
+                raise
+            logger.warning(f"Database unavailable, spooling submission: {exc}")
+        else:
+            # Derived data is refreshed in the background
+            enqueue_post_write_jobs(model.__tablename__, {user.id})
+            return {"id": survey_id}
+
+    survey_spool.append(model, user.id, survey)
+    logger.info(f"{model.__tablename__} submission spooled for user: {user.email}")
+    response.status_code = 202
+    return {"id": None, "spooled": True}
+
+
 @app.post("/surveys")
 def create_survey(
     survey: SleepSurveyCreate,
-    current_user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    current_user: Annotated[User, Depends(get_survey_submitter)],
     db: Annotated[Session, Depends(get_db)],
 ):
     logger.info(f"Survey creation/update requested by user: {current_user.email}")
 
-    # Perform PostgreSQL upsert operation
-    survey_data = survey.model_dump()
-    survey_data["user_id"] = current_user.id
-
-    stmt = insert(SleepSurvey).values(**survey_data)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["user_id", "survey_date"],
-        set_={
-            key: stmt.excluded[key]
-            for key in survey_data.keys()
-            if key not in ["user_id", "survey_date"]
-        },
-    )
-    stmt = stmt.returning(SleepSurvey.id)
-
-    result = db.execute(stmt)
-    survey_id = result.scalar()
-    db.commit()
+    result = save_survey(db, SleepSurvey, survey, current_user, response)
 
-    logger.info(f"Survey saved successfully for user: {current_user.email}")
-    return {"id": survey_id}
+    if result["id"] is not None:
+        logger.info(f"Survey saved successfully for user: {current_user.email}")
+    return result
 
 
 @app.post("/daily-surveys")
 def create_daily_survey(
     survey: DailySleepSurveyCreate,
-    current_user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    current_user: Annotated[User, Depends(get_survey_submitter)],
     db: Annotated[Session, Depends(get_db)],
 ):
     logger.info(f"Daily survey creation/update requested by user: {current_user.email}")
 
-    # Perform PostgreSQL upsert operation
-    survey_data = survey.model_dump()
-    survey_data["user_id"] = current_user.id
+    result = save_survey(db, DailySleepSurvey, survey, current_user, response)
 
-    stmt = insert(DailySleepSurvey).values(**survey_data)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["user_id", "survey_date"],
-        set_={
-            key: stmt.excluded[key]
-            for key in survey_data.keys()
-            if key not in ["user_id", "survey_date"]
-        },
-    )
-    stmt = stmt.returning(DailySleepSurvey.id)
-
-    result = db.execute(stmt)
-    survey_id = result.scalar()
-    db.commit()
+    if result["id"] is not None:
+        logger.info(f"Daily survey saved successfully for user: {current_user.email}")
+    return result
 
-    logger.info(f"Daily survey saved successfully for user: {current_user.email}")
-    return {"id": survey_id}
 
-
-@app.get("/daily-surveys", response_model=DailySleepSurveyResponse)
+@app.get(
+    "/daily-surveys",
+    response_model=DailySleepSurveyResponse | DailySleepSurveyPage,
+)
 def get_daily_survey(
-    survey_date: date,
-    current_user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_reader)],
+    db: Annotated[Session, Depends(get_read_db)],
+    survey_date: date | None = None,
+    from_date: Annotated[date | None, Query(alias="from")] = None,
+    to_date: Annotated[date | None, Query(alias="to")] = None,
+    after: date | None = None,
+    limit: Annotated[
+        int, Query(ge=1, le=DAILY_SURVEYS_MAX_PAGE_SIZE)
+    ] = DAILY_SURVEYS_PAGE_SIZE,
 ):
+    if survey_date is None:
+        return get_daily_survey_range(
+            request, current_user, db, from_date, to_date, after, limit
+        )
+
     logger.info(
         f"Daily survey for {survey_date} requested by user: {current_user.email}"
     )
 
+    etag, last_modified = daily_survey_validators(db, current_user, survey_date)
+    if etag_matches(request, etag):
+        return not_modified(etag, last_modified, request)
+
     daily_survey = (
         db.query(DailySleepSurvey)
         .filter(
@@ -475,115 +854,319 @@ def get_daily_survey(
     logger.info(
         f"Daily survey for {survey_date} retrieved for user: {current_user.email}"
     )
+    set_validators(response, etag, last_modified)
     return daily_survey
 
 
+def get_daily_survey_range(
+    request: Request,
+    current_user: User,
+    db: Session,
+    from_date: date | None,
+    to_date: date | None,
+    after: date | None,
+    limit: int,
+):
+    """Return one keyset page of daily surveys within [from, to]."""
+    if from_date is None or to_date is None:
+        raise HTTPException(
+            status_code=400, detail="Provide either survey_date or both from and to"
+        )
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+
+    logger.info(
+        f"Daily surveys from {from_date} to {to_date} (after {after}) "
+        f"requested by user: {current_user.email}"
+    )
+
+    etag, last_modified = daily_survey_validators(
+        db, current_user, "range", from_date, to_date, after, limit
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag, last_modified, request)
+
+    # Range scan on the (user_id, survey_date) index backing uq_user_date,
+    # selecting only the columns the calendar needs
+    query = db.query(
+        DailySleepSurvey.survey_date,
+        DailySleepSurvey.hora_levantaste_hoje,
+        DailySleepSurvey.hora_deitaste_ontem,
+        DailySleepSurvey.tempo_ate_adormecer,
+        DailySleepSurvey.vezes_acordaste_noite,
+        DailySleepSurvey.horas_que_dormiste,
+        DailySleepSurvey.qualidade_sono_noite,
+        DailySleepSurvey.observacao_noite_passada,
+    ).filter(
+        DailySleepSurvey.user_id == current_user.id,
+        DailySleepSurvey.survey_date >= from_date,
+        DailySleepSurvey.survey_date <= to_date,
+    )
+    if after is not None:
+        query = query.filter(DailySleepSurvey.survey_date > after)
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(DailySleepSurvey.survey_date.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = DailySleepSurveyPage(
+        items=[DailySleepSurveyRow.model_validate(row) for row in rows],
+        next_after=rows[-1].survey_date if has_more else None,
+    )
+    json_response = ModelResponse(page)
+    set_validators(json_response, etag, last_modified)
+    return json_response
+
+
 @app.post("/cleveland-surveys")
 def create_cleveland_survey(
     survey: ClevelandSurveyCreate,
-    current_user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    current_user: Annotated[User, Depends(get_survey_submitter)],
     db: Annotated[Session, Depends(get_db)],
 ):
     logger.info(
         f"Cleveland survey creation/update requested by user: {current_user.email}"
     )
 
-    # Perform PostgreSQL upsert operation
-    survey_data = survey.model_dump()
-    survey_data["user_id"] = current_user.id
-
-    stmt = insert(ClevelandSurvey).values(**survey_data)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["user_id", "survey_date"],
-        set_={
-            key: stmt.excluded[key]
-            for key in survey_data.keys()
-            if key not in ["user_id", "survey_date"]
-        },
-    )
-    stmt = stmt.returning(ClevelandSurvey.id)
-
-    result = db.execute(stmt)
-    survey_id = result.scalar()
-    db.commit()
+    result = save_survey(db, ClevelandSurvey, survey, current_user, response)
 
-    logger.info(f"Cleveland survey saved successfully for user: {current_user.email}")
-    return {"id": survey_id}
+    if result["id"] is not None:
+        logger.info(
+            f"Cleveland survey saved successfully for user: {current_user.email}"
+        )
+    return result
 
 
 @app.post("/my-sleep-surveys")
 def create_my_sleep_survey(
     survey: MySleepSurveyCreate,
-    current_user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    current_user: Annotated[User, Depends(get_survey_submitter)],
     db: Annotated[Session, Depends(get_db)],
 ):
     logger.info(
         f"My sleep survey creation/update requested by user: {current_user.email}"
     )
 
-    # Perform PostgreSQL upsert operation
-    survey_data = survey.model_dump()
-    survey_data["user_id"] = current_user.id
+    result = save_survey(db, MySleepSurvey, survey, current_user, response)
 
-    stmt = insert(MySleepSurvey).values(**survey_data)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["user_id", "survey_date"],
-        set_={
-            key: stmt.excluded[key]
-            for key in survey_data.keys()
-            if key not in ["user_id", "survey_date"]
-        },
-    )
-    stmt = stmt.returning(MySleepSurvey.id)
+    if result["id"] is not None:
+        logger.info(
+            f"My sleep survey saved successfully for user: {current_user.email}"
+        )
+    return result
 
-    result = db.execute(stmt)
-    survey_id = result.scalar()
-    db.commit()
 
-    logger.info(f"My sleep survey saved successfully for user: {current_user.email}")
-    return {"id": survey_id}
+@app.get("/sync", response_model=SyncResponse)
+def sync_surveys(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+    cursor: str | None = None,
+):
+    """Return survey rows inserted or updated since the client's cursor."""
+    try:
+        since = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        logger.warning(f"Invalid sync cursor from user: {current_user.email}")
+        raise HTTPException(status_code=400, detail="Invalid sync cursor") from None
+
+    latest, now = latest_survey_change(db, current_user.id)
+    new_cursor = encode_cursor(next_cursor_version(latest, now))
+
+    # Idle client: nothing changed since its cursor, skip the table scans
+    if cursor and (latest is None or (since is not None and latest <= since)):
+        return SyncResponse(
+            cursor=new_cursor,
+            sleep_surveys=[],
+            daily_surveys=[],
+            cleveland_surveys=[],
+            my_sleep_surveys=[],
+        )
 
+    logger.info(f"Survey changes since {since} requested by user: {current_user.email}")
+    changes = survey_changes_since(db, current_user.id, since)
 
-@app.get("/health")
-def health():
-    return {"status": "healthy"}
+    return SyncResponse(
+        cursor=new_cursor,
+        sleep_surveys=changes[SleepSurvey],
+        daily_surveys=changes[DailySleepSurvey],
+        cleveland_surveys=changes[ClevelandSurvey],
+        my_sleep_surveys=changes[MySleepSurvey],
+    )
 
 
-# @app.get("/assets/{path:path}")
-# def serve_assets(path: str):
-#     """Serve frontend asset files with proper MIME types"""
-#     static_dir = Path(__file__).parent / "../frontend/dist/assets"
-#     file_path = static_dir / path
+@app.get("/admin/analytics/cohorts", response_model=CohortAnalyticsResponse)
+def get_cohort_analytics(
+    admin_user: Annotated[User, Depends(get_admin_reader)],
+    db: Annotated[Session, Depends(get_read_db)],
+    school: str | None = None,
+    school_year: Annotated[int | None, Query(alias="schoolYear")] = None,
+    gender: GenderEnum | None = None,
+    group_by: Annotated[
+        list[CohortDimensionEnum] | None, Query(alias="groupBy")
+    ] = None,
+):
+    """Per-cohort distributions of quiz, Cleveland and daily sleep metrics"""
+    logger.info(f"Cohort analytics requested by admin: {admin_user.email}")
+    filters = {
+        "school": school,
+        "school_year": school_year,
+        "gender": gender.value if gender else None,
+    }
+    dimensions = list(dict.fromkeys(dimension.value for dimension in group_by or []))
+
+    def build():
+        distributions = cohort_distributions(db, filters, dimensions)
+        groups = [
+            CohortGroup(**fields, metrics=group_metrics)
+            for fields, group_metrics in cohort_groups(
+                distributions, filters, dimensions
+            )
+        ]
+        return CohortAnalyticsResponse(group_by=dimensions, groups=groups)
+
+    key = ("cohorts", *filters.values(), *dimensions)
+    return ModelResponse(analytics_flights.do(key, build))
+
+
+@app.get("/admin/analytics/quiz-items", response_model=QuizItemAnalysisResponse)
+def get_quiz_item_analysis(
+    admin_user: Annotated[User, Depends(get_admin_reader)],
+    db: Annotated[Session, Depends(get_read_db)],
+    school: str | None = None,
+    school_year: Annotated[int | None, Query(alias="schoolYear")] = None,
+    gender: GenderEnum | None = None,
+    group_by: Annotated[
+        list[CohortDimensionEnum] | None, Query(alias="groupBy")
+    ] = None,
+):
+    """Per-question percentage correct of the knowledge quiz, with pre/post change"""
+    logger.info(f"Quiz item analysis requested by admin: {admin_user.email}")
+    filters = {
+        "school": school,
+        "school_year": school_year,
+        "gender": gender.value if gender else None,
+    }
+    dimensions = list(dict.fromkeys(dimension.value for dimension in group_by or []))
 
-#     if file_path.exists() and file_path.is_file():
-#         # Determine media type based on file extension
-#         media_type, _ = mimetypes.guess_type(str(file_path))
-#         return FileResponse(file_path, media_type=media_type)
-#     else:
-#         raise HTTPException(status_code=404, detail="Asset not found")
+    def build():
+        results = quiz_item_analysis(db, filters, dimensions)
+        groups = [
+            QuizItemGroup(**fields, **group)
+            for fields, group in cohort_groups(results, filters, dimensions)
+        ]
+        return QuizItemAnalysisResponse(group_by=dimensions, groups=groups)
+
+    key = ("quiz-items", *filters.values(), *dimensions)
+    return ModelResponse(analytics_flights.do(key, build))
+
+
+@app.get("/admin/analytics/progress", response_model=ProgressReportResponse)
+def get_progress_report(
+    admin_user: Annotated[User, Depends(get_admin_reader)],
+    db: Annotated[Session, Depends(get_read_db)],
+    school: str | None = None,
+    school_year: Annotated[int | None, Query(alias="schoolYear")] = None,
+    gender: GenderEnum | None = None,
+    group_by: Annotated[
+        list[CohortDimensionEnum] | None, Query(alias="groupBy")
+    ] = None,
+):
+    """Pre/post effect summary from the last student progress refresh"""
+    logger.info(f"Progress report requested by admin: {admin_user.email}")
+    filters = {
+        "school": school,
+        "school_year": school_year,
+        "gender": gender.value if gender else None,
+    }
+    dimensions = list(dict.fromkeys(dimension.value for dimension in group_by or []))
 
+    def build():
+        summary = progress_effect_summary(db, filters, dimensions)
+        groups = [
+            ProgressGroup(**fields, **group)
+            for fields, group in cohort_groups(summary, filters, dimensions)
+        ]
+        return ProgressReportResponse(group_by=dimensions, groups=groups)
 
-# @app.get("/app/{path:path}")
-# def serve_frontend(path: str):
-#     """Serve frontend application with SPA routing support"""
-#     static_dir = Path(__file__).parent / "../frontend/dist"
-#     index_path = static_dir / "index.html"
+    key = ("progress", *filters.values(), *dimensions)
+    return ModelResponse(analytics_flights.do(key, build))
 
-#     return FileResponse(index_path, media_type="text/html")
+
+@app.post("/admin/analytics/progress/refresh", response_model=ProgressRefreshResponse)
+def refresh_progress_report(
+    admin_user: Annotated[User, Depends(get_admin_user)],
+    db: Annotated[Session, Depends(get_db)],
+    full: bool = False,
+):
+    """Recompute student progress for students with new or changed surveys"""
+    logger.info(
+        f"Progress refresh (full={full}) requested by admin: {admin_user.email}"
+    )
+    updated = refresh_student_progress(db, full=full)
+    if updated is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another progress refresh is running",
+        )
+    return ProgressRefreshResponse(full=full, updated_students=updated)
 
 
-# @app.get("/")
-# def root() -> FileResponse:
-#     """Serve frontend application root"""
-#     static_dir = Path(__file__).parent / "../frontend/dist"
-#     index_path = static_dir / "index.html"
+@app.get("/admin/analytics/school-daily", response_model=list[SchoolDailyRollupRow])
+def get_school_daily_rollups(
+    admin_user: Annotated[User, Depends(get_admin_reader)],
+    db: Annotated[Session, Depends(get_read_db)],
+    school: str | None = None,
+    from_date: Annotated[date | None, Query(alias="from")] = None,
+    to_date: Annotated[date | None, Query(alias="to")] = None,
+):
+    """Per-school daily averages from the precomputed rollups"""
+    logger.info(f"School daily rollups requested by admin: {admin_user.email}")
+    query = db.query(SchoolDailyRollup)
+    if school is not None:
+        query = query.filter(SchoolDailyRollup.school == school)
+    if from_date is not None:
+        query = query.filter(SchoolDailyRollup.survey_date >= from_date)
+    if to_date is not None:
+        query = query.filter(SchoolDailyRollup.survey_date <= to_date)
+    rows = query.order_by(SchoolDailyRollup.school, SchoolDailyRollup.survey_date)
 
-#     return FileResponse(index_path, media_type="text/html")
+    return [SchoolDailyRollupRow.model_validate(row) for row in rows]
+
+
+@app.get("/health")
+def health():
+    return {"status": "healthy"}
 
 
-# @app.options("/{path:path}")
-# def options_handler(path: str):
-#     return {"message": "OK"}
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+def get_metrics():
+    snapshot = metrics.snapshot()
+    snapshot["conditional_savings"] = conditional_savings(CONDITIONAL_ROUTES)
+    return snapshot
+
+
+# Frontend routes are registered last: the SPA fallback matches any path
+@app.get("/assets/{path:path}", include_in_schema=False)
+def serve_assets(path: str, request: Request):
+    """Serve hashed frontend assets with immutable caching"""
+    asset = static_frontend.lookup(f"assets/{path}", spa_fallback=False)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return static_frontend.response(request, asset)
+
+
+@app.get("/{path:path}", include_in_schema=False)
+def serve_frontend(path: str, request: Request):
+    """Serve frontend files with SPA routing support"""
+    # Only browser navigations fall back to index.html, API clients get a 404
+    wants_html = "text/html" in request.headers.get("accept", "")
+    asset = static_frontend.lookup(path or "index.html", spa_fallback=wants_html)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return static_frontend.response(request, asset)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+"""In-process metrics: counters and summaries exposed on GET /metrics."""
+
+import threading
+from collections import defaultdict
+
+
+def _key(name: str, labels: dict[str, object]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{label}={value}" for label, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and count/sum/max summaries."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._summaries: dict[str, list[float]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: object) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name: str, value: float, **labels: object) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = value
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def summary(self, name: str, **labels: object) -> dict[str, float] | None:
+        with self._lock:
+            summary = self._summaries.get(_key(name, labels))
+            if summary is None:
+                return None
+            count, total, maximum = summary
+        return {"count": count, "sum": total, "max": maximum, "mean": total / count}
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            counters = dict(self._counters)
+            summaries = {
+                key: {
+                    "count": count,
+                    "sum": round(total, 6),
+                    "max": round(maximum, 6),
+                    "mean": round(total / count, 6),
+                }
+                for key, (count, total, maximum) in self._summaries.items()
+            }
+        return {"counters": counters, "summaries": summaries}
+
+
+metrics = Metrics()
+
+
+def conditional_savings(routes: list[str]) -> dict[str, dict[str, float]]:
+    """Estimate bytes and handler time saved by 304 responses per route.
+
+    Savings are the number of 304s times the difference between the mean
+    200 and mean 304 response size / duration recorded by the HTTP
+    metrics middleware.
+    """
+    savings = {}
+    for route in routes:
+        full_bytes = metrics.summary("http_response_bytes", route=route, status=200)
+        full_time = metrics.summary("http_request_seconds", route=route, status=200)
+        short_bytes = metrics.summary("http_response_bytes", route=route, status=304)
+        short_time = metrics.summary("http_request_seconds", route=route, status=304)
+        if not (full_bytes and full_time and short_bytes and short_time):
+            continue
+        hits = short_time["count"]
+        savings[route] = {
+            "not_modified": hits,
+            "bytes_saved": round(hits * (full_bytes["mean"] - short_bytes["mean"])),
+            "seconds_saved": round(hits * (full_time["mean"] - short_time["mean"]), 6),
+        }
+    return savings
@@ -1,8 +1,14 @@
+from .background_job import BackgroundJob
 from .base import Base
 from .cleveland_survey import ClevelandSurvey
 from .daily_sleep_survey import DailySleepSurvey
 from .my_sleep_survey import MySleepSurvey
+from .rate_limit_bucket import RateLimitBucket
+from .refresh_watermark import RefreshWatermark
+from .school_daily_rollup import SchoolDailyRollup
 from .sleep_survey import SleepSurvey
+from .student_daily_means import StudentDailyMeans
+from .student_progress import StudentProgress
 from .user import User
 
 __all__ = [
@@ -12,4 +18,10 @@ __all__ = [
     "DailySleepSurvey",
     "ClevelandSurvey",
     "MySleepSurvey",
+    "StudentProgress",
+    "SchoolDailyRollup",
+    "BackgroundJob",
+    "RateLimitBucket",
+    "RefreshWatermark",
+    "StudentDailyMeans",
 ]
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class BackgroundJob(Base):
+    """Pending post-write job for the job_queue worker processes."""
+
+    __tablename__ = "background_jobs"
+    __table_args__ = (UniqueConstraint("name", "key", name="uq_background_job"),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    # User id, or "" for jobs that are not per user
+    key = Column(String, nullable=False)
+
+    # Bumped by every enqueue, so a job enqueued while it runs runs again
+    version = Column(Integer, nullable=False, server_default="1")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    run_after = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
+    # Lease of the worker running it; expired leases are claimed again
+    claimed_until = Column(DateTime(timezone=True))
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
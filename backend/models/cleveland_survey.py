@@ -1,6 +1,14 @@
-from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, UniqueConstraint
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal
 
 from .base import Base
 
@@ -47,34 +55,64 @@ class ClevelandSurvey(Base):
         UniqueConstraint(
             "user_id", "survey_date", name="uq_cleveland_survey_user_date"
         ),
+        # Change tracking for delta sync / validators
+        Index(
+            "ix_cleveland_surveys_user_changed",
+            user_id,
+            func.coalesce(updated_at, created_at),
+        ),
+        # Users changed since a watermark, for the incremental progress report
+        Index("ix_cleveland_surveys_changed", func.coalesce(updated_at, created_at)),
     )
 
-    def cleveland_score(self) -> int:
-        consigo_aguentar_dia_inteiro_escola_sem_cansaco = (
-            5 - self.consigo_aguentar_dia_inteiro_escola_sem_cansaco
-        )
-        fico_bem_acordado_durante_todo_dia = 5 - self.fico_bem_acordado_durante_todo_dia
-        sinto_me_desperto_durante_aulas = 5 - self.sinto_me_desperto_durante_aulas
-        quando_estou_aulas_sinto_me_bem_desperto = (
-            5 - self.quando_estou_aulas_sinto_me_bem_desperto
-        )
-        estou_bem_desperto_ultima_aula_dia = 5 - self.estou_bem_desperto_ultima_aula_dia
+    # Item order follows the questionnaire (1-16)
+    SCORE_ITEMS = (
+        "adormeco_durante_aulas_manha",
+        "consigo_aguentar_dia_inteiro_escola_sem_cansaco",
+        "adormeco_ultima_aula_dia",
+        "fico_sonolento_carro_mais_5_minutos",
+        "fico_bem_acordado_durante_todo_dia",
+        "adormeco_escola_aulas_tarde",
+        "sinto_me_desperto_durante_aulas",
+        "sinto_me_sonolento_fim_dia_depois_aulas",
+        "sinto_me_sonolento_autocarro_atividade_escola",
+        "de_manha_quando_estou_escola_adormeco",
+        "quando_estou_aulas_sinto_me_bem_desperto",
+        "sinto_me_sonolento_trabalhos_casa_noite_escola",
+        "estou_bem_desperto_ultima_aula_dia",
+        "adormeco_quando_ando_carro_autocarro_comboio",
+        "durante_dia_escola_momentos_acabei_adormecer",
+        "adormeco_quando_faco_trabalhos_escola_noite_casa",
+    )
+    # Alertness items (2, 5, 7, 11, 13) are scored as 5 - answer
+    REVERSE_SCORED_ITEMS = frozenset(
+        {
+            "consigo_aguentar_dia_inteiro_escola_sem_cansaco",
+            "fico_bem_acordado_durante_todo_dia",
+            "sinto_me_desperto_durante_aulas",
+            "quando_estou_aulas_sinto_me_bem_desperto",
+            "estou_bem_desperto_ultima_aula_dia",
+        }
+    )
+    MAX_ITEM_SCORE = 5
 
-        return (
-            self.adormeco_durante_aulas_manha
-            + consigo_aguentar_dia_inteiro_escola_sem_cansaco
-            + self.adormeco_ultima_aula_dia
-            + self.fico_sonolento_carro_mais_5_minutos
-            + fico_bem_acordado_durante_todo_dia
-            + self.adormeco_escola_aulas_tarde
-            + sinto_me_desperto_durante_aulas
-            + self.sinto_me_sonolento_fim_dia_depois_aulas
-            + self.sinto_me_sonolento_autocarro_atividade_escola
-            + self.de_manha_quando_estou_escola_adormeco
-            + quando_estou_aulas_sinto_me_bem_desperto
-            + self.sinto_me_sonolento_trabalhos_casa_noite_escola
-            + estou_bem_desperto_ultima_aula_dia
-            + self.adormeco_quando_ando_carro_autocarro_comboio
-            + self.durante_dia_escola_momentos_acabei_adormecer
-            + self.adormeco_quando_faco_trabalhos_escola_noite_casa
+    def cleveland_score(self) -> int:
+        return sum(
+            self.MAX_ITEM_SCORE - getattr(self, item)
+            if item in self.REVERSE_SCORED_ITEMS
+            else getattr(self, item)
+            for item in self.SCORE_ITEMS
         )  # type: ignore
+
+    @classmethod
+    def cleveland_score_expression(cls):
+        """SQL expression equivalent to cleveland_score(), for aggregates."""
+        return sum(
+            (
+                cls.MAX_ITEM_SCORE - getattr(cls, item)
+                if item in cls.REVERSE_SCORED_ITEMS
+                else getattr(cls, item)
+                for item in cls.SCORE_ITEMS
+            ),
+            start=literal(0),
+        )
@@ -3,6 +3,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Time,
@@ -17,7 +18,7 @@ from .base import Base
 class DailySleepSurvey(Base):
     __tablename__ = "daily_sleep_surveys"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # Daily sleep tracking fields
@@ -39,12 +40,27 @@ class DailySleepSurvey(Base):
         String, nullable=True
     )  # Optional observation about last night
 
-    survey_date = Column(Date, nullable=False, server_default=func.current_date())
+    # Part of the primary key: the table is range-partitioned by survey_date
+    # (see partitions.py), and Postgres requires the partition key in it
+    survey_date = Column(
+        Date, primary_key=True, nullable=False, server_default=func.current_date()
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Ensure only one survey per user per day
-    __table_args__ = (UniqueConstraint("user_id", "survey_date", name="uq_user_date"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "survey_date", name="uq_user_date"),
+        # Change tracking for delta sync / validators
+        Index(
+            "ix_daily_sleep_surveys_user_changed",
+            user_id,
+            func.coalesce(updated_at, created_at),
+        ),
+        # Days changed since a watermark, for incremental school rollups
+        Index("ix_daily_sleep_surveys_changed", func.coalesce(updated_at, created_at)),
+        {"postgresql_partition_by": "RANGE (survey_date)"},
+    )
 
     # Relationship with User
     user = relationship("User", back_populates="daily_sleep_surveys")
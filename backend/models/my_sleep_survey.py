@@ -1,4 +1,12 @@
-from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, UniqueConstraint
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -27,4 +35,12 @@ class MySleepSurvey(Base):
     # Table constraints
     __table_args__ = (
         UniqueConstraint("user_id", "survey_date", name="uq_my_sleep_survey_user_date"),
+        # Change tracking for delta sync / validators
+        Index(
+            "ix_my_sleep_surveys_user_changed",
+            user_id,
+            func.coalesce(updated_at, created_at),
+        ),
+        # Users changed since a watermark, for the incremental progress report
+        Index("ix_my_sleep_surveys_changed", func.coalesce(updated_at, created_at)),
     )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Float, String
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by the API processes (RATE_LIMIT_BACKEND=database).
+
+    Unlogged: losing the buckets in a crash only resets the limits.
+    """
+
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    # "group:kind:value", e.g. "login:email:ana@example.com"
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
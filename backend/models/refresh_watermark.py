@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class RefreshWatermark(Base):
+    """How far an incremental refresh of derived data has got."""
+
+    __tablename__ = "refresh_watermarks"
+
+    # Refreshed table, e.g. "student_progress"
+    name = Column(String, primary_key=True)
+    # Every source change up to this one is reflected in the table
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
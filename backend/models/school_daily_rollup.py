@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class SchoolDailyRollup(Base):
+    """Per-school, per-day averages of daily surveys, maintained by rollups."""
+
+    __tablename__ = "school_daily_rollups"
+
+    school = Column(String, primary_key=True)
+    survey_date = Column(Date, primary_key=True)
+
+    # Students with an entry that day
+    students = Column(Integer, nullable=False)
+    mean_sleep_duration = Column(Float)
+    # Circular mean time of day, in minutes from midnight
+    mean_bedtime = Column(Float)
+    mean_wake_time = Column(Float)
+    mean_sleep_quality = Column(Float)
+
+    # Latest survey change the row was computed from (incremental refresh)
+    source_changed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -4,6 +4,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     UniqueConstraint,
 )
@@ -51,4 +52,12 @@ class SleepSurvey(Base):
     # Table constraints
     __table_args__ = (
         UniqueConstraint("user_id", "survey_date", name="uq_sleep_survey_user_date"),
+        # Change tracking for delta sync / validators
+        Index(
+            "ix_sleep_surveys_user_changed",
+            user_id,
+            func.coalesce(updated_at, created_at),
+        ),
+        # Users changed since a watermark, for the incremental progress report
+        Index("ix_sleep_surveys_changed", func.coalesce(updated_at, created_at)),
     )
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class StudentDailyMeans(Base):
+    """Per-student means over all daily surveys, maintained by student_means."""
+
+    __tablename__ = "student_daily_means"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    entries = Column(Integer, nullable=False)
+    mean_sleep_duration = Column(Float)
+    # Minutes from midnight, as in the dashboard means
+    mean_wake_time = Column(Float)
+    mean_bedtime = Column(Float)
+    mean_time_to_sleep = Column(Float)
+    mean_night_awakenings = Column(Float)
+    mean_sleep_quality = Column(Float)
+
+    # Latest survey change the row was computed from (incremental refresh)
+    source_changed_at = Column(DateTime(timezone=True), nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class StudentProgress(Base):
+    """First vs latest score per instrument, maintained by progress_report."""
+
+    __tablename__ = "student_progress"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    # Knowledge quiz score (0-20)
+    quiz_surveys = Column(Integer, nullable=False, server_default="0")
+    quiz_pre = Column(Integer)
+    quiz_post = Column(Integer)
+
+    # Cleveland sleepiness score (16-80, lower is better)
+    cleveland_surveys = Column(Integer, nullable=False, server_default="0")
+    cleveland_pre = Column(Integer)
+    cleveland_post = Column(Integer)
+
+    # Mean of the four "my sleep" self-ratings (1-10)
+    my_sleep_surveys = Column(Integer, nullable=False, server_default="0")
+    my_sleep_pre = Column(Float)
+    my_sleep_post = Column(Float)
+
+    # Latest survey change the row was computed from (incremental refresh)
+    source_changed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
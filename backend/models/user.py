@@ -1,6 +1,6 @@
 import enum
 
-from sqlalchemy import Column, Date, DateTime, Enum, Integer, String
+from sqlalchemy import Column, Date, DateTime, Enum, Index, Integer, String
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -29,6 +29,11 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Cohort filters and GROUP BY in the analytics endpoints
+        Index("ix_users_cohort", school, school_year, gender),
+    )
+
     # Relationships
     sleep_surveys = relationship("SleepSurvey", back_populates="user")
     daily_sleep_surveys = relationship("DailySleepSurvey", back_populates="user")
@@ -0,0 +1,235 @@
+"""Monthly range partitions of daily_sleep_surveys: creation and archival.
+
+daily_sleep_surveys is partitioned by survey_date, one partition per calendar
+month (daily_sleep_surveys_y2025m09, ...) plus daily_sleep_surveys_default
+for dates no partition covers. The maintenance job keeps partitions created
+DAILY_SURVEYS_PARTITION_MONTHS_AHEAD months ahead and, when
+DAILY_SURVEYS_RETENTION_MONTHS is set, archives older months: each partition
+is detached, written to DAILY_SURVEYS_ARCHIVE_DIR as a gzipped CSV (with
+header) and dropped, so queries and vacuum only deal with recent months.
+
+Surveys dated outside the existing partitions land in the default partition
+and get a partition of their own on the next run, unless their month is
+already past retention.
+
+The job only runs in processes started with PARTITION_MAINTENANCE_ENABLED,
+so that one designated process takes its exclusive locks rather than every
+worker.
+
+Run as a script for manual maintenance:
+
+    python partitions.py [--archive-before YYYY-MM-DD]
+"""
+
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import Date, cast, column, func, select, table, text
+from sqlalchemy.orm import Session
+
+from config import (
+    DAILY_SURVEYS_ARCHIVE_DIR,
+    DAILY_SURVEYS_PARTITION_MONTHS_AHEAD,
+    DAILY_SURVEYS_RETENTION_MONTHS,
+)
+from database import SessionLocal
+from logging_config import get_logger
+from models import DailySleepSurvey
+
+logger = get_logger("partitions")
+
+TABLE = DailySleepSurvey.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# CREATE ... PARTITION OF and DETACH take exclusive locks on
+# daily_sleep_surveys; give up rather than queue every request behind a
+# long-running query
+LOCK_TIMEOUT = "5s"
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month ``months`` after the month of ``month``."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def monthly_partitions(db: Session) -> list[date]:
+    """First day of every month with an attached partition, in order."""
+    names = db.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": TABLE},
+    )
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def create_partition(db: Session, month: date) -> None:
+    """Create and attach the partition of ``month``.
+
+    Rows of that month already in the default partition are moved into it
+    first: attaching a range the default partition has rows for would fail.
+    """
+    name = partition_name(month)
+    upper = add_months(month, 1)
+    db.execute(
+        text(
+            f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE survey_date >= :lower AND survey_date < :upper RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"lower": month, "upper": upper},
+    )
+    db.execute(
+        text(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    )
+
+
+def ensure_partitions(
+    db: Session,
+    today: date,
+    months_ahead: int = DAILY_SURVEYS_PARTITION_MONTHS_AHEAD,
+    since: date | None = None,
+) -> list[str]:
+    """Create the missing partitions from this month to ``months_ahead``.
+
+    Months with rows in the default partition get one too, from ``since``
+    on: older months are archived, their stragglers stay in the default.
+    """
+    months = {add_months(today, offset) for offset in range(months_ahead + 1)}
+    stragglers = select(
+        func.distinct(cast(func.date_trunc("month", column("survey_date")), Date))
+    ).select_from(table(DEFAULT_PARTITION))
+    if since is not None:
+        stragglers = stragglers.where(column("survey_date") >= since)
+    months.update(db.scalars(stragglers))
+
+    created = []
+    for month in sorted(months - set(monthly_partitions(db))):
+        create_partition(db, month)
+        created.append(partition_name(month))
+    return created
+
+
+def _dump(db: Session, table: str, path: Path) -> int:
+    """COPY ``table`` into a gzipped CSV at ``path``, returning the row count.
+
+    Written to a temporary file first and synced, so ``path`` is either
+    complete or absent.
+    """
+    partial = path.with_name(path.name + ".partial")
+    cursor = db.connection().connection.cursor()
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as out:
+            cursor.copy_expert(f"COPY {table} TO STDOUT WITH (FORMAT csv, HEADER)", out)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+    return cursor.rowcount
+
+
+def archive_partitions(
+    db: Session, before: date, archive_dir: Path = DAILY_SURVEYS_ARCHIVE_DIR
+) -> list[Path]:
+    """Detach, dump and drop the partitions of months ending by ``before``.
+
+    Nothing is dropped until the caller commits; existing archive files are
+    never overwritten.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archived = []
+    for month in monthly_partitions(db):
+        if add_months(month, 1) > before:
+            break
+        name = partition_name(month)
+        db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        path = archive_dir / f"{name}.csv.gz"
+        copies = 1
+        while path.exists():
+            # Never overwrite: the month was recreated and archived again
+            copies += 1
+            path = archive_dir / f"{name}.{copies}.csv.gz"
+        rows = _dump(db, name, path)
+        db.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Archived {name}: {rows} rows to {path}")
+        archived.append(path)
+    return archived
+
+
+def maintain_partitions(
+    db: Session, today: date | None = None, archive_before: date | None = None
+) -> tuple[list[str], list[Path]] | None:
+    """Create upcoming partitions and archive expired ones, in one transaction.
+
+    Months before ``archive_before`` are archived; by default that is
+    DAILY_SURVEYS_RETENTION_MONTHS before the current month, if set. Returns
+    None without doing anything when another process holds the lock.
+    """
+    locked = db.scalar(
+        select(func.pg_try_advisory_xact_lock(func.hashtext(TABLE + "_partitions")))
+    )
+    if not locked:
+        db.rollback()
+        return None
+    db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+
+    today = today or date.today()
+    if archive_before is None and DAILY_SURVEYS_RETENTION_MONTHS > 0:
+        archive_before = add_months(today, -DAILY_SURVEYS_RETENTION_MONTHS)
+    created = ensure_partitions(db, today, since=archive_before)
+    archived = archive_partitions(db, archive_before) if archive_before else []
+    db.commit()
+
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created, archived
+
+
+def partition_maintenance_job() -> None:
+    """Scheduler entry point: maintenance in its own session."""
+    with SessionLocal() as db:
+        maintain_partitions(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--archive-before",
+        type=date.fromisoformat,
+        help="archive the months ending by this date, regardless of retention",
+    )
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        result = maintain_partitions(db, archive_before=args.archive_before)
+    if result is None:
+        print("Another maintenance run is in progress")
+    else:
+        created, archived = result
+        print(f"Created {len(created)} partitions, archived {len(archived)}")
+        for path in archived:
+            print(f"  {path}")
@@ -0,0 +1,317 @@
+"""Pre/post program outcomes: first vs latest survey per student and instrument.
+
+``refresh_student_progress`` keeps the student_progress table up to date with
+one INSERT ... SELECT ... ON CONFLICT statement built from window queries.
+Incremental runs only recompute students with a survey change newer than the
+watermark in refresh_watermarks, which only incremental and full runs move:
+students recomputed on their own (after a survey write) don't advance it
+past students still waiting. ``refresh_progress_job`` runs the incremental
+refresh on a schedule. ``progress_effect_summary`` aggregates the stored rows
+into a cohort-level effect summary.
+
+Run as a script to refresh and print the summary:
+
+    python progress_report.py [--full] [--group-by school] ...
+"""
+
+import argparse
+from datetime import timedelta
+
+from sqlalchemy import Float, case, cast, func, select, union
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from analytics import COHORT_COLUMNS, cohort_filter, cohort_groups
+from config import SYNC_CURSOR_SETTLE_SECONDS
+from database import SessionLocal
+from logging_config import get_logger
+from models import (
+    ClevelandSurvey,
+    MySleepSurvey,
+    RefreshWatermark,
+    SleepSurvey,
+    StudentProgress,
+    User,
+)
+from sleep_survey_answer_key import score_expression
+from sync import row_version
+
+logger = get_logger("progress")
+
+MY_SLEEP_ITEMS = (
+    MySleepSurvey.durmo_mal_ou_bem,
+    MySleepSurvey.gosto_de_dormir,
+    MySleepSurvey.acho_sono_importante_para_mim,
+    MySleepSurvey.o_que_sei_sobre_sono,
+)
+
+# Instrument -> (model, score expression, +1 if higher is better else -1)
+INSTRUMENTS = {
+    "quiz": (SleepSurvey, score_expression(SleepSurvey), 1),
+    "cleveland": (
+        ClevelandSurvey,
+        ClevelandSurvey.cleveland_score_expression(),
+        -1,
+    ),
+    "my_sleep": (
+        MySleepSurvey,
+        sum(MY_SLEEP_ITEMS[1:], start=MY_SLEEP_ITEMS[0]) / float(len(MY_SLEEP_ITEMS)),
+        1,
+    ),
+}
+
+# Response keys for the instruments above
+INSTRUMENT_KEYS = {"quiz": "quiz", "cleveland": "cleveland", "my_sleep": "mySleep"}
+
+WATERMARK = StudentProgress.__tablename__
+
+
+def _first_and_latest(model, score, users):
+    """Per user: survey count, first score, latest score and latest change.
+
+    FIRST_VALUE over the surveys in date order gives the pre score and
+    ROW_NUMBER in reverse date order picks the latest row for the post score.
+    """
+    by_user = {"partition_by": model.user_id}
+    ranked = select(
+        model.user_id,
+        func.count().over(**by_user).label("surveys"),
+        func.first_value(score)
+        .over(**by_user, order_by=model.survey_date)
+        .label("pre"),
+        score.label("latest"),
+        func.row_number()
+        .over(**by_user, order_by=model.survey_date.desc())
+        .label("recency"),
+        func.max(row_version(model)).over(**by_user).label("changed_at"),
+    )
+    if users is not None:
+        ranked = ranked.where(model.user_id.in_(select(users.c.user_id)))
+    ranked = ranked.subquery()
+
+    return (
+        select(
+            ranked.c.user_id,
+            ranked.c.surveys,
+            ranked.c.pre,
+            # A single survey is a baseline only, there is no post yet
+            case((ranked.c.surveys > 1, ranked.c.latest)).label("post"),
+            ranked.c.changed_at,
+        )
+        .where(ranked.c.recency == 1)
+        .subquery()
+    )
+
+
+def changed_users(since=None, user_ids=None):
+    """Users with a pre/post survey changed after ``since`` (all when None).
+
+    ``user_ids`` restricts the result to those users.
+    """
+    selects = []
+    for model, _, _ in INSTRUMENTS.values():
+        query = select(model.user_id)
+        if since is not None:
+            query = query.where(row_version(model) > since)
+        if user_ids is not None:
+            query = query.where(model.user_id.in_(user_ids))
+        selects.append(query)
+    return union(*selects).subquery()
+
+
+def refresh_student_progress(
+    db: Session, full: bool = False, user_ids: list[int] | None = None
+) -> int | None:
+    """Recompute student_progress rows, returning how many were written.
+
+    Incremental runs start at the watermark minus the sync settle window,
+    so rows from transactions that committed late are picked up on the
+    next run; without a watermark they recompute everyone. With
+    ``user_ids``, only those students are recomputed, whatever changed, and
+    the watermark stays. Incremental and full runs return None without
+    doing anything while another one holds the refresh lock.
+    """
+    since = None
+    if user_ids is None:
+        locked = db.scalar(
+            select(func.pg_try_advisory_xact_lock(func.hashtext(WATERMARK)))
+        )
+        if not locked:
+            db.rollback()
+            return None
+        if not full:
+            since = db.scalar(
+                select(RefreshWatermark.changed_at).where(
+                    RefreshWatermark.name == WATERMARK
+                )
+            )
+            if since is not None:
+                since -= timedelta(seconds=SYNC_CURSOR_SETTLE_SECONDS)
+
+    users = changed_users(since, user_ids)
+    # A full rebuild needs no IN (...) filter on the window queries
+    window_users = users if since is not None or user_ids is not None else None
+    per_instrument = {
+        name: _first_and_latest(model, score, window_users)
+        for name, (model, score, _) in INSTRUMENTS.items()
+    }
+
+    columns = {"user_id": users.c.user_id}
+    query = select().select_from(users)
+    for name, subquery in per_instrument.items():
+        query = query.outerjoin(subquery, subquery.c.user_id == users.c.user_id)
+        columns[f"{name}_surveys"] = func.coalesce(subquery.c.surveys, 0)
+        columns[f"{name}_pre"] = subquery.c.pre
+        columns[f"{name}_post"] = subquery.c.post
+    columns["source_changed_at"] = func.greatest(
+        *(subquery.c.changed_at for subquery in per_instrument.values())
+    )
+    query = query.add_columns(
+        *(expression.label(name) for name, expression in columns.items())
+    )
+
+    statement = insert(StudentProgress).from_select(list(columns), query)
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            **{name: statement.excluded[name] for name in columns if name != "user_id"},
+            "computed_at": func.now(),
+        },
+    ).returning(StudentProgress.source_changed_at)
+    changed = db.scalars(statement).all()
+    written = len(changed)
+    if user_ids is None and changed:
+        # Every change up to the newest one recomputed is now reflected
+        _advance_watermark(db, max(changed))
+    db.commit()
+
+    if user_ids is not None:
+        mode = f"users {', '.join(map(str, user_ids))}"
+    else:
+        mode = "full" if since is None else f"since {since.isoformat()}"
+    logger.info(f"Student progress refreshed ({mode}): {written} students")
+    return written
+
+
+def _advance_watermark(db: Session, changed_at) -> None:
+    statement = insert(RefreshWatermark).values(name=WATERMARK, changed_at=changed_at)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "changed_at": func.greatest(
+                    RefreshWatermark.changed_at, statement.excluded.changed_at
+                ),
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+def refresh_progress_job() -> None:
+    """Scheduler entry point: incremental refresh in its own session."""
+    with SessionLocal() as db:
+        refresh_student_progress(db)
+
+
+def _round(value: float | None) -> float | None:
+    return round(float(value), 2) if value is not None else None
+
+
+def progress_effect_summary(
+    db: Session, filters: dict[str, object], group_by: list[str]
+) -> dict[tuple, dict]:
+    """Cohort-level pre/post effects per instrument from student_progress.
+
+    Only students with both a first and a later survey of an instrument
+    count towards it. ``effect_size`` is the standardized mean change
+    (mean change / SD of change); ``pct_improved`` follows each
+    instrument's direction (a lower Cleveland score is an improvement).
+    """
+    group_columns = [COHORT_COLUMNS[name].label(name) for name in group_by]
+    columns = [func.count().label("students")]
+    for name, (_, _, direction) in INSTRUMENTS.items():
+        pre = cast(getattr(StudentProgress, f"{name}_pre"), Float)
+        post = cast(getattr(StudentProgress, f"{name}_post"), Float)
+        change = post - pre
+        paired = post.is_not(None)
+        columns += [
+            func.count(change).label(f"{name}__n"),
+            func.avg(pre).filter(paired).label(f"{name}__mean_pre"),
+            func.avg(post).label(f"{name}__mean_post"),
+            func.avg(change).label(f"{name}__mean_change"),
+            func.stddev_samp(change).label(f"{name}__sd_change"),
+            func.avg(case((change * direction > 0, 1.0), else_=0.0))
+            .filter(paired)
+            .label(f"{name}__improved"),
+        ]
+    query = (
+        select(*group_columns, *columns)
+        .select_from(StudentProgress)
+        .join(User, User.id == StudentProgress.user_id)
+        .where(cohort_filter(filters))
+        .group_by(*group_columns)
+    )
+
+    groups = {}
+    for row in db.execute(query).mappings():
+        effects = {}
+        for name in INSTRUMENTS:
+            mean_change = row[f"{name}__mean_change"]
+            sd_change = row[f"{name}__sd_change"]
+            improved = row[f"{name}__improved"]
+            effects[INSTRUMENT_KEYS[name]] = {
+                "n": row[f"{name}__n"],
+                "mean_pre": _round(row[f"{name}__mean_pre"]),
+                "mean_post": _round(row[f"{name}__mean_post"]),
+                "mean_change": _round(mean_change),
+                "sd_change": _round(sd_change),
+                "effect_size": _round(mean_change / sd_change) if sd_change else None,
+                "pct_improved": _round(improved * 100)
+                if improved is not None
+                else None,
+            }
+        groups[tuple(row[name] for name in group_by)] = {
+            "students": row["students"],
+            "effects": effects,
+        }
+    return groups
+
+
+def _format(value: float | None) -> str:
+    return f"{value:7.2f}" if value is not None else "      -"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="recompute every student")
+    parser.add_argument("--school")
+    parser.add_argument("--school-year", type=int)
+    parser.add_argument("--gender", choices=["M", "F", "O"])
+    parser.add_argument(
+        "--group-by", action="append", default=[], choices=list(COHORT_COLUMNS)
+    )
+    args = parser.parse_args()
+
+    filters = {
+        "school": args.school,
+        "school_year": args.school_year,
+        "gender": args.gender,
+    }
+    group_by = list(dict.fromkeys(args.group_by))
+    with SessionLocal() as db:
+        if refresh_student_progress(db, full=args.full) is None:
+            print("Another refresh is running, showing the stored progress")
+        summary = progress_effect_summary(db, filters, group_by)
+
+    for fields, group in cohort_groups(summary, filters, group_by):
+        cohort = ", ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+        print(f"\n[{cohort or 'all students'}] {group['students']} students")
+        print("  instrument      n      pre     post   change  effect  %improved")
+        for instrument, effect in group["effects"].items():
+            print(
+                f"  {instrument:<10} {effect['n']:5d} "
+                f"{_format(effect['mean_pre'])}  {_format(effect['mean_post'])} "
+                f"{_format(effect['mean_change'])} {_format(effect['effect_size'])} "
+                f"{_format(effect['pct_improved'])}"
+            )
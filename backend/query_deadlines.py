@@ -0,0 +1,202 @@
+"""Per route class database deadlines and cancellation of abandoned queries.
+
+Request sessions get the statement_timeout and lock_timeout of their route
+class (admission.route_class, or "default") set on every transaction they
+begin, so a slow aggregation or a blocked write gives its connection back
+instead of holding it until the client gives up. Timeouts surface as clean
+responses (timeout_response): 504 for statement timeouts, 503 with
+Retry-After for lock and connection pool timeouts.
+
+QueryCancellationMiddleware also cancels the running queries of a request
+whose client disconnects: handlers run in threads and would otherwise
+finish queries nobody is waiting for.
+"""
+
+import asyncio
+import threading
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from admission import route_class
+from config import DATABASE_LOCK_TIMEOUT_MS, DATABASE_STATEMENT_TIMEOUT_MS
+from logging_config import get_logger
+from metrics import metrics
+
+logger = get_logger("query_deadlines")
+
+# Postgres error codes: statement_timeout or a cancel request, lock_timeout
+QUERY_CANCELED = "57014"
+LOCK_NOT_AVAILABLE = "55P03"
+
+# Key of the request's RequestQueries in the ASGI scope state
+QUERIES_STATE = "db_queries"
+
+SET_TIMEOUTS = text(
+    "SELECT set_config('statement_timeout', :statement, true), "
+    "set_config('lock_timeout', :lock, true)"
+)
+
+
+def deadlines(name: str) -> tuple[float, float]:
+    """(statement, lock) timeouts of a route class in ms, 0 meaning none."""
+    return (
+        DATABASE_STATEMENT_TIMEOUT_MS.get(
+            name, DATABASE_STATEMENT_TIMEOUT_MS["default"]
+        ),
+        DATABASE_LOCK_TIMEOUT_MS.get(name, DATABASE_LOCK_TIMEOUT_MS["default"]),
+    )
+
+
+class RequestQueries:
+    """Database connections a request's sessions are using, to cancel them."""
+
+    def __init__(self):
+        self._connections: dict[Session, object] = {}
+        self._lock = threading.Lock()
+        self.cancelled = False
+
+    def add(self, session: Session, dbapi_connection) -> None:
+        with self._lock:
+            self._connections[session] = dbapi_connection
+
+    def discard(self, session: Session) -> None:
+        with self._lock:
+            self._connections.pop(session, None)
+
+    def cancel(self) -> int:
+        """Cancel the queries running now; returns on how many connections."""
+        with self._lock:
+            self.cancelled = True
+            connections = list(self._connections.values())
+        for connection in connections:
+            try:
+                connection.cancel()
+            except Exception as exc:
+                logger.warning(f"Could not cancel query: {exc}")
+        return len(connections)
+
+
+def bind_session(
+    db: Session, request: Request | None = None, name: str | None = None
+) -> None:
+    """Give ``db`` the deadlines of the request's route class, or of ``name``."""
+    if request is not None:
+        name = route_class(request.method, request.url.path)
+        db.info["queries"] = request.scope.get("state", {}).get(QUERIES_STATE)
+    db.info["route_class"] = name or "default"
+
+
+@event.listens_for(Session, "after_begin")
+def _set_timeouts(session: Session, transaction, connection) -> None:
+    name = session.info.get("route_class")
+    if name is None:
+        return
+    statement_ms, lock_ms = deadlines(name)
+    connection.execute(
+        SET_TIMEOUTS, {"statement": f"{statement_ms:.0f}", "lock": f"{lock_ms:.0f}"}
+    )
+    queries = session.info.get("queries")
+    if queries is not None:
+        queries.add(session, connection.connection.dbapi_connection)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_connection(session: Session, transaction) -> None:
+    queries = session.info.get("queries")
+    if queries is not None and transaction.parent is None:
+        queries.discard(session)
+
+
+def timeout_response(request: Request, exc: Exception) -> JSONResponse | None:
+    """The response for a database timeout, None for other errors."""
+    name = route_class(request.method, request.url.path) or "default"
+    if isinstance(exc, PoolTimeoutError):
+        kind = "pool"
+    elif isinstance(exc, OperationalError):
+        pgcode = getattr(exc.orig, "pgcode", None)
+        if pgcode == QUERY_CANCELED:
+            queries = request.scope.get("state", {}).get(QUERIES_STATE)
+            # Cancelled because the client left: nobody gets the response
+            cancelled = queries is not None and queries.cancelled
+            kind = "cancelled" if cancelled else "statement"
+        elif pgcode == LOCK_NOT_AVAILABLE:
+            kind = "lock"
+        else:
+            return None
+    else:
+        return None
+
+    metrics.incr("db_timeouts", kind=kind, route_class=name)
+    logger.warning(
+        f"Database query ended ({kind}): {request.method} {request.url.path}"
+    )
+    if kind in ("statement", "cancelled"):
+        return JSONResponse(
+            {"detail": "Database query timed out"},
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        )
+    return JSONResponse(
+        {"detail": "Database busy, retry later"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+class QueryCancellationMiddleware:
+    """Cancel a request's database queries when its client disconnects."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        scope.setdefault("state", {})[QUERIES_STATE] = queries
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        responded = False
+
+        async def pump() -> None:
+            # Read ahead of the app, which stops receiving once it has the
+            # body (GET handlers don't receive at all), to see the disconnect
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    break
+            if not responded:
+                cancelled = await asyncio.to_thread(queries.cancel)
+                if cancelled:
+                    metrics.incr("db_queries_cancelled", cancelled)
+                    logger.info(
+                        f"Client left, cancelled {cancelled} queries of "
+                        f"{scope['method']} {scope['path']}"
+                    )
+
+        async def receive_pumped() -> Message:
+            message = await messages.get()
+            if message["type"] == "http.disconnect":
+                # Every later receive sees the disconnect too
+                messages.put_nowait(message)
+            return message
+
+        async def send_watched(message: Message) -> None:
+            nonlocal responded
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                responded = True
+            await send(message)
+
+        reader = asyncio.create_task(pump())
+        try:
+            await self.app(scope, receive_pumped, send_watched)
+        finally:
+            responded = True
+            reader.cancel()
@@ -0,0 +1,232 @@
+"""Token bucket rate limiting of auth and write endpoints.
+
+Each limit in RATE_LIMITS is a bucket per route group and key: the client
+IP (client_ip, through the TRUSTED_PROXIES), the email being logged in or
+registered, or the authenticated user id. A bucket holds up to
+``requests`` tokens and refills at ``requests / seconds`` per second; a
+request takes one token from every bucket it falls in and is refused with
+429 and Retry-After, keeping none of them, when one of them is empty.
+
+RATE_LIMIT_BACKEND selects where buckets are kept:
+
+- ``memory``: in this process, in lock-sharded dicts, so checks from
+  different threads rarely wait on each other. Limits are per process.
+- ``database``: in the unlogged rate_limit_buckets table, shared by all
+  processes, at the cost of a round trip per bucket. Buckets are not
+  enforced while the database is unavailable.
+"""
+
+import ipaddress
+import math
+import threading
+import time
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import extract, func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMITS,
+    TRUSTED_PROXIES,
+)
+from database import SessionLocal
+from logging_config import get_logger
+from metrics import metrics
+from models import RateLimitBucket
+
+logger = get_logger("rate_limit")
+
+SHARDS = 64
+
+TRUSTED_NETWORKS = tuple(
+    ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES
+)
+
+
+def refill(tokens: float, elapsed: float, capacity: int, rate: float) -> float:
+    return min(capacity, tokens + elapsed * rate)
+
+
+class MemoryRateLimitStore:
+    """Token buckets in this process, sharded by key hash."""
+
+    def __init__(self, shards: int = SHARDS, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._shards: list[dict[str, list[float]]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self.max_keys_per_shard = max(1, max_keys // shards)
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take a token for ``key``: 0, or the seconds until one is available."""
+        index = hash(key) % len(self._shards)
+        buckets = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._prune(buckets, now, capacity, rate)
+                bucket = buckets[key] = [capacity, now]
+            tokens = refill(bucket[0], now - bucket[1], capacity, rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def refund(self, key: str, capacity: int) -> None:
+        """Give back a token taken for a request that was refused after all."""
+        index = hash(key) % len(self._shards)
+        with self._locks[index]:
+            bucket = self._shards[index].get(key)
+            if bucket is not None:
+                bucket[0] = min(capacity, bucket[0] + 1)
+
+    @staticmethod
+    def _prune(buckets: dict, now: float, capacity: int, rate: float) -> None:
+        # Refilled buckets are the same as missing ones. If all are in use,
+        # drop the older half rather than grow without bound
+        full = [
+            key
+            for key, (tokens, updated) in buckets.items()
+            if refill(tokens, now - updated, capacity, rate) >= capacity
+        ]
+        for key in full or list(buckets)[: len(buckets) // 2]:
+            del buckets[key]
+
+
+class DatabaseRateLimitStore:
+    """Token buckets in rate_limit_buckets, shared by all processes."""
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take a token for ``key``: 0, or the seconds until one is available."""
+        # The upsert creates the bucket or locks it until the commit
+        locked = (
+            insert(RateLimitBucket)
+            .values(key=key, tokens=capacity)
+            .on_conflict_do_update(index_elements=["key"], set_={"key": key})
+            .returning(
+                RateLimitBucket.tokens,
+                extract("epoch", func.now() - RateLimitBucket.updated_at),
+            )
+        )
+        with SessionLocal() as db:
+            tokens, elapsed = db.execute(locked).one()
+            tokens = refill(tokens, float(elapsed), capacity, rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            db.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.key == key)
+                .values(
+                    tokens=tokens - 1 if wait == 0 else tokens, updated_at=func.now()
+                )
+            )
+            db.commit()
+        return wait
+
+    def refund(self, key: str, capacity: int) -> None:
+        """Give back a token taken for a request that was refused after all."""
+        with SessionLocal() as db:
+            db.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.key == key)
+                .values(tokens=func.least(capacity, RateLimitBucket.tokens + 1))
+            )
+            db.commit()
+
+
+RATE_LIMIT_STORES = {"memory": MemoryRateLimitStore, "database": DatabaseRateLimitStore}
+
+
+class RateLimiter:
+    """Applies the RATE_LIMITS of a route group to a request's keys."""
+
+    def __init__(
+        self, store, limits: dict[tuple[str, str], tuple[int, float]] = RATE_LIMITS
+    ):
+        self.store = store
+        # (group, key kind) -> (capacity, tokens per second)
+        self.limits = {
+            bucket: (requests, requests / seconds)
+            for bucket, (requests, seconds) in limits.items()
+            if requests > 0
+        }
+
+    def check(self, group: str, **keys: object) -> float:
+        """Take a token from each bucket of ``group`` that applies to ``keys``.
+
+        Returns 0, or the seconds until the request would be allowed. A
+        refused request keeps no tokens: checking stops at the first empty
+        bucket and the tokens taken before it are given back, so a client
+        blocked on its own bucket can't drain the ones it shares (e.g. the
+        email of the account it is guessing). Keys that are None (e.g. no
+        authenticated user) are skipped.
+        """
+        taken = []
+        for kind, value in keys.items():
+            limit = self.limits.get((group, kind))
+            if limit is None or value is None:
+                continue
+            key = f"{group}:{kind}:{value}"
+            try:
+                wait = self.store.take(key, *limit)
+            except Exception as exc:
+                logger.warning(f"Rate limit of {group}:{kind} not checked: {exc}")
+                metrics.incr("rate_limit_errors", group=group)
+                continue
+            if wait:
+                metrics.incr("rate_limited", group=group, key=kind)
+                self._refund(group, taken)
+                return wait
+            taken.append((key, limit[0]))
+        return 0.0
+
+    def _refund(self, group: str, taken: list[tuple[str, int]]) -> None:
+        for key, capacity in taken:
+            try:
+                self.store.refund(key, capacity)
+            except Exception as exc:
+                logger.warning(f"Rate limit token of {key} not refunded: {exc}")
+                metrics.incr("rate_limit_errors", group=group)
+
+    def enforce(self, group: str, **keys: object) -> None:
+        """:meth:`check`, raising 429 with Retry-After when over a limit."""
+        wait = self.check(group, **keys)
+        if wait:
+            logger.warning(f"Rate limited {group}: {keys}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_STORES[RATE_LIMIT_BACKEND]())
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address.strip())
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_NETWORKS)
+
+
+def client_ip(request: Request) -> str | None:
+    """The client's address, seen through the TRUSTED_PROXIES.
+
+    X-Forwarded-For is read right to left, from the nearest proxy, and the
+    first address that is not a trusted proxy is the client. Clients can
+    put anything in the header themselves, so it is ignored unless the
+    connection comes from a trusted proxy.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or not _trusted(peer):
+        return peer
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for address in reversed([part.strip() for part in forwarded.split(",")]):
+        if address and not _trusted(address):
+            return address
+    return peer
@@ -0,0 +1,21 @@
+"""Response classes for returning already-built Pydantic models."""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class ModelResponse(JSONResponse):
+    """JSON response that serializes a Pydantic model with pydantic-core.
+
+    Returning a Response from a handler bypasses FastAPI's response_model
+    pass (re-validation, jsonable_encoder, json.dumps), so the model is
+    validated once when it is built and encoded once here, in Rust,
+    honouring serialization aliases.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json(by_alias=True).encode()
+        return super().render(content)
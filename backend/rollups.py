@@ -0,0 +1,158 @@
+"""Per-school daily rollups of the daily sleep surveys.
+
+school_daily_rollups holds one row per (school, day) and is rewritten inside
+a single transaction, so dashboards keep reading the previous rows until the
+refresh commits. A full refresh recomputes every day; the incremental mode
+only recomputes days with a survey changed since the last refresh, plus the
+days of students whose profile (and so possibly school) changed.
+
+Run as a script for a manual refresh:
+
+    python rollups.py [--full]
+"""
+
+import argparse
+import math
+from datetime import timedelta
+
+from sqlalchemy import Float, Numeric, cast, delete, func, select, union
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from analytics import time_to_minutes_expression
+from config import SYNC_CURSOR_SETTLE_SECONDS
+from database import SessionLocal
+from logging_config import get_logger
+from models import DailySleepSurvey, SchoolDailyRollup, User
+from streaming_stats import MINUTES_PER_DAY
+from sync import row_version
+
+logger = get_logger("rollups")
+
+
+def circular_mean_minutes(minutes):
+    """Mean time of day of a minutes-from-midnight column, as an aggregate.
+
+    The mean direction of the times on a 24h circle, so 23:30 and 00:30
+    average to midnight rather than noon (see streaming_stats.ClockTimeStats).
+    """
+    angle = minutes * (2 * math.pi / MINUTES_PER_DAY)
+    mean_angle = func.atan2(func.avg(func.sin(angle)), func.avg(func.cos(angle)))
+    mean = mean_angle * (MINUTES_PER_DAY / (2 * math.pi)) + MINUTES_PER_DAY
+    # Rounded before wrapping, like ClockTimeStats, so midnight is 0 not 1440
+    return func.mod(func.round(cast(mean, Numeric), 2), MINUTES_PER_DAY)
+
+
+# Rollup column -> aggregate over the day's surveys
+ROLLUP_METRICS = {
+    "mean_sleep_duration": func.avg(cast(DailySleepSurvey.horas_que_dormiste, Float)),
+    "mean_bedtime": circular_mean_minutes(
+        time_to_minutes_expression(DailySleepSurvey.hora_deitaste_ontem)
+    ),
+    "mean_wake_time": circular_mean_minutes(
+        time_to_minutes_expression(DailySleepSurvey.hora_levantaste_hoje)
+    ),
+    "mean_sleep_quality": func.avg(cast(DailySleepSurvey.qualidade_sono_noite, Float)),
+}
+
+
+def touched_days(since):
+    """Survey dates whose rollups may have changed after ``since``."""
+    changed_surveys = select(DailySleepSurvey.survey_date).where(
+        row_version(DailySleepSurvey) > since
+    )
+    moved_students = (
+        select(DailySleepSurvey.survey_date)
+        .join(User, User.id == DailySleepSurvey.user_id)
+        .where(User.updated_at > since)
+    )
+    return union(changed_surveys, moved_students).subquery()
+
+
+def refresh_school_daily_rollups(db: Session, full: bool = False) -> int | None:
+    """Recompute rollup rows, returning how many were written.
+
+    Returns None without doing anything when another process holds the
+    refresh lock (several workers run the scheduler).
+    """
+    locked = db.scalar(
+        select(func.pg_try_advisory_xact_lock(func.hashtext("school_daily_rollups")))
+    )
+    if not locked:
+        db.rollback()
+        return None
+
+    since = None
+    if not full:
+        since = db.scalar(select(func.max(SchoolDailyRollup.source_changed_at)))
+        if since is not None:
+            since -= timedelta(seconds=SYNC_CURSOR_SETTLE_SECONDS)
+
+    query = (
+        select(
+            User.school,
+            DailySleepSurvey.survey_date,
+            func.count().label("students"),
+            *(expression.label(name) for name, expression in ROLLUP_METRICS.items()),
+            # A profile update may move the student to another school
+            func.max(
+                func.greatest(row_version(DailySleepSurvey), User.updated_at)
+            ).label("source_changed_at"),
+        )
+        .join(User, User.id == DailySleepSurvey.user_id)
+        .group_by(User.school, DailySleepSurvey.survey_date)
+    )
+    stale = delete(SchoolDailyRollup)
+    if since is not None:
+        days = touched_days(since)
+        query = query.where(
+            DailySleepSurvey.survey_date.in_(select(days.c.survey_date))
+        )
+        stale = stale.where(
+            SchoolDailyRollup.survey_date.in_(select(days.c.survey_date))
+        )
+
+    columns = [column.name for column in query.selected_columns]
+    statement = insert(SchoolDailyRollup).from_select(columns, query)
+    statement = statement.on_conflict_do_update(
+        index_elements=["school", "survey_date"],
+        set_={
+            **{
+                name: statement.excluded[name]
+                for name in columns
+                if name not in ("school", "survey_date")
+            },
+            "refreshed_at": func.now(),
+        },
+    )
+    written = db.execute(statement).rowcount
+    # Rows of the recomputed days not written above (e.g. a school that no
+    # longer has entries) are gone; now() is the transaction start time
+    db.execute(
+        stale.where(SchoolDailyRollup.refreshed_at < func.now()),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+
+    mode = "full" if since is None else f"since {since.isoformat()}"
+    logger.info(f"School daily rollups refreshed ({mode}): {written} rows")
+    return written
+
+
+def refresh_rollups_job() -> None:
+    """Scheduler entry point: incremental refresh in its own session."""
+    with SessionLocal() as db:
+        refresh_school_daily_rollups(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="recompute every day")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        written = refresh_school_daily_rollups(db, full=args.full)
+    if written is None:
+        print("Another refresh is running")
+    else:
+        print(f"Wrote {written} rollup rows")
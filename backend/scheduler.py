@@ -0,0 +1,55 @@
+"""Periodic background jobs run inside the application process."""
+
+import asyncio
+import time
+from collections.abc import Callable
+
+from logging_config import get_logger
+from metrics import metrics
+
+logger = get_logger("scheduler")
+
+
+class Scheduler:
+    """Runs blocking jobs at fixed intervals on worker threads.
+
+    A job runs once at startup and then every ``interval`` seconds after the
+    previous run finished, so slow runs never overlap. Failures are logged
+    and retried at the next interval.
+    """
+
+    def __init__(self):
+        self._jobs: dict[str, tuple[float, Callable[[], object]]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, job: Callable[[], object]) -> None:
+        """Register a job; an interval of 0 or less disables it."""
+        if interval > 0:
+            self._jobs[name] = (interval, job)
+
+    async def _run(self, name: str, interval: float, job: Callable[[], object]):
+        while True:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(job)
+            except Exception:
+                metrics.incr("scheduler_failures", job=name)
+                logger.exception(f"Scheduled job {name} failed")
+            metrics.observe(
+                "scheduler_run_seconds", time.perf_counter() - started, job=name
+            )
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        for name, (interval, job) in self._jobs.items():
+            logger.info(f"Scheduling {name} every {interval}s")
+            self._tasks.append(asyncio.create_task(self._run(name, interval, job)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+scheduler = Scheduler()
@@ -1,7 +1,7 @@
 from datetime import date, datetime, time
-from enum import Enum
+from enum import Enum, StrEnum
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_serializer
 
 
 class GenderEnum(str, Enum):
@@ -44,14 +44,46 @@ class UserLogin(BaseModel):
 
 
 class MeanMetrics(BaseModel):
+    # Latest N surveys, or last N days with DAILY_WINDOW_MODE=calendar
     last_7_days: float | None = Field(serialization_alias="last7Days")
     last_15_days: float | None = Field(serialization_alias="last15Days")
     last_30_days: float | None = Field(serialization_alias="last30Days")
 
 
+class WindowStats(BaseModel):
+    n: int
+    mean: float | None  # circular mean for bedtimes
+    std: float | None  # sample std; circular std (minutes) for bedtimes
+    min: float | None
+    max: float | None
+    median: float | None  # P² estimate beyond five values
+
+
+class DatesEncodingEnum(StrEnum):
+    LIST = "list"
+    BITMAP = "bitmap"
+
+
+class DailyWindowModeEnum(StrEnum):
+    SUBMISSIONS = "submissions"  # latest N surveys
+    CALENDAR = "calendar"  # last N days up to today
+
+
+class DateBitmap(BaseModel):
+    # Day `start + i` is present when bit i is set, see date_encoding.py
+    start: date | None
+    days: int
+    encoding: str  # "bitmap" or "rle"
+    data: str  # base64
+
+
 class DailySurveysInfo(BaseModel):
     target: int
-    dates: list[date]
+    # Exactly one of these is sent, depending on the requested date encoding
+    dates: list[date] | None = None
+    dates_bitmap: DateBitmap | None = Field(
+        default=None, serialization_alias="datesBitmap"
+    )
     mean_sleep_duration: MeanMetrics = Field(serialization_alias="meanSleepDuration")
     mean_wake_time: MeanMetrics = Field(
         serialization_alias="meanWakeTime"
@@ -68,6 +100,29 @@ class DailySurveysInfo(BaseModel):
     mean_sleep_quality: MeanMetrics = Field(
         serialization_alias="meanSleepQuality"
     )  # 0-5 scale
+    # metric -> "last{N}Days" -> stats, for the DAILY_STATS_WINDOWS
+    extended_metrics: dict[str, dict[str, WindowStats]] | None = Field(
+        default=None, serialization_alias="extendedMetrics"
+    )
+
+    @model_serializer(mode="wrap")
+    def _omit_unused_dates(self, handler):
+        data = handler(self)
+        for key in ("dates", "dates_bitmap", "datesBitmap"):
+            if key in data and data[key] is None:
+                del data[key]
+        return data
+
+
+class CohortPercentileRanks(BaseModel):
+    # Percentile (0-100) among students of the same school and year
+    score: float | None = None
+    cleveland_mean: float | None = Field(
+        default=None, serialization_alias="clevelandMean"
+    )
+    mean_sleep_duration: float | None = Field(
+        default=None, serialization_alias="meanSleepDuration"
+    )
 
 
 class SurveyData(BaseModel):
@@ -79,6 +134,9 @@ class SurveyData(BaseModel):
     cleveland_mean: float | None = Field(
         default=None, serialization_alias="clevelandMean"
     )
+    cohort_percentiles: CohortPercentileRanks | None = Field(
+        default=None, serialization_alias="cohortPercentiles"
+    )
 
 
 # Kind of an hack
@@ -229,7 +287,7 @@ class SleepSurveyResponse(BaseModel):
     )
     varios_tipos_sono_noite: bool = Field(serialization_alias="variosTiposSonoNoite")
     survey_date: date = Field(serialization_alias="surveyDate")
-    created_at: date = Field(serialization_alias="createdAt")
+    created_at: datetime = Field(serialization_alias="createdAt")
 
     class Config:
         from_attributes = True
@@ -276,6 +334,28 @@ class DailySleepSurveyResponse(BaseModel):
         from_attributes = True
 
 
+class DailySleepSurveyRow(BaseModel):
+    survey_date: date = Field(serialization_alias="surveyDate")
+    hora_levantaste_hoje: time = Field(serialization_alias="horaLevantasteHoje")
+    hora_deitaste_ontem: time = Field(serialization_alias="horaDeitasteOntem")
+    tempo_ate_adormecer: int = Field(serialization_alias="tempoAteAdormecer")
+    vezes_acordaste_noite: int = Field(serialization_alias="vezesAcordasteNoite")
+    horas_que_dormiste: int = Field(serialization_alias="horasQueDormiste")
+    qualidade_sono_noite: int = Field(serialization_alias="qualidadeSonoNoite")
+    observacao_noite_passada: str | None = Field(
+        default=None, serialization_alias="observacaoNoitePassada"
+    )
+
+    class Config:
+        from_attributes = True
+
+
+class DailySleepSurveyPage(BaseModel):
+    items: list[DailySleepSurveyRow]
+    # Keyset cursor: pass as `after` to fetch the next page, None when exhausted
+    next_after: date | None = Field(default=None, serialization_alias="nextAfter")
+
+
 class ClevelandSurveyCreate(BaseModel):
     adormeco_durante_aulas_manha: int = Field(
         alias="adormecoduranteAulasManha", ge=0, le=5
@@ -412,6 +492,112 @@ class MySleepSurveyResponse(BaseModel):
         from_attributes = True
 
 
+class SyncResponse(BaseModel):
+    # Opaque cursor to send back on the next sync
+    cursor: str
+    sleep_surveys: list[SleepSurveyResponse] = Field(serialization_alias="sleepSurveys")
+    daily_surveys: list[DailySleepSurveyResponse] = Field(
+        serialization_alias="dailySurveys"
+    )
+    cleveland_surveys: list[ClevelandSurveyResponse] = Field(
+        serialization_alias="clevelandSurveys"
+    )
+    my_sleep_surveys: list[MySleepSurveyResponse] = Field(
+        serialization_alias="mySleepSurveys"
+    )
+
+
+class CohortDimensionEnum(StrEnum):
+    SCHOOL = "school"
+    SCHOOL_YEAR = "school_year"
+    GENDER = "gender"
+
+
+class MetricDistribution(BaseModel):
+    n: int
+    mean: float | None = None
+    median: float | None = None
+    p10: float | None = None
+    p90: float | None = None
+
+
+class CohortKey(BaseModel):
+    school: str | None = None
+    school_year: int | None = Field(default=None, serialization_alias="schoolYear")
+    gender: GenderEnum | None = None
+
+
+class CohortGroup(CohortKey):
+    # quizScore, clevelandScore and the six daily means
+    metrics: dict[str, MetricDistribution]
+
+
+class CohortAnalyticsResponse(BaseModel):
+    group_by: list[CohortDimensionEnum] = Field(serialization_alias="groupBy")
+    groups: list[CohortGroup]
+
+
+class QuizItemStats(BaseModel):
+    question: int
+    field: str
+    pct_correct: float | None = Field(serialization_alias="pctCorrect")
+    # First vs last quiz of students who answered it more than once
+    pre_pct_correct: float | None = Field(serialization_alias="prePctCorrect")
+    post_pct_correct: float | None = Field(serialization_alias="postPctCorrect")
+    change: float | None = None
+
+
+class QuizItemGroup(CohortKey):
+    responses: int
+    paired_students: int = Field(serialization_alias="pairedStudents")
+    items: list[QuizItemStats]
+
+
+class QuizItemAnalysisResponse(BaseModel):
+    group_by: list[CohortDimensionEnum] = Field(serialization_alias="groupBy")
+    groups: list[QuizItemGroup]
+
+
+class InstrumentEffect(BaseModel):
+    # Students with both a first and a later survey
+    n: int
+    mean_pre: float | None = Field(serialization_alias="meanPre")
+    mean_post: float | None = Field(serialization_alias="meanPost")
+    mean_change: float | None = Field(serialization_alias="meanChange")
+    sd_change: float | None = Field(serialization_alias="sdChange")
+    effect_size: float | None = Field(serialization_alias="effectSize")
+    pct_improved: float | None = Field(serialization_alias="pctImproved")
+
+
+class ProgressGroup(CohortKey):
+    students: int
+    # quiz, cleveland and mySleep
+    effects: dict[str, InstrumentEffect]
+
+
+class ProgressReportResponse(BaseModel):
+    group_by: list[CohortDimensionEnum] = Field(serialization_alias="groupBy")
+    groups: list[ProgressGroup]
+
+
+class ProgressRefreshResponse(BaseModel):
+    full: bool
+    updated_students: int = Field(serialization_alias="updatedStudents")
+
+
+class SchoolDailyRollupRow(BaseModel):
+    school: str
+    survey_date: date = Field(serialization_alias="surveyDate")
+    students: int
+    mean_sleep_duration: float | None = Field(serialization_alias="meanSleepDuration")
+    mean_bedtime: float | None = Field(serialization_alias="meanBedtime")
+    mean_wake_time: float | None = Field(serialization_alias="meanWakeTime")
+    mean_sleep_quality: float | None = Field(serialization_alias="meanSleepQuality")
+
+    class Config:
+        from_attributes = True
+
+
 class Token(BaseModel):
     access_token: str = Field(serialization_alias="accessToken")
     token_type: str = Field(serialization_alias="tokenType")
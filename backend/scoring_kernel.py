@@ -0,0 +1,134 @@
+"""Vectorized scoring and statistics over columnar survey data.
+
+Batch counterparts of calculate_score_from_survey,
+ClevelandSurvey.cleveland_score, calculate_daily_survey_means and
+calculate_my_sleep_survey_means, for exports, cohort reports and backfills
+that handle thousands of users at once.
+
+Inputs are 2-D float arrays with one row per survey and one column per field,
+usually built by ``fetch_columns`` straight from cursor rows. NULLs become
+NaN, so ``missing_mask`` is simply ``np.isnan``. Per-user functions expect
+rows grouped by user, most recent survey first within each user, which is
+what ``ORDER BY user_id, survey_date DESC`` returns.
+"""
+
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from models import ClevelandSurvey
+from sleep_survey_answer_key import SLEEP_SURVEY_ANSWER_KEY
+
+QUIZ_FIELDS = tuple(SLEEP_SURVEY_ANSWER_KEY)
+CLEVELAND_FIELDS = ClevelandSurvey.SCORE_ITEMS
+MY_SLEEP_FIELDS = (
+    "durmo_mal_ou_bem",
+    "gosto_de_dormir",
+    "acho_sono_importante_para_mim",
+    "o_que_sei_sobre_sono",
+)
+# Same order as the fields_config of calculate_daily_survey_means
+DAILY_FIELDS = (
+    "horas_que_dormiste",
+    "hora_levantaste_hoje",
+    "hora_deitaste_ontem",
+    "tempo_ate_adormecer",
+    "vezes_acordaste_noite",
+    "qualidade_sono_noite",
+)
+DAILY_TIME_FIELDS = frozenset({"hora_levantaste_hoje", "hora_deitaste_ontem"})
+
+_QUIZ_KEY = np.array([SLEEP_SURVEY_ANSWER_KEY[f] for f in QUIZ_FIELDS], dtype=float)
+
+# cleveland_score as a dot product: reverse-scored items count as MAX - answer
+_CLEVELAND_SIGNS = np.array(
+    [
+        -1.0 if item in ClevelandSurvey.REVERSE_SCORED_ITEMS else 1.0
+        for item in CLEVELAND_FIELDS
+    ]
+)
+_CLEVELAND_OFFSET = ClevelandSurvey.MAX_ITEM_SCORE * float(
+    len(ClevelandSurvey.REVERSE_SCORED_ITEMS)
+)
+
+
+def columns(rows: Iterable[Sequence]) -> np.ndarray:
+    """2-D float array from row tuples; None becomes NaN, booleans 0/1."""
+    return np.array(list(rows), dtype=np.float64, ndmin=2)
+
+
+def fetch_columns(db: Session, statement: Select) -> tuple[np.ndarray, np.ndarray]:
+    """Run ``statement`` selecting (user_id, field, ...) into (user_ids, values).
+
+    Time columns should be selected as minutes (analytics.
+    time_to_minutes_expression) so they arrive as numbers.
+    """
+    rows = db.execute(statement).all()
+    data = columns(rows) if rows else np.empty((0, len(statement.selected_columns)))
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def time_minutes(values: Iterable) -> np.ndarray:
+    """Minutes from midnight of datetime.time values (None -> NaN)."""
+    return np.fromiter(
+        (np.nan if t is None else t.hour * 60 + t.minute for t in values),
+        dtype=np.float64,
+    )
+
+
+def missing_mask(values: np.ndarray) -> np.ndarray:
+    return np.isnan(values)
+
+
+def quiz_scores(answers: np.ndarray) -> np.ndarray:
+    """Correct answers per row of QUIZ_FIELDS columns; missing counts as wrong."""
+    return (answers == _QUIZ_KEY).sum(axis=1)
+
+
+def cleveland_scores(items: np.ndarray) -> np.ndarray:
+    """Cleveland score per row of CLEVELAND_FIELDS columns, NaN if any is missing."""
+    return items @ _CLEVELAND_SIGNS + _CLEVELAND_OFFSET
+
+
+def group_starts(user_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct user ids of grouped rows and the row index where each starts."""
+    user_ids = np.asarray(user_ids)
+    if len(user_ids) == 0:
+        return user_ids, np.empty(0, dtype=np.intp)
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    return user_ids[starts], starts
+
+
+def windowed_means(
+    user_ids: np.ndarray,
+    values: np.ndarray,
+    windows: Sequence[int | None] = (7, 15, 30),
+) -> tuple[np.ndarray, dict[int | None, np.ndarray]]:
+    """Per-user column means over each user's latest ``window`` rows.
+
+    A window of None covers all rows. Missing values are skipped like the
+    per-field loops do; a user with no value in a window gets NaN.
+
+    Returns the distinct user ids and, per window, a (users, fields) array.
+    """
+    users, starts = group_starts(user_ids)
+    if len(users) == 0:
+        return users, {window: np.empty((0, values.shape[1])) for window in windows}
+
+    sizes = np.diff(np.r_[starts, len(values)])
+    position = np.arange(len(values)) - np.repeat(starts, sizes)
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    means = {}
+    for window in windows:
+        in_window = present
+        if window is not None:
+            in_window = present & (position < window)[:, None]
+        sums = np.add.reduceat(np.where(in_window, filled, 0.0), starts, axis=0)
+        counts = np.add.reduceat(in_window, starts, axis=0, dtype=np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[window] = sums / counts
+    return users, means
@@ -0,0 +1,51 @@
+"""Single-flight execution: concurrent identical computations run once.
+
+While a computation for a key is running, callers asking for the same key
+wait for it and share its result (or exception) instead of starting their
+own. Nothing is kept once it finishes. A caller may still get a result of a
+computation that started shortly before it asked, so keys should include a
+data version wherever a result must reflect the latest writes.
+"""
+
+import threading
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from typing import TypeVar
+
+from metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls of :meth:`do` with equal keys."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Return ``compute()``, or the result of the running call for ``key``."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.incr("single_flight_coalesced", flight=self.name)
+            return future.result()
+
+        metrics.incr("single_flight_computed", flight=self.name)
+        try:
+            result = compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
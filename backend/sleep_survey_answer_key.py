@@ -2,6 +2,8 @@
 # Maps database field names to correct answers (True/False)
 # Based on the provided answer sequence: v,f,f,v,f,f,f,f,v,v,v,f,v,f,f,v,f,v,v,v
 
+from sqlalchemy import case, literal
+
 SLEEP_SURVEY_ANSWER_KEY = {
     # Question 1: Quando se dorme pouco, fica-se mais agressivo e irritadiço
     "dormir_pouco_agressivo_irritadico": True,
@@ -64,3 +66,32 @@ def calculate_score_from_survey(survey_result) -> int:
             score += 1
 
     return score
+
+
+def correct_answer_expressions(model) -> dict:
+    """
+    Per-question SQL expressions, 1 when the answer is correct and 0 otherwise.
+
+    Args:
+        model: SleepSurvey model class (or an alias of it)
+
+    Returns:
+        Dict mapping field names to integer column expressions
+    """
+    return {
+        field_name: case((getattr(model, field_name) == correct_answer, 1), else_=0)
+        for field_name, correct_answer in SLEEP_SURVEY_ANSWER_KEY.items()
+    }
+
+
+def score_expression(model):
+    """
+    SQL expression equivalent to calculate_score_from_survey, for aggregates.
+
+    Args:
+        model: SleepSurvey model class (or an alias of it)
+
+    Returns:
+        Column expression counting correct answers (0-20)
+    """
+    return sum(correct_answer_expressions(model).values(), start=literal(0))
@@ -0,0 +1,215 @@
+"""Static serving of the built frontend (frontend/dist) from the backend.
+
+At build or startup time every compressible file gets ``.br`` / ``.gz``
+siblings, so requests never compress on the fly. At startup the dist tree
+is indexed once (stat, content hash ETag, variants), and requests are
+answered from that index:
+
+- hashed files under ``assets/`` are sent with ``Cache-Control: immutable``;
+- ``index.html`` is revalidated on every navigation (``no-cache`` + ETag);
+- unknown paths that ask for HTML fall back to ``index.html`` (SPA routes);
+- ``.br`` / ``.gz`` variants carry the ETag of their encoding (http_cache).
+
+Range requests are handled by Starlette's FileResponse on the identity
+encoding. When the server advertises the ASGI ``http.response.pathsend``
+extension the file is handed to it to be sent with sendfile.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import brotli
+from fastapi import Request, Response
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from compression import BROTLI, GZIP, is_compressible, negotiate_encoding
+from config import COMPRESSION_MIN_SIZE, FRONTEND_DIST_DIR
+from http_cache import encoded_etag, etag_matches, not_modified
+from logging_config import get_logger
+
+logger = get_logger("static")
+
+INDEX_FILE = "index.html"
+IMMUTABLE_PREFIX = "assets/"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+VARIANT_SUFFIXES = {BROTLI: ".br", GZIP: ".gz"}
+
+
+def _media_type(path: Path) -> str:
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def _is_variant(path: Path) -> bool:
+    return path.suffix in VARIANT_SUFFIXES.values()
+
+
+def precompress_directory(root: Path) -> int:
+    """Write .br/.gz siblings for compressible files, skipping up-to-date ones.
+
+    Returns the number of variant files written.
+    """
+    written = 0
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or _is_variant(path):
+            continue
+        if not is_compressible(_media_type(path)):
+            continue
+        stat = path.stat()
+        if stat.st_size < COMPRESSION_MIN_SIZE:
+            continue
+
+        data = None
+        for encoding, suffix in VARIANT_SUFFIXES.items():
+            variant = path.with_name(path.name + suffix)
+            if variant.exists() and variant.stat().st_mtime >= stat.st_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            if encoding == BROTLI:
+                compressed = brotli.compress(data, quality=11)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            # Only keep variants that actually save bytes
+            if len(compressed) < len(data):
+                variant.write_bytes(compressed)
+                written += 1
+    return written
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    stat: os.stat_result
+    media_type: str
+    etag: str
+    cache_control: str
+    variants: dict[str, tuple[Path, os.stat_result]] = field(default_factory=dict)
+
+
+class SendfileFileResponse(FileResponse):
+    """FileResponse that hands whole-file sends to the server when it can."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        request_headers = dict(scope.get("headers") or [])
+        if (
+            "http.response.pathsend" not in extensions
+            or b"range" in request_headers
+            or scope["method"].upper() == "HEAD"
+        ):
+            await super().__call__(scope, receive, send)
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await send({"type": "http.response.pathsend", "path": str(self.path)})
+
+
+class StaticFrontend:
+    """Index of the dist directory and the responses built from it."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: dict[str, StaticAsset] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return INDEX_FILE in self.assets
+
+    def load(self) -> None:
+        """Precompress (when writable) and index the dist directory."""
+        if not (self.root / INDEX_FILE).is_file():
+            logger.info(f"No frontend build at {self.root}, static serving disabled")
+            return
+
+        try:
+            written = precompress_directory(self.root)
+            if written:
+                logger.info(f"Precompressed {written} frontend variants")
+        except OSError as e:
+            # Read-only image without build-time variants: serve identity
+            logger.warning(f"Could not precompress frontend files: {e}")
+
+        assets = {}
+        for path in self.root.rglob("*"):
+            if not path.is_file() or _is_variant(path):
+                continue
+            relative = path.relative_to(self.root).as_posix()
+            stat = path.stat()
+            digest = hashlib.sha1(path.read_bytes()).hexdigest()
+            if relative == INDEX_FILE:
+                cache_control = REVALIDATE_CACHE_CONTROL
+            elif relative.startswith(IMMUTABLE_PREFIX):
+                cache_control = IMMUTABLE_CACHE_CONTROL
+            else:
+                cache_control = DEFAULT_CACHE_CONTROL
+            asset = StaticAsset(
+                path=path,
+                stat=stat,
+                media_type=_media_type(path),
+                etag=f'"{digest}"',
+                cache_control=cache_control,
+            )
+            for encoding, suffix in VARIANT_SUFFIXES.items():
+                variant = path.with_name(path.name + suffix)
+                if variant.is_file():
+                    asset.variants[encoding] = (variant, variant.stat())
+            assets[relative] = asset
+
+        self.assets = assets
+        logger.info(f"Serving {len(assets)} frontend files from {self.root}")
+
+    def lookup(self, relative_path: str, spa_fallback: bool) -> StaticAsset | None:
+        asset = self.assets.get(relative_path.lstrip("/"))
+        if asset is None and spa_fallback:
+            asset = self.assets.get(INDEX_FILE)
+        return asset
+
+    def response(self, request: Request, asset: StaticAsset) -> Response:
+        if etag_matches(request, asset.etag):
+            response = not_modified(asset.etag, request=request)
+            response.headers["Cache-Control"] = asset.cache_control
+            return response
+
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        path, stat = asset.path, asset.stat
+        # Byte ranges are served from the identity file only
+        encoding = None
+        if "range" not in request.headers:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding in asset.variants:
+            path, stat = asset.variants[encoding]
+            headers["ETag"] = encoded_etag(asset.etag, encoding)
+            headers["Content-Encoding"] = encoding
+
+        return SendfileFileResponse(
+            path, headers=headers, media_type=asset.media_type, stat_result=stat
+        )
+
+
+static_frontend = StaticFrontend(FRONTEND_DIST_DIR)
+
+
+if __name__ == "__main__":
+    # Build-time precompression: python static_files.py [dist_dir]
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else FRONTEND_DIST_DIR
+    print(f"Wrote {precompress_directory(target)} variants under {target}")
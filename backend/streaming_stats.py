@@ -0,0 +1,255 @@
+"""Single-pass statistics over a student's daily surveys.
+
+Every field is pushed once into one accumulator per window (the latest N
+entries), so the mean, variance, min, max and a median estimate for all
+windows come out of a single scan of the sorted rows. Bedtimes wrap past
+midnight and get circular statistics.
+"""
+
+import math
+from bisect import insort
+from collections.abc import Callable, Iterable, Sequence
+from statistics import median
+
+MINUTES_PER_DAY = 1440
+# Bedtimes are anchored at noon, so 23:30 and 00:30 are an hour apart
+BEDTIME_ANCHOR = 720
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+class P2Median:
+    """Streaming median estimate with five markers (Jain & Chlamtac's P²).
+
+    Exact up to five values, constant memory afterwards.
+    """
+
+    __slots__ = ("heights", "positions", "desired")
+
+    INCREMENTS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+    def __init__(self):
+        self.heights: list[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+    def add(self, x: float) -> None:
+        q, n = self.heights, self.positions
+        if len(q) < 5:
+            insort(q, x)
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.INCREMENTS[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < candidate < q[i + 1]:
+                    # Parabolic step would break ordering, move linearly
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (
+                        n[i + step] - n[i]
+                    )
+                q[i] = candidate
+                n[i] += step
+
+    @property
+    def value(self) -> float | None:
+        if not self.heights:
+            return None
+        if len(self.heights) < 5 or self.positions[4] == 5:
+            return median(self.heights)
+        return self.heights[2]
+
+
+class RunningStats:
+    """Welford mean/variance with min, max and a P² median.
+
+    The mean is reported as total / n so it matches a plain average exactly.
+    """
+
+    __slots__ = ("n", "total", "_mean", "_m2", "min", "max", "_median")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min: float | None = None
+        self.max: float | None = None
+        self._median = P2Median()
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        self.total += x
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (x - self._mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self._median.add(x)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.n if self.n else None
+
+    @property
+    def std(self) -> float | None:
+        # Sample standard deviation
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else None
+
+    @property
+    def median(self) -> float | None:
+        return self._median.value
+
+    def summary(self) -> dict[str, float | None]:
+        return {
+            "n": self.n,
+            "mean": _round(self.mean),
+            "std": _round(self.std),
+            "min": _round(self.min),
+            "max": _round(self.max),
+            "median": _round(self.median),
+        }
+
+
+class ClockTimeStats:
+    """Times of day in minutes from midnight, which may wrap past midnight.
+
+    The mean and spread are circular (mean direction and circular standard
+    deviation, in minutes). Min, max and median are taken on times anchored
+    at ``anchor`` and reported back as times of day.
+    """
+
+    __slots__ = ("anchor", "_sin", "_cos", "clock", "total")
+
+    def __init__(self, anchor: int = BEDTIME_ANCHOR):
+        self.anchor = anchor
+        self._sin = 0.0
+        self._cos = 0.0
+        self.clock = RunningStats()
+        self.total = 0.0
+
+    @property
+    def n(self) -> int:
+        return self.clock.n
+
+    def add(self, minutes: float) -> None:
+        angle = 2 * math.pi * minutes / MINUTES_PER_DAY
+        self._sin += math.sin(angle)
+        self._cos += math.cos(angle)
+        self.total += minutes
+        self.clock.add((minutes - self.anchor) % MINUTES_PER_DAY + self.anchor)
+
+    @property
+    def mean(self) -> float | None:
+        # Arithmetic mean of minutes from midnight, as MeanMetrics reports it
+        return self.total / self.n if self.n else None
+
+    def _to_clock(self, value: float | None) -> float | None:
+        # Round first, so 23:59.999 reads 0 rather than 1440
+        return round(value, 2) % MINUTES_PER_DAY if value is not None else None
+
+    def summary(self) -> dict[str, float | None]:
+        if not self.n:
+            return RunningStats().summary()
+        angle = math.atan2(self._sin / self.n, self._cos / self.n)
+        resultant = math.hypot(self._sin, self._cos) / self.n
+        spread = math.sqrt(-2 * math.log(resultant)) if 0 < resultant < 1 else 0.0
+        scale = MINUTES_PER_DAY / (2 * math.pi)
+        return {
+            "n": self.n,
+            "mean": self._to_clock(angle * scale),
+            "std": _round(spread * scale) if resultant > 0 else None,
+            "min": self._to_clock(self.clock.min),
+            "max": self._to_clock(self.clock.max),
+            "median": self._to_clock(self.clock.median),
+        }
+
+
+def window_stats(
+    rows: Iterable,
+    fields: dict[str, tuple[Callable[[object], float | None], Callable[[], object]]],
+    windows: Sequence[int],
+    age: Callable[[object], int] | None = None,
+) -> dict[str, dict[int, object]]:
+    """Accumulate ``fields`` over the rows of each window, in one pass.
+
+    ``fields`` maps a name to (value getter, accumulator factory). A row is
+    in a window when its age is below it: its position by default (latest N
+    rows), or ``age(row)``, e.g. days before today. Rows must come most
+    recent first; None values are skipped.
+    """
+    windows = sorted(set(windows))
+    accumulators = {
+        name: {window: factory() for window in windows}
+        for name, (_, factory) in fields.items()
+    }
+    for index, row in enumerate(rows):
+        row_age = index if age is None else age(row)
+        active = [window for window in windows if row_age < window]
+        if not active:
+            break
+        for name, (getter, _) in fields.items():
+            value = getter(row)
+            if value is None:
+                continue
+            for window in active:
+                accumulators[name][window].add(value)
+    return accumulators
+
+
+def _minutes(value) -> int | None:
+    return value.hour * 60 + value.minute if value is not None else None
+
+
+def _attribute(field: str, converter=None):
+    if converter is None:
+        return lambda survey: getattr(survey, field)
+    return lambda survey: converter(getattr(survey, field))
+
+
+# DailySleepSurvey field -> (value getter, accumulator factory)
+DAILY_SURVEY_FIELDS = {
+    "horas_que_dormiste": (_attribute("horas_que_dormiste"), RunningStats),
+    "hora_levantaste_hoje": (
+        _attribute("hora_levantaste_hoje", _minutes),
+        RunningStats,
+    ),
+    "hora_deitaste_ontem": (
+        _attribute("hora_deitaste_ontem", _minutes),
+        ClockTimeStats,
+    ),
+    "tempo_ate_adormecer": (_attribute("tempo_ate_adormecer"), RunningStats),
+    "vezes_acordaste_noite": (_attribute("vezes_acordaste_noite"), RunningStats),
+    "qualidade_sono_noite": (_attribute("qualidade_sono_noite"), RunningStats),
+}
+
+
+def daily_survey_stats(
+    surveys: Iterable,
+    windows: Sequence[int],
+    age: Callable[[object], int] | None = None,
+) -> dict[str, dict[int, RunningStats | ClockTimeStats]]:
+    """Per DailySleepSurvey field and window, the accumulated statistics.
+
+    ``surveys`` must be sorted most recent first; see window_stats for ``age``.
+    """
+    return window_stats(surveys, DAILY_SURVEY_FIELDS, windows, age)
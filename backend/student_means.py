@@ -0,0 +1,143 @@
+"""Per-student means of the daily surveys, for cohort distributions.
+
+student_daily_means holds one row per student with the mean of each daily
+metric over all their entries, so cohort_distributions reads one row per
+student instead of aggregating every daily survey on each request. Survey
+writes queue a refresh of their student; ``refresh_student_means_job`` runs
+the incremental refresh on a schedule, recomputing the students with an
+entry changed since the watermark in refresh_watermarks.
+
+Run as a script for a manual refresh:
+
+    python student_means.py [--full]
+"""
+
+import argparse
+from datetime import timedelta
+
+from sqlalchemy import Float, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from analytics import DAILY_METRIC_EXPRESSIONS, STUDENT_MEAN_COLUMNS
+from config import SYNC_CURSOR_SETTLE_SECONDS
+from database import SessionLocal
+from logging_config import get_logger
+from models import DailySleepSurvey, RefreshWatermark, StudentDailyMeans
+from sync import row_version
+
+logger = get_logger("student_means")
+
+WATERMARK = StudentDailyMeans.__tablename__
+
+
+def refresh_student_means(
+    db: Session, full: bool = False, user_ids: list[int] | None = None
+) -> int | None:
+    """Recompute student_daily_means rows, returning how many were written.
+
+    Works like refresh_student_progress: incremental runs start at the
+    watermark minus the sync settle window, runs for ``user_ids`` leave it
+    alone, and incremental and full runs return None while another one
+    holds the refresh lock. Students left without entries lose their row
+    when they are recomputed by id, and in full runs.
+    """
+    since = None
+    if user_ids is None:
+        locked = db.scalar(
+            select(func.pg_try_advisory_xact_lock(func.hashtext(WATERMARK)))
+        )
+        if not locked:
+            db.rollback()
+            return None
+        if not full:
+            since = db.scalar(
+                select(RefreshWatermark.changed_at).where(
+                    RefreshWatermark.name == WATERMARK
+                )
+            )
+            if since is not None:
+                since -= timedelta(seconds=SYNC_CURSOR_SETTLE_SECONDS)
+
+    query = select(
+        DailySleepSurvey.user_id,
+        func.count().label("entries"),
+        *(
+            func.avg(cast(DAILY_METRIC_EXPRESSIONS[metric], Float)).label(column.key)
+            for metric, column in STUDENT_MEAN_COLUMNS.items()
+        ),
+        func.max(row_version(DailySleepSurvey)).label("source_changed_at"),
+    ).group_by(DailySleepSurvey.user_id)
+    stale = None
+    if user_ids is not None:
+        query = query.where(DailySleepSurvey.user_id.in_(user_ids))
+        stale = delete(StudentDailyMeans).where(StudentDailyMeans.user_id.in_(user_ids))
+    elif since is not None:
+        changed = select(DailySleepSurvey.user_id).where(
+            row_version(DailySleepSurvey) > since
+        )
+        query = query.where(DailySleepSurvey.user_id.in_(changed))
+    else:
+        stale = delete(StudentDailyMeans)
+
+    columns = [column.name for column in query.selected_columns]
+    statement = insert(StudentDailyMeans).from_select(columns, query)
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            **{name: statement.excluded[name] for name in columns if name != "user_id"},
+            "refreshed_at": func.now(),
+        },
+    ).returning(StudentDailyMeans.source_changed_at)
+    changed_at = db.scalars(statement).all()
+    if stale is not None:
+        # Rows not written above have no entries left; now() is the
+        # transaction start time
+        db.execute(
+            stale.where(StudentDailyMeans.refreshed_at < func.now()),
+            execution_options={"synchronize_session": False},
+        )
+    if user_ids is None and changed_at:
+        _advance_watermark(db, max(changed_at))
+    db.commit()
+
+    if user_ids is not None:
+        mode = f"users {', '.join(map(str, user_ids))}"
+    else:
+        mode = "full" if since is None else f"since {since.isoformat()}"
+    logger.info(f"Student daily means refreshed ({mode}): {len(changed_at)} students")
+    return len(changed_at)
+
+
+def _advance_watermark(db: Session, changed_at) -> None:
+    statement = insert(RefreshWatermark).values(name=WATERMARK, changed_at=changed_at)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "changed_at": func.greatest(
+                    RefreshWatermark.changed_at, statement.excluded.changed_at
+                ),
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+def refresh_student_means_job() -> None:
+    """Scheduler entry point: incremental refresh in its own session."""
+    with SessionLocal() as db:
+        refresh_student_means(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="recompute everyone")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        written = refresh_student_means(db, full=args.full)
+    if written is None:
+        print("Another refresh is running")
+    else:
+        print(f"Wrote {written} student rows")
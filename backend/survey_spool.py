@@ -0,0 +1,293 @@
+"""Local spool for survey submissions while the database is unavailable.
+
+A survey POST that fails because Postgres can't be reached (connection
+errors, failover, pool or statement timeouts) is not lost: the validated
+submission is appended to a SQLite log at SURVEY_SPOOL_PATH and the client
+gets 202 Accepted. While the log holds entries, later submissions are
+appended behind them without trying the database, so they apply in the
+order they were made and clients don't wait on a database known to be down.
+
+The replay job applies the log oldest first once the database answers
+again. An entry only overwrites a stored row older than the submission, or
+one written earlier in the same replay run, and is deleted after its
+transaction commits, so replaying it again in a later run (after a crash
+between commit and delete) changes nothing. Submission times come from the
+application clock, compared with the database's timestamps.
+
+Entries the database rejects, e.g. because the user was deleted, are moved
+to the ``failed`` table instead of blocking the ones behind them.
+
+The spool is opened at startup, so an unusable SURVEY_SPOOL_PATH stops the
+app there rather than failing submissions. Whether entries are waiting is
+answered from a count kept in memory, recounted by every replay run.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from config import SURVEY_SPOOL_PATH, SURVEY_SPOOL_REPLAY_BATCH
+from database import SessionLocal, router
+from job_queue import enqueue_post_write_jobs
+from logging_config import get_logger
+from metrics import metrics
+from models import ClevelandSurvey, DailySleepSurvey, MySleepSurvey, SleepSurvey
+from schemas import (
+    ClevelandSurveyCreate,
+    DailySleepSurveyCreate,
+    MySleepSurveyCreate,
+    SleepSurveyCreate,
+)
+from write_coalescing import upsert_statement
+
+logger = get_logger("survey_spool")
+
+# The database can't take writes right now, as opposed to rejecting one.
+# TimeoutError is a coalesced write left unanswered
+DATABASE_UNAVAILABLE = (
+    OperationalError,
+    InterfaceError,
+    PoolTimeoutError,
+    TimeoutError,
+)
+
+# Spooled kinds: table name -> (model, schema the payload is validated with)
+SURVEYS = {
+    model.__tablename__: (model, schema)
+    for model, schema in (
+        (SleepSurvey, SleepSurveyCreate),
+        (DailySleepSurvey, DailySleepSurveyCreate),
+        (ClevelandSurvey, ClevelandSurveyCreate),
+        (MySleepSurvey, MySleepSurveyCreate),
+    )
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    spooled_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed (
+    seq INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    spooled_at TEXT NOT NULL,
+    error TEXT NOT NULL,
+    failed_at TEXT NOT NULL
+);
+"""
+
+
+class SurveySpool:
+    """Append-only log of survey submissions in a SQLite file."""
+
+    def __init__(
+        self, path: str = SURVEY_SPOOL_PATH, batch_size: int = SURVEY_SPOOL_REPLAY_BATCH
+    ):
+        self.path = Path(path) if path else None
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._opened = False
+        # Entries in the spool, kept up to date by this process
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def open(self) -> None:
+        """Create the spool file and check it takes writes; raises if not.
+
+        Called at startup, so a spool that can't be written fails the app
+        there instead of every submission made while the database is down.
+        """
+        if not self.enabled:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+            # Takes the write lock, failing on a read-only file
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("ROLLBACK")
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(
+                f"Survey spool {self.path} is not writable: {exc}"
+            ) from exc
+        self._opened = True
+        self.depth()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # An append is on disk before the submission is acknowledged
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")
+            self._local.connection = connection
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        if not self._opened:
+            self.open()
+        return self._connect()
+
+    def pending(self) -> bool:
+        """Whether submissions are waiting, so new ones have to queue behind."""
+        return self.enabled and self._depth > 0
+
+    def depth(self) -> int:
+        """Count the entries, updating the one ``pending`` answers from."""
+        depth = self._connection().execute("SELECT count(*) FROM spool").fetchone()[0]
+        with self._depth_lock:
+            self._depth = depth
+        metrics.set("survey_spool_depth", depth)
+        return depth
+
+    def _count(self, change: int) -> None:
+        with self._depth_lock:
+            self._depth = max(0, self._depth + change)
+            depth = self._depth
+        metrics.set("survey_spool_depth", depth)
+
+    def append(self, model, user_id: int, survey: BaseModel) -> None:
+        self._connection().execute(
+            "INSERT INTO spool (kind, user_id, payload, spooled_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                model.__tablename__,
+                user_id,
+                survey.model_dump_json(by_alias=True),
+                datetime.now(UTC).isoformat(),
+            ),
+        )
+        metrics.incr("survey_spool_appended", table=model.__tablename__)
+        self._count(1)
+
+    def replay(self) -> int:
+        """Apply spooled submissions oldest first, returning how many applied.
+
+        Stops at the first batch the database can't take; it stays spooled
+        for the next run.
+        """
+        # Entries may have been spooled by other processes sharing the file
+        if not self.enabled or not self.depth():
+            return 0
+
+        replayed = 0
+        connection = self._connection()
+        with SessionLocal() as db:
+            try:
+                run_started = db.scalar(select(func.now()))
+            except DATABASE_UNAVAILABLE as exc:
+                logger.warning(f"Survey spool replay deferred: {exc}")
+                return 0
+
+            while True:
+                entries = connection.execute(
+                    "SELECT seq, kind, user_id, payload, spooled_at FROM spool "
+                    "ORDER BY seq LIMIT ?",
+                    (self.batch_size,),
+                ).fetchall()
+                if not entries:
+                    break
+                started = time.perf_counter()
+                try:
+                    failed = self._apply(db, entries, run_started)
+                except DATABASE_UNAVAILABLE as exc:
+                    logger.warning(f"Survey spool replay deferred: {exc}")
+                    break
+                self._remove(entries, failed)
+
+                elapsed = time.perf_counter() - started
+                applied = len(entries) - len(failed)
+                replayed += applied
+                metrics.incr("survey_spool_replayed", applied)
+                metrics.incr("survey_spool_failed", len(failed))
+                metrics.observe("survey_spool_replay_seconds", elapsed)
+                metrics.set("survey_spool_replay_rows_per_second", applied / elapsed)
+
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled survey submissions")
+        self.depth()
+        return replayed
+
+    def _apply(
+        self, db: Session, entries: list[tuple], run_started: datetime
+    ) -> dict[int, str]:
+        """Upsert ``entries`` in one transaction; returns the rejected ones.
+
+        A stored row is overwritten if it is older than the submission or
+        was written by this run, i.e. by an earlier submission of it.
+        """
+        failed = {}
+        for seq, kind, user_id, payload, spooled_at in entries:
+            try:
+                model, schema = SURVEYS[kind]
+                row = schema.model_validate_json(payload).model_dump()
+                row["user_id"] = user_id
+                changed = func.coalesce(model.updated_at, model.created_at)
+                replaceable = or_(
+                    changed < datetime.fromisoformat(spooled_at),
+                    changed >= run_started,
+                )
+                with db.begin_nested():
+                    db.execute(upsert_statement(model, [row], where=replaceable))
+            except DATABASE_UNAVAILABLE:
+                raise
+            except (KeyError, ValidationError, SQLAlchemyError) as exc:
+                logger.error(f"Spooled {kind} submission {seq} rejected: {exc}")
+                failed[seq] = str(exc)
+        db.commit()
+
+        written: dict[str, set[int]] = {}
+        for _, kind, user_id, _, _ in entries:
+            written.setdefault(kind, set()).add(user_id)
+        for kind, user_ids in written.items():
+            # Keep read-your-writes: these users' next reads go to the primary
+            for user_id in user_ids:
+                router.note_write(user_id)
+            enqueue_post_write_jobs(kind, user_ids)
+        return failed
+
+    def _remove(self, entries: list[tuple], failed: dict[int, str]) -> None:
+        connection = self._connection()
+        now = datetime.now(UTC).isoformat()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO failed "
+                "SELECT seq, kind, user_id, payload, spooled_at, ?, ? "
+                "FROM spool WHERE seq = ?",
+                [(error, now, seq) for seq, error in failed.items()],
+            )
+            connection.executemany(
+                "DELETE FROM spool WHERE seq = ?", [(entry[0],) for entry in entries]
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._count(-len(entries))
+
+
+survey_spool = SurveySpool()
+
+
+def replay_survey_spool_job() -> None:
+    """Scheduler entry point: drain the spool if the database is back."""
+    survey_spool.replay()
@@ -0,0 +1,82 @@
+"""Change tracking across the survey tables for delta sync."""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from config import SYNC_CURSOR_SETTLE_SECONDS
+from models import ClevelandSurvey, DailySleepSurvey, MySleepSurvey, SleepSurvey
+
+SURVEY_MODELS = (SleepSurvey, DailySleepSurvey, ClevelandSurvey, MySleepSurvey)
+
+
+def row_version(model):
+    """Last change of a survey row, matching the ix_*_user_changed indexes."""
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+def latest_survey_change(
+    db: Session, user_id: int, models: tuple[type, ...] = SURVEY_MODELS
+) -> tuple[datetime | None, datetime]:
+    """Return the user's most recent survey insert/update and the DB clock.
+
+    One round trip; each subquery is a single descent of the user's
+    change-tracking index.
+    """
+    subqueries = [
+        select(func.max(row_version(model)))
+        .where(model.user_id == user_id)
+        .scalar_subquery()
+        for model in models
+    ]
+    *versions, now = db.execute(select(*subqueries, func.now())).one()
+    present = [version for version in versions if version is not None]
+    return (max(present) if present else None), now
+
+
+def encode_cursor(version: datetime | None) -> str:
+    """Encode a change version as an opaque cursor string."""
+    payload = json.dumps({"v": version.isoformat() if version else None})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> datetime | None:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version = json.loads(base64.urlsafe_b64decode(padded))["v"]
+        return datetime.fromisoformat(version) if version else None
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid sync cursor") from e
+
+
+def next_cursor_version(latest: datetime | None, now: datetime) -> datetime | None:
+    """Pick the version the next cursor should point at.
+
+    Rows stamped within the settle window may still belong to transactions
+    that have not committed yet, so the cursor never moves past
+    ``now - settle``; clients re-receive those rows once and upsert them by
+    survey date.
+    """
+    if latest is None:
+        return None
+    settled = now - timedelta(seconds=SYNC_CURSOR_SETTLE_SECONDS)
+    if latest.tzinfo is None:
+        settled = settled.replace(tzinfo=None)
+    return min(latest, settled)
+
+
+def survey_changes_since(
+    db: Session, user_id: int, since: datetime | None
+) -> dict[type, list]:
+    """Load the user's survey rows changed after ``since`` (all rows if None)."""
+    changes = {}
+    for model in SURVEY_MODELS:
+        query = db.query(model).filter(model.user_id == user_id)
+        if since is not None:
+            query = query.filter(row_version(model) > since)
+        changes[model] = query.order_by(model.survey_date.asc()).all()
+    return changes
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, make_url, text
+
+from models import Base
+
+# Server the tests create their databases on, through its maintenance database
+TEST_DATABASE_URL = os.getenv(
+    "TEST_DATABASE_URL", "postgresql://postgres@localhost/postgres"
+)
+
+
+def _create_database(server, name: str):
+    with server.connect() as connection:
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        connection.execute(text(f'CREATE DATABASE "{name}"'))
+    return create_engine(make_url(TEST_DATABASE_URL).set(database=name))
+
+
+def _drop_databases(server, engines) -> None:
+    for engine in engines:
+        engine.dispose()
+    with server.connect() as connection:
+        for engine in engines:
+            name = engine.url.database
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The TEST_DATABASE_URL server, skipping the test when there is none."""
+    server = create_engine(TEST_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    try:
+        server.connect().close()
+    except Exception as exc:
+        pytest.skip(f"No database server at TEST_DATABASE_URL: {exc}")
+    yield server
+    server.dispose()
+
+
+@pytest.fixture(scope="session")
+def databases(server):
+    """Engines of two empty local databases, standing in for primary and replica."""
+    names = ["prosono_test_primary", "prosono_test_replica"]
+    engines = [_create_database(server, name) for name in names]
+    for engine in engines:
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE notes (user_id integer NOT NULL, body text NOT NULL)"
+                )
+            )
+    yield engines
+    _drop_databases(server, engines)
+
+
+@pytest.fixture(scope="session")
+def app_database(server):
+    """Engine of a database with the app's tables, with no survey partitions yet."""
+    engine = _create_database(server, "prosono_test_app")
+    Base.metadata.create_all(engine)
+    yield engine
+    _drop_databases(server, [engine])
@@ -0,0 +1,158 @@
+import asyncio
+
+from admission import AdmissionMiddleware
+
+WRITE = ("POST", "/daily-surveys")
+
+
+class StubApp:
+    """Holds each request until the test releases it, recording the start order."""
+
+    def __init__(self):
+        self.started: list[str] = []
+        self.gates: dict[str, asyncio.Event] = {}
+
+    def finish(self, request_id: str) -> None:
+        self.gates.setdefault(request_id, asyncio.Event()).set()
+
+    async def __call__(self, scope, receive, send):
+        request_id = scope["query_string"].decode()
+        self.started.append(request_id)
+        await self.gates.setdefault(request_id, asyncio.Event()).wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def call(app, request_id: str, method: str = WRITE[0], path: str = WRITE[1]):
+    """Run one request through ``app``: its status and headers."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": request_id.encode(),
+        "headers": [],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    return start["status"], {
+        name.decode(): value.decode() for name, value in start["headers"]
+    }
+
+
+def middleware(stub: StubApp, limit: int, deadline_ms: float = 1000):
+    return AdmissionMiddleware(
+        stub, {"survey_writes": limit}, {"survey_writes": deadline_ms}
+    )
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_requests_past_the_limit_wait_for_a_slot():
+    async def scenario():
+        stub = StubApp()
+        app = middleware(stub, limit=2)
+        gate = app.gates["survey_writes"]
+        requests = [asyncio.create_task(call(app, name)) for name in "abc"]
+        await settle()
+        assert stub.started == ["a", "b"]
+        assert (gate.in_flight, len(gate._waiters)) == (2, 1)
+
+        stub.finish("a")
+        await settle()
+        assert stub.started == ["a", "b", "c"]
+        assert (gate.in_flight, len(gate._waiters)) == (2, 0)
+
+        stub.finish("b")
+        stub.finish("c")
+        assert [status for status, _ in await asyncio.gather(*requests)] == [200] * 3
+        assert gate.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queued_requests_start_in_arrival_order():
+    async def scenario():
+        stub = StubApp()
+        app = middleware(stub, limit=1)
+        requests = []
+        for name in "abcde":
+            requests.append(asyncio.create_task(call(app, name)))
+            await settle()
+        assert stub.started == ["a"]
+        for name in "abcd":
+            stub.finish(name)
+            await settle()
+        stub.finish("e")
+        await asyncio.gather(*requests)
+        assert stub.started == list("abcde")
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_expected_wait_exceeds_deadline():
+    async def scenario():
+        stub = StubApp()
+        app = middleware(stub, limit=1, deadline_ms=1000)
+        gate = app.gates["survey_writes"]
+        # Requests have been holding their slot for 2.5s
+        gate._service_time = 2.5
+        held = asyncio.create_task(call(app, "a"))
+        await settle()
+
+        status, headers = await call(app, "b")
+        assert status == 503
+        assert headers["retry-after"] == "3"
+        assert stub.started == ["a"] and not gate._waiters
+
+        stub.finish("a")
+        assert (await held)[0] == 200
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_queued_past_deadline():
+    async def scenario():
+        stub = StubApp()
+        app = middleware(stub, limit=1, deadline_ms=50)
+        gate = app.gates["survey_writes"]
+        held = asyncio.create_task(call(app, "a"))
+        await settle()
+
+        status, headers = await call(app, "b")
+        assert status == 503
+        assert int(headers["retry-after"]) >= 1
+        assert stub.started == ["a"] and not gate._waiters
+
+        stub.finish("a")
+        await held
+        assert gate.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_other_routes_and_unlimited_classes_pass_through():
+    async def scenario():
+        stub = StubApp()
+        app = middleware(stub, limit=1)
+        assert set(app.gates) == {"survey_writes"}
+        held = asyncio.create_task(call(app, "a"))
+        await settle()
+        stub.finish("b")
+        stub.finish("c")
+        assert (await call(app, "b", "GET", "/admin/analytics/cohort"))[0] == 200
+        assert (await call(app, "c", "GET", "/health"))[0] == 200
+        stub.finish("a")
+        await held
+
+    asyncio.run(scenario())
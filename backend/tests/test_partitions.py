@@ -0,0 +1,134 @@
+import csv
+import gzip
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from partitions import (
+    DEFAULT_PARTITION,
+    TABLE,
+    archive_partitions,
+    ensure_partitions,
+    maintain_partitions,
+    monthly_partitions,
+)
+
+TODAY = date(2025, 10, 15)
+
+
+@pytest.fixture
+def db(app_database):
+    """daily_sleep_surveys with only its default partition, and user 1."""
+    with app_database.begin() as connection:
+        children = connection.scalars(
+            text(
+                "SELECT relname FROM pg_class WHERE relname LIKE :prefix "
+                "AND relkind = 'r'"
+            ),
+            {"prefix": f"{TABLE}_%"},
+        ).all()
+        for name in children:
+            connection.execute(text(f"DROP TABLE {name}"))
+        connection.execute(
+            text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        )
+        connection.execute(text("TRUNCATE users RESTART IDENTITY CASCADE"))
+        connection.execute(
+            text(
+                "INSERT INTO users (id, email, password_hash, salt, first_name, "
+                "last_name, birth_date, gender, school, school_year) VALUES "
+                "(1, 'a@x.pt', 'x', 'x', 'A', 'B', '2010-01-01', 'F', 'S', 9)"
+            )
+        )
+    with Session(app_database) as db:
+        yield db
+
+
+def add_survey(db: Session, day: date) -> None:
+    db.execute(
+        text(
+            f"INSERT INTO {TABLE} (user_id, hora_levantaste_hoje, "
+            "hora_deitaste_ontem, tempo_ate_adormecer, vezes_acordaste_noite, "
+            "horas_que_dormiste, qualidade_sono_noite, survey_date) "
+            "VALUES (1, '07:00', '23:00', 10, 0, 480, 4, :day)"
+        ),
+        {"day": day},
+    )
+    db.commit()
+
+
+def partition_of(db: Session, day: date) -> str:
+    return db.scalar(
+        text(f"SELECT tableoid::regclass::text FROM {TABLE} WHERE survey_date = :day"),
+        {"day": day},
+    )
+
+
+def test_creates_partitions_ahead_once(db):
+    created, archived = maintain_partitions(db, today=TODAY)
+    assert created == [
+        f"{TABLE}_y2025m10",
+        f"{TABLE}_y2025m11",
+        f"{TABLE}_y2025m12",
+        f"{TABLE}_y2026m01",
+    ]
+    assert archived == []
+    assert monthly_partitions(db)[0] == date(2025, 10, 1)
+    assert maintain_partitions(db, today=TODAY) == ([], [])
+
+    add_survey(db, date(2025, 12, 31))
+    assert partition_of(db, date(2025, 12, 31)) == f"{TABLE}_y2025m12"
+
+
+def test_moves_default_partition_rows_into_their_month(db):
+    add_survey(db, date(2025, 6, 10))
+    assert partition_of(db, date(2025, 6, 10)) == DEFAULT_PARTITION
+
+    created = ensure_partitions(db, TODAY, months_ahead=0)
+    db.commit()
+    assert created == [f"{TABLE}_y2025m06", f"{TABLE}_y2025m10"]
+    assert partition_of(db, date(2025, 6, 10)) == f"{TABLE}_y2025m06"
+
+
+def test_rows_past_retention_stay_in_default_partition(db):
+    add_survey(db, date(2025, 5, 20))
+    created = ensure_partitions(db, TODAY, months_ahead=0, since=date(2025, 8, 1))
+    db.commit()
+    assert created == [f"{TABLE}_y2025m10"]
+    assert partition_of(db, date(2025, 5, 20)) == DEFAULT_PARTITION
+
+
+def test_archives_expired_months(db, tmp_path):
+    add_survey(db, date(2025, 6, 10))
+    add_survey(db, date(2025, 7, 31))
+    add_survey(db, date(2025, 8, 1))
+    ensure_partitions(db, TODAY, months_ahead=0)
+    db.commit()
+
+    archived = archive_partitions(db, date(2025, 8, 1), archive_dir=tmp_path)
+    db.commit()
+    assert [path.name for path in archived] == [
+        f"{TABLE}_y2025m06.csv.gz",
+        f"{TABLE}_y2025m07.csv.gz",
+    ]
+    assert monthly_partitions(db) == [date(2025, 8, 1), date(2025, 10, 1)]
+    assert db.scalar(text(f"SELECT count(*) FROM {TABLE}")) == 1
+    assert not list(tmp_path.glob("*.partial"))
+
+    with gzip.open(archived[1], "rt", newline="") as archive:
+        [row] = list(csv.DictReader(archive))
+    assert row["survey_date"] == "2025-07-31" and row["user_id"] == "1"
+
+
+def test_archive_never_overwrites(db, tmp_path):
+    for _ in range(2):
+        add_survey(db, date(2025, 6, 10))
+        ensure_partitions(db, TODAY, months_ahead=0)
+        archive_partitions(db, date(2025, 7, 1), archive_dir=tmp_path)
+        db.commit()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f"{TABLE}_y2025m06.2.csv.gz",
+        f"{TABLE}_y2025m06.csv.gz",
+    ]
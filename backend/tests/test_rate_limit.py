@@ -0,0 +1,135 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+import rate_limit
+from rate_limit import MemoryRateLimitStore, RateLimiter, client_ip
+
+LIMITS = {
+    ("login", "ip"): (5, 60),
+    ("login", "email"): (3, 60),
+    ("writes", "user"): (2, 10),
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(MemoryRateLimitStore(), LIMITS)
+
+
+def test_burst_up_to_capacity(limiter):
+    assert [limiter.check("writes", user=1) for _ in range(2)] == [0, 0]
+    # 2 tokens per 10s: the next one is 5s away
+    assert limiter.check("writes", user=1) == pytest.approx(5)
+
+
+def test_refill_over_time(limiter, clock):
+    for _ in range(2):
+        limiter.check("writes", user=1)
+    clock.now += 4
+    assert limiter.check("writes", user=1) == pytest.approx(1)
+    clock.now += 1
+    assert limiter.check("writes", user=1) == 0
+    # Refilling stops at capacity
+    clock.now += 3600
+    assert [limiter.check("writes", user=1) for _ in range(3)][-1] > 0
+
+
+def test_buckets_are_per_key(limiter):
+    for _ in range(2):
+        limiter.check("writes", user=1)
+    assert limiter.check("writes", user=1) > 0
+    assert limiter.check("writes", user=2) == 0
+
+
+def test_refused_request_refunds_taken_tokens(limiter):
+    # The email bucket runs out first; the IP keeps its tokens for others
+    for _ in range(3):
+        assert limiter.check("login", ip="10.0.0.1", email="a@b.pt") == 0
+    for _ in range(10):
+        assert limiter.check("login", ip="10.0.0.1", email="a@b.pt") > 0
+    assert limiter.check("login", ip="10.0.0.1", email="c@d.pt") == 0
+    assert limiter.check("login", ip="10.0.0.1", email="e@f.pt") == 0
+    assert limiter.check("login", ip="10.0.0.1", email="g@h.pt") > 0
+
+
+def test_refund_stops_at_capacity(clock):
+    store = MemoryRateLimitStore()
+    assert store.take("k", 1, 1) == 0
+    store.refund("k", 1)
+    store.refund("k", 1)
+    assert store.take("k", 1, 1) == 0
+    assert store.take("k", 1, 1) > 0
+    # Unknown keys are ignored
+    store.refund("missing", 1)
+
+
+def test_keys_without_limit_or_value_are_skipped(limiter):
+    taken = []
+    limiter.store.take = lambda key, capacity, rate: taken.append(key) or 0.0
+    limiter.check("login", ip="10.0.0.1", email=None, user=7)
+    limiter.check("writes", ip="10.0.0.1", user=7)
+    assert taken == ["login:ip:10.0.0.1", "writes:user:7"]
+
+
+def test_store_errors_let_the_request_through(limiter):
+    def fail(key, capacity, rate):
+        raise RuntimeError("store down")
+
+    limiter.store.take = fail
+    assert limiter.check("writes", user=1) == 0
+
+
+def test_enforce_responds_429_with_retry_after(limiter):
+    app = FastAPI()
+
+    @app.post("/writes")
+    def write(user: int):
+        limiter.enforce("writes", user=user)
+
+    client = TestClient(app)
+    assert [client.post("/writes?user=1").status_code for _ in range(2)] == [200, 200]
+    response = client.post("/writes?user=1")
+    assert response.status_code == 429
+    # 5s to the next token, rounded up
+    assert response.headers["Retry-After"] == "5"
+    assert client.post("/writes?user=2").status_code == 200
+
+
+def request(peer: str, forwarded: str | None = None) -> Request:
+    headers = Headers({"x-forwarded-for": forwarded} if forwarded else {})
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers.raw})
+
+
+@pytest.fixture
+def trusted_proxy(monkeypatch):
+    monkeypatch.setattr(
+        rate_limit, "TRUSTED_NETWORKS", (rate_limit.ipaddress.ip_network("10.0.0.0/8"),)
+    )
+
+
+def test_client_ip_ignores_forwarded_from_untrusted_peer(trusted_proxy):
+    assert client_ip(request("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+
+def test_client_ip_reads_forwarded_through_trusted_proxies(trusted_proxy):
+    # Spoofed first entry, then the client, then a second trusted proxy
+    forwarded = "192.0.2.66, 198.51.100.1, 10.1.2.3"
+    assert client_ip(request("10.0.0.2", forwarded)) == "198.51.100.1"
+    assert client_ip(request("10.0.0.2")) == "10.0.0.2"
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import database
+from database import ReplicaRouter, SessionLocal, read_session
+
+NOTES = text("SELECT count(*) FROM notes WHERE user_id = :user_id")
+
+
+@pytest.fixture
+def router(databases, monkeypatch):
+    primary, replica = databases
+    router = ReplicaRouter(
+        primary, [replica], max_lag=10, lag_check_interval=60, sticky_seconds=0.5
+    )
+    monkeypatch.setattr(database, "router", router)
+    with primary.begin() as connection:
+        connection.execute(text("TRUNCATE notes"))
+    return router
+
+
+def write_note(user_id: int) -> None:
+    """Commit a note on the primary the way a request session does."""
+    with SessionLocal(bind=database.router.primary) as db:
+        db.info["user_id"] = user_id
+        db.execute(
+            text("INSERT INTO notes (user_id, body) VALUES (:user_id, 'x')"),
+            {"user_id": user_id},
+        )
+        db.commit()
+
+
+def read_notes(user_id: int) -> int:
+    sessions = read_session(user_id)
+    db = next(sessions)
+    try:
+        return db.scalar(NOTES, {"user_id": user_id})
+    finally:
+        sessions.close()
+
+
+def test_reads_go_to_replica_once_lag_is_sampled(router):
+    assert router.engine_for(1) is router.primary
+    router.measure_lags()
+    assert router.lag(0) == 0
+    assert router.engine_for(1) is router.replicas[0]
+
+
+def test_writer_reads_own_write_from_primary(router):
+    router.measure_lags()
+    write_note(1)
+    # The replica never gets the write; only the writer is kept on the primary
+    assert read_notes(1) == 1
+    assert read_notes(2) == 0
+    assert router.engine_for(2) is router.replicas[0]
+
+    time.sleep(router.sticky_seconds)
+    assert read_notes(1) == 0
+
+
+def test_lagging_replica_falls_back_to_primary(router, monkeypatch):
+    monkeypatch.setattr(router, "measure_lag", lambda replica: router.max_lag + 1)
+    router.measure_lags()
+    assert router.engine_for(1) is router.primary
+
+    monkeypatch.setattr(router, "measure_lag", lambda replica: router.max_lag)
+    router.measure_lags()
+    assert router.engine_for(1) is router.replicas[0]
+
+
+def test_unreachable_replica_falls_back_to_primary(router, databases):
+    unreachable = create_engine(
+        databases[1].url.set(database="prosono_test_missing"),
+        connect_args={"connect_timeout": 1},
+    )
+    router.replicas = [unreachable]
+    router.measure_lags()
+    assert router.lag(0) == float("inf")
+    assert router.engine_for(1) is router.primary
+
+
+def test_engine_for_reads_cached_lag_only(router, monkeypatch):
+    router.measure_lags()
+    samples = []
+    monkeypatch.setattr(router, "measure_lag", samples.append)
+    for user_id in range(100):
+        router.engine_for(user_id)
+    assert samples == []
+
+
+def test_stale_lag_sample_falls_back_to_primary(router):
+    router.measure_lags()
+    checked, lag = router._lag[0]
+    router._lag[0] = (checked - 3 * router.lag_check_interval - 1, lag)
+    assert router.engine_for(1) is router.primary
@@ -0,0 +1,169 @@
+import random
+from datetime import date, timedelta
+from datetime import time as clock
+
+import numpy as np
+import pytest
+
+import scoring_kernel as kernel
+from main import calculate_daily_survey_means, calculate_my_sleep_survey_means
+from models import ClevelandSurvey, DailySleepSurvey, MySleepSurvey, SleepSurvey
+from sleep_survey_answer_key import calculate_score_from_survey
+
+WINDOWS = (7, 15, 30)
+# calculate_daily_survey_means result key per kernel.DAILY_FIELDS column
+DAILY_RESULT_KEYS = (
+    "mean_sleep_duration",
+    "mean_wake_time",
+    "mean_bedtime",
+    "mean_time_to_sleep",
+    "mean_night_awakenings",
+    "mean_sleep_quality",
+)
+START = date(2025, 9, 1)
+
+
+def maybe(rng: random.Random, value, missing: float = 0.1):
+    return None if rng.random() < missing else value
+
+
+def cursor_rows(surveys: list, fields: tuple[str, ...]) -> np.ndarray:
+    """(user_id, *fields) columns as the database returns them, times as minutes."""
+
+    def value(survey, field):
+        raw = getattr(survey, field)
+        if field in kernel.DAILY_TIME_FIELDS and raw is not None:
+            return raw.hour * 60 + raw.minute
+        return raw
+
+    return kernel.columns(
+        [(s.user_id, *(value(s, f) for f in fields)) for s in surveys]
+    )
+
+
+def by_user(surveys: list) -> list[list]:
+    groups: dict[int, list] = {}
+    for survey in surveys:
+        groups.setdefault(survey.user_id, []).append(survey)
+    return list(groups.values())
+
+
+def assert_same(kernel_value: float, python_value: float | None) -> None:
+    if python_value is None:
+        assert np.isnan(kernel_value)
+    else:
+        assert round(float(kernel_value), 2) == python_value
+
+
+def daily_surveys(rng: random.Random, users: int) -> list[DailySleepSurvey]:
+    """Grouped by user, most recent first, with missing answers."""
+    surveys = []
+    for user_id in range(1, users + 1):
+        for day in reversed(range(rng.randint(1, 40))):
+            surveys.append(
+                DailySleepSurvey(
+                    user_id=user_id,
+                    survey_date=START + timedelta(days=day),
+                    hora_levantaste_hoje=maybe(
+                        rng, clock(rng.randint(6, 9), rng.randint(0, 59))
+                    ),
+                    hora_deitaste_ontem=maybe(
+                        rng, clock(rng.choice([21, 22, 23, 0, 1]), 30)
+                    ),
+                    tempo_ate_adormecer=maybe(rng, rng.randint(0, 90)),
+                    vezes_acordaste_noite=maybe(rng, rng.randint(0, 4)),
+                    horas_que_dormiste=maybe(rng, rng.randint(300, 600)),
+                    qualidade_sono_noite=maybe(rng, rng.randint(0, 5)),
+                )
+            )
+    return surveys
+
+
+@pytest.fixture
+def rng():
+    return random.Random(38)
+
+
+def test_quiz_scores_match_per_survey(rng):
+    surveys = [
+        SleepSurvey(**{f: maybe(rng, rng.random() < 0.6) for f in kernel.QUIZ_FIELDS})
+        for _ in range(500)
+    ]
+    answers = cursor_rows(surveys, kernel.QUIZ_FIELDS)[:, 1:]
+    expected = [calculate_score_from_survey(s) for s in surveys]
+    assert list(kernel.quiz_scores(answers)) == expected
+
+
+def test_cleveland_scores_match_per_survey(rng):
+    surveys = [
+        ClevelandSurvey(**{f: rng.randint(1, 5) for f in kernel.CLEVELAND_FIELDS})
+        for _ in range(500)
+    ]
+    items = cursor_rows(surveys, kernel.CLEVELAND_FIELDS)[:, 1:]
+    expected = [s.cleveland_score() for s in surveys]
+    assert list(kernel.cleveland_scores(items)) == expected
+
+
+def test_cleveland_score_with_missing_item_is_nan(rng):
+    items = np.array([[float(rng.randint(1, 5)) for _ in kernel.CLEVELAND_FIELDS]])
+    items[0, 3] = np.nan
+    assert np.isnan(kernel.cleveland_scores(items)[0])
+
+
+def test_windowed_means_match_daily_means(rng):
+    surveys = daily_surveys(rng, 200)
+    data = cursor_rows(surveys, kernel.DAILY_FIELDS)
+    users, means = kernel.windowed_means(data[:, 0], data[:, 1:], WINDOWS)
+
+    groups = by_user(surveys)
+    assert list(users) == [group[0].user_id for group in groups]
+    for row, group in enumerate(groups):
+        expected = calculate_daily_survey_means(group)
+        for column, key in enumerate(DAILY_RESULT_KEYS):
+            for window in WINDOWS:
+                assert_same(
+                    means[window][row, column],
+                    getattr(expected[key], f"last_{window}_days"),
+                )
+
+
+def test_my_sleep_means_match_per_user(rng):
+    surveys = [
+        MySleepSurvey(
+            user_id=user_id,
+            **{f: maybe(rng, rng.randint(1, 10), 0.3) for f in kernel.MY_SLEEP_FIELDS},
+        )
+        for user_id in range(1, 101)
+        for _ in range(rng.randint(1, 3))
+    ]
+    data = cursor_rows(surveys, kernel.MY_SLEEP_FIELDS)
+    _, means = kernel.windowed_means(data[:, 0], data[:, 1:], (None,))
+
+    for row, group in enumerate(by_user(surveys)):
+        expected = list(calculate_my_sleep_survey_means(group).values())
+        for column, value in enumerate(expected):
+            assert_same(means[None][row, column], value)
+
+
+def test_all_missing_window_is_nan():
+    values = np.array([[np.nan, 1.0], [np.nan, 3.0]])
+    _, means = kernel.windowed_means(np.array([1, 1]), values, (1, None))
+    assert np.isnan(means[1][0, 0]) and means[1][0, 1] == 1.0
+    assert np.isnan(means[None][0, 0]) and means[None][0, 1] == 2.0
+
+
+def test_empty_input():
+    fields = len(kernel.DAILY_FIELDS)
+    users, means = kernel.windowed_means(np.empty(0), np.empty((0, fields)), WINDOWS)
+    assert len(users) == 0
+    assert all(means[window].shape == (0, fields) for window in WINDOWS)
+    assert kernel.quiz_scores(np.empty((0, len(kernel.QUIZ_FIELDS)))).shape == (0,)
+    assert kernel.cleveland_scores(
+        np.empty((0, len(kernel.CLEVELAND_FIELDS)))
+    ).shape == (0,)
+    assert kernel.time_minutes([]).shape == (0,)
+
+
+def test_time_minutes_missing_is_nan():
+    minutes = kernel.time_minutes([clock(23, 30), None, clock(0, 15)])
+    assert minutes[0] == 1410 and np.isnan(minutes[1]) and minutes[2] == 15
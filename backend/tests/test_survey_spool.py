@@ -0,0 +1,165 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+import survey_spool as spool_module
+from models import SleepSurvey
+from schemas import SleepSurveyCreate
+from survey_spool import SurveySpool
+
+DAY = date(2025, 10, 6)
+
+
+class FakeRouter:
+    def __init__(self):
+        self.writes: list[int] = []
+
+    def note_write(self, user_id: int) -> None:
+        self.writes.append(user_id)
+
+
+def survey(answer: bool, day: date = DAY) -> SleepSurveyCreate:
+    fields = SleepSurveyCreate.model_fields
+    return SleepSurveyCreate(
+        **{name: answer for name in fields if name != "survey_date"}, survey_date=day
+    )
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = SurveySpool(str(tmp_path / "spool.sqlite3"), batch_size=1)
+    spool.open()
+    return spool
+
+
+@pytest.fixture
+def database(app_database, monkeypatch):
+    """Users 1 and 2 and no surveys; replays go through a fake router."""
+    with app_database.begin() as connection:
+        connection.execute(text("TRUNCATE users RESTART IDENTITY CASCADE"))
+        connection.execute(
+            text(
+                "INSERT INTO users (id, email, password_hash, salt, first_name, "
+                "last_name, birth_date, gender, school, school_year) "
+                "SELECT id, id || '@x.pt', 'x', 'x', 'A', 'B', '2010-01-01', 'F', "
+                "'S', 9 FROM generate_series(1, 2) AS id"
+            )
+        )
+    sessions = sessionmaker(bind=app_database)
+    monkeypatch.setattr(spool_module, "SessionLocal", sessions)
+    monkeypatch.setattr(spool_module, "router", FakeRouter())
+    enqueued = []
+    monkeypatch.setattr(
+        spool_module,
+        "enqueue_post_write_jobs",
+        lambda table, user_ids: enqueued.append((table, user_ids)),
+    )
+    sessions.enqueued = enqueued
+    return sessions
+
+
+def stored_answer(sessions, user_id: int) -> bool | None:
+    with sessions() as db:
+        return db.scalar(
+            select(SleepSurvey.varios_tipos_sono_noite).where(
+                SleepSurvey.user_id == user_id, SleepSurvey.survey_date == DAY
+            )
+        )
+
+
+def store(sessions, user_id: int, answer: bool) -> None:
+    """Write a submission straight to the database, as a live POST would."""
+    row = survey(answer).model_dump() | {"user_id": user_id}
+    with sessions() as db:
+        db.execute(spool_module.upsert_statement(SleepSurvey, [row]))
+        db.commit()
+
+
+def test_open_fails_on_unusable_path(tmp_path):
+    (tmp_path / "file").write_text("")
+    spool = SurveySpool(str(tmp_path / "file" / "spool.sqlite3"))
+    with pytest.raises(RuntimeError, match="not writable"):
+        spool.open()
+
+
+def test_disabled_spool_opens_and_is_never_pending():
+    spool = SurveySpool("")
+    spool.open()
+    assert not spool.enabled and not spool.pending()
+
+
+def test_pending_is_answered_from_the_count(spool):
+    assert not spool.pending()
+    spool.append(SleepSurvey, 1, survey(True))
+    spool.append(SleepSurvey, 1, survey(False))
+
+    statements = []
+    spool._connection().set_trace_callback(statements.append)
+    assert spool.pending()
+    assert statements == []
+    assert spool.depth() == 2
+
+    # Another process sharing the file counts the entries on opening
+    other = SurveySpool(str(spool.path))
+    other.open()
+    assert other.pending()
+
+
+def test_replay_applies_entries_in_order(spool, database):
+    for answer in (True, False, True):
+        spool.append(SleepSurvey, 1, survey(answer))
+    spool.append(SleepSurvey, 2, survey(False))
+
+    assert spool.replay() == 4
+    # Each entry overwrote the row written by the one before it in this run
+    assert stored_answer(database, 1) is True
+    assert stored_answer(database, 2) is False
+    assert not spool.pending() and spool.depth() == 0
+    assert set(spool_module.router.writes) == {1, 2}
+    assert {table for table, _ in database.enqueued} == {"sleep_surveys"}
+    assert spool.replay() == 0
+
+
+def test_replay_overwrites_rows_older_than_the_submission(spool, database):
+    store(database, 1, False)
+    spool.append(SleepSurvey, 1, survey(True))
+    spool.replay()
+    assert stored_answer(database, 1) is True
+
+
+def test_replay_keeps_rows_changed_after_the_submission(spool, database):
+    spool.append(SleepSurvey, 1, survey(True))
+    # Submitted again once the database was back, before the replay
+    store(database, 1, False)
+    assert spool.replay() == 1
+    assert stored_answer(database, 1) is False
+    assert not spool.pending()
+
+
+def test_rejected_entries_move_to_failed(spool, database):
+    spool.append(SleepSurvey, 1, survey(True))
+    # No such user: the foreign key rejects it
+    spool.append(SleepSurvey, 3, survey(True))
+    spool.append(SleepSurvey, 2, survey(True))
+
+    assert spool.replay() == 2
+    assert stored_answer(database, 1) is True
+    assert stored_answer(database, 2) is True
+    assert not spool.pending()
+    failed = spool._connection().execute("SELECT user_id, error FROM failed")
+    [(user_id, error)] = failed.fetchall()
+    assert user_id == 3 and "foreign key" in error
+
+
+def test_replay_waits_for_the_database(spool, database, app_database, monkeypatch):
+    unreachable = create_engine(
+        app_database.url.set(database="prosono_test_missing"),
+        connect_args={"connect_timeout": 1},
+    )
+    monkeypatch.setattr(spool_module, "SessionLocal", sessionmaker(bind=unreachable))
+    spool.append(SleepSurvey, 1, survey(True))
+
+    assert spool.replay() == 0
+    assert spool.pending() and spool.depth() == 1
@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date
+
+import pytest
+
+import write_coalescing
+from models import DailySleepSurvey
+from write_coalescing import UpsertCoalescer
+
+DAY = date(2025, 10, 6)
+
+
+class FakeDatabase:
+    """Committed rows by key; a write with a row of a ``missing`` user fails."""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.rows: dict[tuple, dict] = {}
+        self.ids: dict[tuple, int] = {}
+        self.writes: list[int] = []
+
+    def session(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, database: FakeDatabase):
+        self.database = database
+        self.pending: list[dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.pending = []
+
+    def execute(self, rows: list[dict]):
+        self.database.writes.append(len(rows))
+        if any(row["user_id"] in self.database.missing for row in rows):
+            raise RuntimeError("violates foreign key constraint")
+        self.pending = rows
+        ids = self.database.ids
+        keys = [(row["user_id"], row["survey_date"]) for row in rows]
+        return Result([(ids.setdefault(key, len(ids) + 1), *key) for key in keys])
+
+    def commit(self):
+        for row in self.pending:
+            self.database.rows[(row["user_id"], row["survey_date"])] = row
+        self.pending = []
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeRouter:
+    def __init__(self):
+        self.writes: list[int] = []
+
+    def note_write(self, user_id: int) -> None:
+        self.writes.append(user_id)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = FakeRouter()
+    monkeypatch.setattr(write_coalescing, "router", router)
+    # The fake session takes the rows in place of the statement
+    monkeypatch.setattr(write_coalescing, "upsert_statement", lambda model, rows: rows)
+    return router
+
+
+def use_database(monkeypatch, database: FakeDatabase) -> None:
+    monkeypatch.setattr(write_coalescing, "SessionLocal", database.session)
+
+
+def row(user_id: int, quality: int = 3, day: date = DAY) -> dict:
+    return {"user_id": user_id, "survey_date": day, "qualidade_sono_noite": quality}
+
+
+def flush(rows: list[dict]) -> list[Future]:
+    coalescer = UpsertCoalescer(DailySleepSurvey)
+    batch = [(row, Future(), time.perf_counter()) for row in rows]
+    coalescer._flush(batch)
+    return [future for _, future, _ in batch]
+
+
+def test_batch_commits_in_one_write(monkeypatch, router):
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    futures = flush([row(1), row(2), row(3, day=date(2025, 10, 7))])
+
+    assert database.writes == [3]
+    assert [future.result() for future in futures] == [1, 2, 3]
+    assert sorted(router.writes) == [1, 2, 3]
+
+
+def test_last_submission_per_key_wins(monkeypatch, router):
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    futures = flush([row(1, quality=1), row(2), row(1, quality=5)])
+
+    assert database.writes == [2]
+    assert database.rows[(1, DAY)]["qualidade_sono_noite"] == 5
+    # Both submissions of user 1 are answered with the row's id
+    assert futures[0].result() == futures[2].result()
+    assert sorted(router.writes) == [1, 2]
+
+
+def test_failed_batch_retries_rows_one_by_one(monkeypatch, router):
+    database = FakeDatabase(missing={2})
+    use_database(monkeypatch, database)
+    futures = flush([row(1), row(2), row(3)])
+
+    # The batch, then each row on its own
+    assert database.writes == [3, 1, 1, 1]
+    assert set(database.rows) == {(1, DAY), (3, DAY)}
+    assert futures[0].result() and futures[2].result()
+    with pytest.raises(RuntimeError):
+        futures[1].result()
+    # Only the users whose rows were committed are sent to the primary
+    assert sorted(router.writes) == [1, 3]
+
+
+def test_concurrent_submissions_share_a_flush(monkeypatch, router):
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    coalescer = UpsertCoalescer(DailySleepSurvey, interval_ms=200, max_batch=4)
+    ids = {}
+
+    def submit(user_id):
+        ids[user_id] = coalescer.submit(row(user_id))
+
+    threads = [threading.Thread(target=submit, args=(u,)) for u in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    coalescer.stop()
+
+    assert database.writes == [4]
+    assert sorted(ids) == [1, 2, 3, 4]
+    assert sorted(router.writes) == [1, 2, 3, 4]
@@ -0,0 +1,166 @@
+"""Group commit for survey upserts.
+
+When a class submits its daily surveys at once, committing every POST on
+its own makes each one wait for a WAL flush. With write coalescing enabled,
+handlers hand their row to an UpsertCoalescer and wait; a flusher thread
+collects what arrives within WRITE_COALESCE_INTERVAL_MS and writes it as one
+multi-row INSERT ... ON CONFLICT in a single transaction. A handler only
+answers once its row is committed, so acknowledged writes are as durable as
+before.
+
+Within a batch the last submission per (user_id, survey_date) wins, in
+arrival order, like consecutive single-row upserts would.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from config import WRITE_COALESCE_INTERVAL_MS, WRITE_COALESCE_MAX_BATCH
+from database import SessionLocal, router
+from logging_config import get_logger
+from metrics import metrics
+from models import DailySleepSurvey
+
+logger = get_logger("write_coalescing")
+
+KEY_COLUMNS = ("user_id", "survey_date")
+# How long a handler waits for its batch before giving up with an error
+SUBMIT_TIMEOUT_SECONDS = 30
+
+
+def upsert_statement(model, rows: list[dict], where=None):
+    """Multi-row upsert on (user_id, survey_date), returning id and key.
+
+    Conflicting rows are only updated where ``where`` holds, if given.
+    """
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            **{key: stmt.excluded[key] for key in rows[0] if key not in KEY_COLUMNS},
+            # Column.onupdate is not applied to ON CONFLICT DO UPDATE
+            "updated_at": func.now(),
+        },
+        where=where,
+    )
+    return stmt.returning(model.id, model.user_id, model.survey_date)
+
+
+class UpsertCoalescer:
+    """Batches concurrent upserts of one survey model into shared transactions."""
+
+    def __init__(
+        self,
+        model,
+        interval_ms: float = WRITE_COALESCE_INTERVAL_MS,
+        max_batch: int = WRITE_COALESCE_MAX_BATCH,
+    ):
+        self.model = model
+        self.name = model.__tablename__
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self._pending: list[tuple[dict, Future, float]] = []
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def submit(self, row: dict) -> int:
+        """Queue ``row`` for the next flush and return its id once committed."""
+        future: Future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._start()
+            self._pending.append((row, future, time.perf_counter()))
+            self._condition.notify()
+        return future.result(timeout=SUBMIT_TIMEOUT_SECONDS)
+
+    def _start(self) -> None:
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"coalesce-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the flusher thread."""
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                # Give concurrent submissions the interval to join the batch
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.max_batch or self._stopping,
+                    timeout=self.interval,
+                )
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+            self._flush(batch)
+
+    def _write(self, rows: list[dict]) -> dict[tuple, int]:
+        with SessionLocal() as db:
+            written = db.execute(upsert_statement(self.model, rows)).all()
+            db.commit()
+        return {(user_id, day): row_id for row_id, user_id, day in written}
+
+    def _flush(self, batch: list[tuple[dict, Future, float]]) -> None:
+        started = time.perf_counter()
+        latest = {}
+        for row, _, _ in batch:
+            latest[tuple(row[key] for key in KEY_COLUMNS)] = row
+
+        errors = {}
+        try:
+            ids = self._write(list(latest.values()))
+        except Exception:
+            # One bad row (e.g. a user deleted meanwhile) must not fail the
+            # others: retry them one by one
+            logger.exception(f"Batched upsert into {self.name} failed, retrying rows")
+            ids = {}
+            for key, row in latest.items():
+                try:
+                    ids.update(self._write([row]))
+                except Exception as exc:
+                    errors[key] = exc
+
+        finished = time.perf_counter()
+        for row, future, submitted in batch:
+            key = tuple(row[column] for column in KEY_COLUMNS)
+            if key in errors:
+                future.set_exception(errors[key])
+            else:
+                future.set_result(ids[key])
+            metrics.observe(
+                "write_coalescer_wait_seconds", finished - submitted, table=self.name
+            )
+        # Keep read-your-writes: these users' next reads go to the primary
+        for user_id in {user_id for user_id, _ in ids}:
+            router.note_write(user_id)
+
+        metrics.observe(
+            "write_coalescer_flush_seconds", finished - started, table=self.name
+        )
+        metrics.observe("write_coalescer_batch_size", len(batch), table=self.name)
+        metrics.incr(
+            "write_coalescer_superseded", len(batch) - len(latest), table=self.name
+        )
+
+
+daily_survey_writes = UpsertCoalescer(DailySleepSurvey)
@@ -42,6 +42,15 @@ export interface MultiStepSurveyResponse {
   message: string;
 }
 
+// The backend answers 202 without an id when it spools a submission while
+// its database is unavailable; the survey is saved once the spool replays
+interface SubmitResponse {
+  id: number | null;
+  spooled?: boolean;
+}
+
+const SPOOLED_ID = -1;
+
 class MultiStepSurveyService {
   // Map frontend field names to backend field names for Cleveland survey
   private mapFrequencyDataToApi(
@@ -114,11 +123,11 @@ class MultiStepSurveyService {
 
     // Submit attitude survey
     try {
-      const attitudeResponse = await apiService.post<{ id: number }>(
+      const attitudeResponse = await apiService.post<SubmitResponse>(
         '/my-sleep-surveys',
         attitudeApiData
       );
-      results.attitudeId = attitudeResponse.id;
+      results.attitudeId = attitudeResponse.id ?? SPOOLED_ID;
     } catch (error) {
       console.error('Error submitting attitude survey:', error);
       results.errors.push('Failed to submit attitude survey');
@@ -126,11 +135,11 @@ class MultiStepSurveyService {
 
     // Submit frequency survey
     try {
-      const frequencyResponse = await apiService.post<{ id: number }>(
+      const frequencyResponse = await apiService.post<SubmitResponse>(
         '/cleveland-surveys',
         frequencyApiData
       );
-      results.frequencyId = frequencyResponse.id;
+      results.frequencyId = frequencyResponse.id ?? SPOOLED_ID;
     } catch (error) {
       console.error('Error submitting frequency survey:', error);
       results.errors.push('Failed to submit frequency survey');
@@ -138,11 +147,11 @@ class MultiStepSurveyService {
 
     // Submit knowledge survey
     try {
-      const knowledgeResponse = await apiService.post<{ id: number }>(
+      const knowledgeResponse = await apiService.post<SubmitResponse>(
         '/surveys',
         knowledgeApiData
       );
-      results.knowledgeId = knowledgeResponse.id;
+      results.knowledgeId = knowledgeResponse.id ?? SPOOLED_ID;
     } catch (error) {
       console.error('Error submitting knowledge survey:', error);
       results.errors.push('Failed to submit knowledge survey');